@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Parallel backup and restore of the names table.
+
+``export`` splits the id space into ranges and streams each range over its own
+pooled connection with a server-side cursor into a compressed shard file. On
+PostgreSQL all shards read one exported snapshot (like ``pg_dump -j``), so the
+backup is consistent even while the API keeps writing. A ``manifest.json``
+lists the shards with their id ranges, row counts and checksums.
+
+``restore`` verifies the manifest and loads the shards concurrently, with
+``COPY ... FROM STDIN`` on PostgreSQL, keeping the original ids. The shards go
+into a staging table first and replace the names in one transaction, so a
+failed restore leaves the table as it was.
+
+Uses the same environment as the API (DATABASE_URL, ...).
+
+Examples:
+    python backup_names.py export /backups/names-2025-10-11 --jobs 8
+    python backup_names.py export /backups/names --format msgpack --compression zstd
+    python backup_names.py restore /backups/names-2025-10-11 --jobs 8 --truncate
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, Table, Text, TIMESTAMP, create_engine, func, inspect, select, text
+
+import formats
+from compression import available_encodings, compress_stream
+from import_names import copy_escape
+from main import DATABASE_SHARD_URLS, DATABASE_URL, DB_ECHO, UNKNOWN_CREATED_AT, table, tombstones
+from snapshot import request_reload
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+SHARD_FORMATS = {
+    "ndjson": ".ndjson",
+    "columnar": ".columnar.json",
+    "msgpack": ".msgpack",
+}
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+COLUMNS = [table.c.id, table.c.name, table.c.created_at, table.c.name_key, table.c.occurrences]
+# Values for columns that tables from before DEDUP_NAMES do not have
+MISSING_COLUMN_DEFAULTS = {"name_key": None, "occurrences": 1}
+
+# Shards load here, without indexes, before replacing the names in one go
+staging = Table(
+    "names_restore",
+    MetaData(),
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False),
+    Column("name", Text, nullable=False),
+    Column("created_at", TIMESTAMP, nullable=False),
+    Column("name_key", Text),
+    Column("occurrences", Integer, nullable=False),
+)
+
+
+def export_columns(conn):
+    """The COLUMNS the names table actually has, in COLUMNS order."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    return [column for column in COLUMNS if column.name in existing]
+
+
+def split_ranges(min_id, max_id, shards):
+    """
+    Split ids min_id..max_id into at most ``shards`` half-open ranges.
+
+    Returns:
+        list: (after_id, last_id) pairs covering after_id < id <= last_id
+    """
+    if min_id is None:
+        return []
+    span = max_id - min_id + 1
+    shards = max(1, min(shards, span))
+    step = -(-span // shards)
+    ranges = []
+    after = min_id - 1
+    while after < max_id:
+        last = min(after + step, max_id)
+        ranges.append((after, last))
+        after = last
+    return ranges
+
+
+def shard_rows(rows, file_format):
+    """Encode one batch of rows for a shard file."""
+    rows = [{**MISSING_COLUMN_DEFAULTS, **r._mapping} for r in rows]
+    if file_format == "ndjson":
+        return "".join(
+            json.dumps({
+                "id": r["id"],
+                "name": r["name"],
+                "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+                "name_key": r["name_key"],
+                "occurrences": r["occurrences"],
+            }) + "\n"
+            for r in rows
+        ).encode("utf-8")
+    body = {
+        "ids": [r["id"] for r in rows],
+        "names": [r["name"] for r in rows],
+        "created_at": [r["created_at"].isoformat() if r["created_at"] else None for r in rows],
+        "name_keys": [r["name_key"] for r in rows],
+        "occurrences": [r["occurrences"] for r in rows],
+    }
+    return formats.encode_stream_chunk(body, formats.MSGPACK if file_format == "msgpack" else formats.COLUMNAR_JSON)
+
+
+def _set_snapshot(conn, snapshot_id):
+    if snapshot_id is None:
+        return
+    if not re.fullmatch(r"[0-9A-Fa-f-]+", snapshot_id):
+        raise ValueError(f"Unexpected snapshot id {snapshot_id!r}")
+    conn.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+
+
+def export_shard(engine, index, id_range, directory, file_format, compression, level, batch_size, snapshot_id=None):
+    """
+    Write the rows of one id range to a shard file.
+
+    Returns:
+        dict: Manifest entry for the shard
+    """
+    after_id, last_id = id_range
+    filename = f"names-{index:04d}{SHARD_FORMATS[file_format]}{COMPRESSION_SUFFIXES[compression]}"
+    path = os.path.join(directory, filename)
+    digest = hashlib.sha256()
+    rows_written = size = 0
+
+    with engine.connect() as conn:
+        _set_snapshot(conn, snapshot_id)
+        stmt = (
+            select(*export_columns(conn))
+            .where(table.c.id > after_id, table.c.id <= last_id)
+            .order_by(table.c.id)
+        )
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+
+        def batches():
+            nonlocal rows_written
+            for rows in result.partitions():
+                rows_written += len(rows)
+                yield shard_rows(rows, file_format)
+
+        chunks = batches() if compression == "none" else compress_stream(batches(), compression, level)
+        with open(path + ".tmp", "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    os.replace(path + ".tmp", path)
+
+    return {
+        "file": filename,
+        "after_id": after_id,
+        "last_id": last_id,
+        "rows": rows_written,
+        "bytes": size,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def export(engine, directory, jobs=4, shards=None, file_format="ndjson", compression="gzip",
+           level=None, batch_size=5000, out=sys.stderr):
+    """
+    Back up the names table into ``directory``.
+
+    Returns:
+        dict: The manifest that was written
+    """
+    os.makedirs(directory, exist_ok=True)
+    level = level if level is not None else (6 if compression == "gzip" else 3)
+    started = time.monotonic()
+
+    with engine.connect() as coordinator:
+        snapshot_id = None
+        if coordinator.dialect.name == "postgresql":
+            # Holding this transaction open keeps the snapshot importable by the shards
+            coordinator.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+            snapshot_id = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar()
+        min_id, max_id = coordinator.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+        ranges = split_ranges(min_id, max_id, shards or jobs * 4)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(export_shard, engine, index, id_range, directory, file_format,
+                            compression, level, batch_size, snapshot_id)
+                for index, id_range in enumerate(ranges)
+            ]
+            entries = []
+            for future in futures:
+                entry = future.result()
+                entries.append(entry)
+                print(f"{entry['file']}: {entry['rows']} rows, {entry['bytes']} bytes", file=out)
+
+    seconds = time.monotonic() - started
+    rows = sum(entry["rows"] for entry in entries)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "table": table.name,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "format": file_format,
+        "compression": compression,
+        "consistent_snapshot": snapshot_id is not None,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "shards": entries,
+    }
+    with open(os.path.join(directory, MANIFEST + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(directory, MANIFEST + ".tmp"), os.path.join(directory, MANIFEST))
+
+    rate = rows / seconds if seconds > 0 else 0.0
+    print(f"Exported {rows} rows in {len(entries)} shards in {seconds:.1f}s ({rate:.0f} rows/s)", file=out)
+    return manifest
+
+
+def _open_shard(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd shards need the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def read_shard(path, file_format, compression):
+    """Yield lists of row dicts from a shard file."""
+    with _open_shard(path, compression) as f:
+        if file_format == "msgpack":
+            if formats.msgpack is None:
+                raise ValueError("msgpack shards need the msgpack package")
+            bodies = formats.msgpack.Unpacker(f, raw=False)
+        elif file_format == "columnar":
+            bodies = (json.loads(line) for line in io.TextIOWrapper(f, encoding="utf-8") if line.strip())
+        else:
+            batch = []
+            for line in io.TextIOWrapper(f, encoding="utf-8"):
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= 5000:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        for body in bodies:
+            yield [
+                {"id": i, "name": n, "created_at": c, "name_key": k, "occurrences": o}
+                for i, n, c, k, o in zip(body["ids"], body["names"], body["created_at"],
+                                         body["name_keys"], body["occurrences"])
+            ]
+
+
+def _copy_value(value):
+    return "\\N" if value is None else copy_escape(str(value))
+
+
+def restore_shard(engine, directory, entry, file_format, compression):
+    """Load one verified shard into the staging table; returns rows loaded."""
+    path = os.path.join(directory, entry["file"])
+    loaded = 0
+    # begin() rather than commit(): COPY on the raw cursor never starts a
+    # SQLAlchemy transaction, so a bare commit() would be a no-op
+    with engine.begin() as conn:
+        for rows in read_shard(path, file_format, compression):
+            for r in rows:
+                # created_at is NOT NULL now; older backups may lack it
+                if r["created_at"] is None:
+                    r["created_at"] = UNKNOWN_CREATED_AT
+                elif conn.dialect.name != "postgresql":
+                    r["created_at"] = datetime.fromisoformat(r["created_at"])
+            if conn.dialect.name == "postgresql":
+                data = io.StringIO("".join(
+                    "\t".join(_copy_value(r[key]) for key in ("id", "name", "created_at", "name_key", "occurrences")) + "\n"
+                    for r in rows
+                ))
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.copy_expert(
+                        f"COPY {staging.name} (id, name, created_at, name_key, occurrences) FROM STDIN", data
+                    )
+                finally:
+                    cursor.close()
+            else:
+                conn.execute(staging.insert(), rows)
+            loaded += len(rows)
+    if loaded != entry["rows"]:
+        raise ValueError(f"{entry['file']}: expected {entry['rows']} rows, read {loaded}")
+    return loaded
+
+
+def verify(directory, manifest):
+    """Check that every shard exists and matches its checksum."""
+    for entry in manifest["shards"]:
+        digest = hashlib.sha256()
+        with open(os.path.join(directory, entry["file"]), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        if digest.hexdigest() != entry["sha256"]:
+            raise ValueError(f"{entry['file']} does not match its checksum")
+
+
+def restore(engine, directory, jobs=4, truncate=False, out=sys.stderr):
+    """
+    Restore a backup written by export() into the names table.
+
+    Returns:
+        int: Rows restored
+    """
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {manifest.get('version')}")
+    verify(directory, manifest)
+    started = time.monotonic()
+
+    def check_empty(conn):
+        existing = conn.execute(select(func.count()).select_from(table)).scalar()
+        if existing and not truncate:
+            raise ValueError(f"names already holds {existing} rows; pass --truncate to replace them")
+
+    with engine.begin() as conn:
+        check_empty(conn)
+        # Left over if an earlier restore was killed
+        staging.drop(conn, checkfirst=True)
+        staging.create(conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(restore_shard, engine, directory, entry, manifest["format"], manifest["compression"])
+                for entry in manifest["shards"]
+            ]
+            rows = 0
+            for entry, future in zip(manifest["shards"], futures):
+                rows += future.result()
+                print(f"{entry['file']}: {entry['rows']} rows loaded", file=out)
+
+        # Readers see either the old names or all of the restored ones
+        with engine.begin() as conn:
+            check_empty(conn)
+            conn.execute(table.delete())
+            conn.execute(table.insert().from_select(
+                [column.name for column in staging.c], select(*staging.c)
+            ))
+            if conn.dialect.name == "postgresql":
+                # Explicit ids do not advance the serial sequence
+                conn.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('names', 'id'), COALESCE(MAX(id), 1)) FROM names"
+                ))
+            request_reload(conn, tombstones)
+    finally:
+        with engine.begin() as conn:
+            staging.drop(conn, checkfirst=True)
+
+    seconds = time.monotonic() - started
+    rate = rows / seconds if seconds > 0 else 0.0
+    print(f"Restored {rows} rows from {len(manifest['shards'])} shards in {seconds:.1f}s ({rate:.0f} rows/s)", file=out)
+    return rows
+
+
+def make_engine(jobs):
+    """An engine whose pool has one connection per job (plus the coordinator)."""
+    options = {} if DATABASE_URL.startswith("sqlite") else {"pool_size": jobs + 1, "max_overflow": 0}
+    return create_engine(DATABASE_URL, echo=DB_ECHO, future=True, **options)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel backup and restore of the names table")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write a sharded backup")
+    export_parser.add_argument("directory", help="Backup directory (created if missing)")
+    export_parser.add_argument("--jobs", type=int, default=4, help="Concurrent connections")
+    export_parser.add_argument("--shards", type=int, help="Id ranges to split into (default: 4 per job)")
+    export_parser.add_argument("--format", choices=list(SHARD_FORMATS), default="ndjson")
+    export_parser.add_argument("--compression", choices=list(COMPRESSION_SUFFIXES), default="gzip")
+    export_parser.add_argument("--level", type=int, help="Compression level")
+    export_parser.add_argument("--batch-size", type=int, default=5000, help="Rows fetched per cursor batch")
+
+    restore_parser = commands.add_parser("restore", help="Load a backup")
+    restore_parser.add_argument("directory", help="Backup directory containing manifest.json")
+    restore_parser.add_argument("--jobs", type=int, default=4, help="Concurrent connections")
+    restore_parser.add_argument("--truncate", action="store_true", help="Delete existing names first")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if DATABASE_SHARD_URLS:
+        # Only DATABASE_URL would be read or written, and restored ids would
+        # not match the shards their rows land on
+        print("backup_names.py does not support DATABASE_SHARD_URLS; back up each shard's "
+              "database with its own tools", file=sys.stderr)
+        return 2
+    jobs = max(1, args.jobs)
+    engine = make_engine(jobs)
+    try:
+        if args.command == "export":
+            if args.compression != "none" and args.compression not in available_encodings():
+                print(f"{args.compression} compression is not available", file=sys.stderr)
+                return 2
+            export(engine, args.directory, jobs=jobs, shards=args.shards, file_format=args.format,
+                   compression=args.compression, level=args.level, batch_size=args.batch_size)
+        else:
+            restore(engine, args.directory, jobs=jobs, truncate=args.truncate)
+    except (OSError, ValueError) as e:
+        print(f"{args.command.capitalize()} failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
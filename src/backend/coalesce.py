@@ -0,0 +1,103 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+When many clients ask for the same page at once (everyone reloading after a
+deploy, or every open tab refreshing after an add), each request would run
+the same query and encode the same body. SingleFlight lets the first request
+for a key do the work while identical requests arriving before it finishes
+wait and reuse its result, so a burst of N identical reads costs one query.
+
+Only requests that are in flight together share a result: nothing is cached
+after the leader finishes.
+"""
+import threading
+
+
+class _Call:
+    """One in-flight computation and the requests waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time within a worker.
+
+    Counters are kept for the health endpoint: ``executed`` computations,
+    ``coalesced`` requests that reused one, and the largest number of
+    requests that shared a single computation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.largest_group = 0
+
+    def do(self, key, work, timeout=None):
+        """
+        Return ``work()``, shared with identical concurrent callers.
+
+        Args:
+            key: Hashable description of the request; equal keys must
+                produce interchangeable results
+            work: Callable computing the result
+            timeout (float): Most seconds to wait for another caller's
+                result, or None to wait until it is ready
+
+        Returns:
+            tuple: (result, shared) where shared is True if another request
+            computed the result
+
+        Raises:
+            TimeoutError: A waiter's ``timeout`` ran out first; the leader
+                carries on for the others
+            Whatever ``work`` raised, in the leader and every waiter
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(None if timeout is None else max(0.0, timeout)):
+                raise TimeoutError(f"Result for {key!r} not ready after {timeout:.3f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = work()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.largest_group = max(self.largest_group, call.waiters + 1)
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        """Counters since the worker started."""
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "requests": total,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0,
+                "largest_group": self.largest_group,
+                "in_flight": len(self._calls),
+            }
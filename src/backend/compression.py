@@ -0,0 +1,160 @@
+"""
+Response compression for the Names Manager API.
+
+Used when clients talk to the backend directly (Compose dev, in-cluster
+Service access); behind nginx the proxy strips Accept-Encoding and compresses
+itself. Buffered responses are compressed once they pass a size threshold,
+streamed responses are compressed chunk by chunk as they are produced.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.names.columnar+json",
+    "application/msgpack",
+    "application/javascript",
+    "text/plain",
+    "text/html",
+    "text/css",
+    "text/csv",
+}
+
+# gzip container (wbits 16 + 15) for zlib compressobj
+_GZIP_WBITS = 31
+
+
+def available_encodings():
+    """Encodings this process can produce, in server preference order."""
+    if zstandard is not None:
+        return ["zstd", "gzip"]
+    return ["gzip"]
+
+
+def choose_encoding(accept_encoding: str, allowed):
+    """
+    Pick the content coding to use for a response.
+
+    Args:
+        accept_encoding (str): The request's Accept-Encoding header
+        allowed (list): Encodings the server may use, most preferred first
+
+    Returns:
+        str or None: Chosen encoding, or None to send the body as is
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in allowed:
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """Incremental compressor with a flush that keeps output streamable."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush_block(self) -> bytes:
+        if self.encoding == "zstd":
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress a whole body with the given encoding."""
+    compressor = _Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding: str, level: int):
+    """
+    Compress an iterable of body chunks, yielding one compressed chunk per input.
+
+    Each chunk is flushed so clients can decode rows as they arrive.
+    """
+    compressor = _Compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            yield compressor.compress(chunk) + compressor.flush_block()
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encoding, allowed, min_size=1024, levels=None):
+    """
+    Compress a Flask response in place when the client accepts it.
+
+    Args:
+        response: Flask response about to be sent
+        accept_encoding (str): The request's Accept-Encoding header
+        allowed (list): Encodings the server may use, most preferred first
+        min_size (int): Buffered bodies smaller than this are left alone
+        levels (dict): Compression level per encoding
+
+    Returns:
+        The same response object
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encoding, allowed)
+    if encoding is None:
+        return response
+
+    level = (levels or {}).get(encoding, 6 if encoding == "gzip" else 3)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,155 @@
+"""
+Request deadlines for the Names Manager API.
+
+Each request gets a time budget: the per-route limit from configuration,
+shortened to what is left of the proxy's own timeout when nginx sends one
+(``X-Request-Timeout-Ms`` together with ``X-Request-Start``). While the
+request runs, the budget bounds how long a pool checkout may wait and is set
+as PostgreSQL ``statement_timeout`` on the connection, so work the client has
+stopped waiting for is cancelled by the database instead of running on.
+"""
+import contextvars
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from throttling import queue_time_ms
+
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+# time.monotonic() value the current request must finish by, or None
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def parse_route_deadlines(spec: str) -> dict:
+    """
+    Parse ``endpoint=ms`` pairs, e.g. "list_names=2000,add_name=1000".
+
+    Returns:
+        dict: Milliseconds per Flask endpoint name
+    """
+    deadlines = {}
+    for part in spec.split(","):
+        endpoint, _, value = part.partition("=")
+        if endpoint.strip() and value.strip():
+            deadlines[endpoint.strip()] = float(value)
+    return deadlines
+
+
+def request_budget_ms(route_ms, timeout_header=None, start_header=None, now=None):
+    """
+    Work out how long a request may still run.
+
+    Args:
+        route_ms (float): Configured limit for the route; 0 means none
+        timeout_header (str): X-Request-Timeout-Ms from the proxy, if any
+        start_header (str): X-Request-Start from the proxy, if any
+        now (float): Current wall-clock time in seconds
+
+    Returns:
+        float or None: Remaining milliseconds (may be <= 0), or None when
+        neither the route nor the proxy sets a limit
+    """
+    budget = route_ms if route_ms and route_ms > 0 else None
+    if timeout_header:
+        try:
+            proxy_ms = float(timeout_header)
+        except ValueError:
+            proxy_ms = None
+        if proxy_ms is not None and proxy_ms > 0:
+            waited = queue_time_ms(start_header, now if now is not None else time.time()) if start_header else None
+            remaining = proxy_ms - (waited or 0.0)
+            budget = remaining if budget is None else min(budget, remaining)
+    return budget
+
+
+def start(budget_ms):
+    """Set the deadline for the current request from its budget (None for no limit)."""
+    _deadline.set(None if budget_ms is None else time.monotonic() + budget_ms / 1000)
+
+
+def finish():
+    _deadline.set(None)
+
+
+def remaining_seconds():
+    """Seconds left before the current request's deadline, or None."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class DeadlineQueuePool(QueuePool):
+    """QueuePool whose checkout wait never outlasts the current request's deadline."""
+
+    @property
+    def _timeout(self):
+        remaining = remaining_seconds()
+        if remaining is None:
+            return self._base_timeout
+        # A zero timeout would block forever in the queue; keep a token wait
+        return max(0.001, min(self._base_timeout, remaining))
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._base_timeout = value
+
+
+def install_statement_timeout(engine):
+    """
+    Apply the request deadline as statement_timeout on every checkout.
+
+    Only PostgreSQL engines are affected. Connections that had a timeout set
+    are reset when checked out without a deadline.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    @event.listens_for(engine, "checkout")
+    def set_statement_timeout(dbapi_connection, connection_record, connection_proxy):
+        current = connection_record.info.get("statement_timeout_ms")
+        remaining = remaining_seconds()
+        if remaining is None:
+            if current is None:
+                return
+            target = None
+        else:
+            target = max(1, int(remaining * 1000))
+            # A timeout set by an earlier request and slightly shorter than
+            # this budget is close enough; skip the round trip
+            if current is not None and target * 0.75 <= current <= target:
+                return
+
+        # Autocommit keeps the SET a single round trip outside any transaction
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        try:
+            if target is None:
+                cursor.execute("SET statement_timeout = DEFAULT")
+            else:
+                cursor.execute(f"SET statement_timeout = {target}")
+        finally:
+            cursor.close()
+            dbapi_connection.autocommit = False
+        connection_record.info["statement_timeout_ms"] = target
+
+
+def classify(error):
+    """
+    Tell whether an exception means the request ran out of time.
+
+    Returns:
+        str or None: "statement" for a statement cancelled by its timeout,
+        "pool" for a pool checkout that timed out, otherwise None
+    """
+    if isinstance(error, exc.TimeoutError):
+        return "pool"
+    orig = getattr(error, "orig", None)
+    if getattr(orig, "pgcode", None) == QUERY_CANCELED:
+        return "statement"
+    return None
@@ -0,0 +1,109 @@
+"""
+Response formats for name lists.
+
+Besides the default JSON array of row objects, lists can be sent column by
+column, which avoids repeating the keys for every row and sends timestamps as
+epoch milliseconds instead of ISO strings:
+
+    {"ids": [1, 2], "names": ["Ann", "Bob"], "created_at": [1697040000000, ...]}
+
+The columnar shape is available as JSON or, when the msgpack package is
+installed, as MessagePack.
+"""
+import json
+from datetime import timezone
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; JSON formats always work
+    msgpack = None
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+COLUMNAR_JSON = "application/vnd.names.columnar+json"
+MSGPACK = "application/msgpack"
+# Older clients still ask for the unregistered name
+MSGPACK_LEGACY = "application/x-msgpack"
+
+
+def offered_types(default):
+    """
+    Media types a list endpoint can produce, the default first.
+
+    Args:
+        default (str): JSON for buffered lists, NDJSON for streamed exports
+
+    Returns:
+        list: Media types for Accept negotiation
+    """
+    offered = [default, COLUMNAR_JSON]
+    if msgpack is not None:
+        offered += [MSGPACK, MSGPACK_LEGACY]
+    return offered
+
+
+def negotiate(accept, default):
+    """
+    Pick the response format for an Accept header.
+
+    Args:
+        accept: werkzeug MIMEAccept (request.accept_mimetypes)
+        default (str): Format used when nothing more specific is acceptable
+
+    Returns:
+        str: One of default, COLUMNAR_JSON or MSGPACK
+    """
+    best = accept.best_match(offered_types(default), default=default)
+    return MSGPACK if best == MSGPACK_LEGACY else best
+
+
+def epoch_ms(value):
+    """Convert a timestamp (naive values are UTC) to epoch milliseconds."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def columns(rows, with_occurrences=False):
+    """
+    Turn result rows into the columnar shape.
+
+    Args:
+        rows: Rows with id, name and created_at (and occurrences) attributes
+        with_occurrences (bool): Include the occurrences column
+
+    Returns:
+        dict: Parallel lists keyed by column name
+    """
+    body = {
+        "ids": [r.id for r in rows],
+        "names": [r.name for r in rows],
+        "created_at": [epoch_ms(r.created_at) for r in rows],
+    }
+    if with_occurrences:
+        body["occurrences"] = [r.occurrences for r in rows]
+    return body
+
+
+def encode(body, media_type):
+    """
+    Serialize a columnar body.
+
+    Args:
+        body (dict): Output of columns(), plus any extra top-level fields
+        media_type (str): COLUMNAR_JSON or MSGPACK
+
+    Returns:
+        bytes: Encoded body
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(body, use_bin_type=True)
+    return json.dumps(body, separators=(",", ":")).encode("utf-8")
+
+
+def encode_stream_chunk(body, media_type):
+    """Serialize one batch of a streamed export; JSON batches end with a newline."""
+    data = encode(body, media_type)
+    return data if media_type == MSGPACK else data + b"\n"
@@ -0,0 +1,163 @@
+"""
+Gunicorn configuration for the Names Manager API.
+
+Loaded automatically by ``gunicorn main:app`` from the working directory.
+Every setting can be overridden with an environment variable; worker and
+thread counts default to values sized from the CPUs the container may
+actually use (cgroup quota), not the CPUs of the host.
+"""
+import math
+import os
+import sys
+import threading
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+
+def detect_cpu_limit(cgroup_root=CGROUP_ROOT):
+    """
+    Return the number of CPUs this process may use, possibly fractional.
+
+    Checks the cgroup v2 ``cpu.max`` quota, then the cgroup v1 CFS quota, and
+    caps the result by the CPU affinity mask.
+
+    Args:
+        cgroup_root (str): Mount point of the cgroup filesystem
+
+    Returns:
+        float: Usable CPUs, at least 0.1
+    """
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    quota = None
+    try:
+        with open(os.path.join(cgroup_root, "cpu.max")) as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")) as f:
+                limit = int(f.read().strip())
+            with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")) as f:
+                period = int(f.read().strip())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return max(cpus, 0.1)
+
+
+def gevent_available():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def plan_workers(worker_class, cpus, workers=None, threads=None):
+    """
+    Choose worker and thread counts for a worker class.
+
+    Args:
+        worker_class (str): sync, gthread or gevent
+        cpus (float): Usable CPUs from detect_cpu_limit()
+        workers (int): Explicit worker count, or None to size automatically
+        threads (int): Explicit threads per gthread worker, or None
+
+    Returns:
+        tuple: (workers, threads)
+    """
+    if worker_class == "sync":
+        # Each sync worker blocks on the database, so oversubscribe the CPUs
+        auto_workers = max(2, int(2 * cpus) + 1)
+        return workers or auto_workers, 1
+
+    # Threaded and async workers overlap I/O inside one process: one per CPU
+    auto_workers = max(1, math.ceil(cpus))
+    if worker_class == "gthread":
+        return workers or auto_workers, threads or 4
+    return workers or auto_workers, 1
+
+
+def _int_env(name, default=None):
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+cpu_limit = detect_cpu_limit()
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread").lower()
+if worker_class not in WORKER_CLASSES:
+    print(f"Unknown GUNICORN_WORKER_CLASS '{worker_class}', using gthread", file=sys.stderr)
+    worker_class = "gthread"
+if worker_class == "gevent" and not gevent_available():
+    print("GUNICORN_WORKER_CLASS=gevent but gevent is not installed, using gthread", file=sys.stderr)
+    worker_class = "gthread"
+
+workers, threads = plan_workers(
+    worker_class,
+    cpu_limit,
+    workers=_int_env("GUNICORN_WORKERS"),
+    threads=_int_env("GUNICORN_THREADS"),
+)
+worker_connections = _int_env("GUNICORN_WORKER_CONNECTIONS", 100)
+
+bind = f"{os.environ.get('SERVER_HOST', '0.0.0.0')}:{os.environ.get('SERVER_PORT', '8000')}"
+# Longer than nginx's upstream keepalive_timeout so nginx closes idle connections first
+keepalive = _int_env("GUNICORN_KEEPALIVE", 75)
+timeout = _int_env("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _int_env("GUNICORN_GRACEFUL_TIMEOUT", 30)
+# Recycle workers periodically; the jitter keeps them from restarting together
+max_requests = _int_env("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _int_env("GUNICORN_MAX_REQUESTS_JITTER", 100)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def on_starting(server):
+    server.log.info(
+        f"CPU limit {cpu_limit:g}: {workers} {worker_class} workers"
+        + (f" x {threads} threads" if worker_class == "gthread" else "")
+        + (f" x {worker_connections} connections" if worker_class == "gevent" else "")
+        + f", keepalive {keepalive}s, max_requests {max_requests}+{max_requests_jitter}"
+        + (", preloaded" if preload_app else "")
+    )
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; psycopg2 calls will block the gevent loop")
+
+    if preload_app:
+        # Connections opened in the master must not be shared with the child
+        app_module = sys.modules.get("main")
+        if app_module is not None:
+            app_module.engine.dispose(close=False)
+            for replica in app_module.read_router.replicas:
+                replica.dispose(close=False)
+            if app_module.shard_router is not None:
+                for shard_engine in app_module.shard_router.engines:
+                    shard_engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Background job threads run in the workers, never in the master
+    app_module = sys.modules.get("main")
+    if app_module is not None:
+        app_module.job_runner.start()
+        # Each worker builds its own suggestion index, off the request path
+        threading.Thread(
+            target=app_module.warm_name_index, name="name-suggest-warmup", daemon=True
+        ).start()
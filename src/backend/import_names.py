@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Bulk import names from a file, bypassing the HTTP API.
+
+Reads CSV, NDJSON or plain text (one name per line) as a stream, validates and
+sanitizes the names across a process pool with the API's own
+``validation()``, and loads them in chunks. On PostgreSQL each chunk is sent
+with ``COPY ... FROM STDIN``; other databases fall back to batched INSERTs.
+
+Progress is checkpointed per chunk in the ``import_checkpoints`` table, in
+the same transaction as the chunk itself, so an interrupted import resumes
+after the last committed chunk without loading anything twice.
+
+Uses the same environment as the API (DATABASE_URL, MAX_NAME_LENGTH,
+DEDUP_NAMES, ...).
+
+Examples:
+    python import_names.py names.txt
+    python import_names.py people.csv --column full_name --workers 8
+    python import_names.py names.ndjson --field name --chunk-size 50000
+    python import_names.py names.txt --restart
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, Table, Text, select
+
+import main
+from main import engine, metadata, table, tombstones, validation, normalize_name, upsert_name, UPSERT_INSERTS
+from snapshot import request_reload
+
+FORMATS = ("csv", "ndjson", "text")
+
+checkpoints = Table(
+    "import_checkpoints",
+    metadata,
+    Column("source", Text, primary_key=True),
+    Column("chunk_size", Integer, nullable=False),
+    Column("chunks_done", Integer, nullable=False),
+    Column("rows_loaded", Integer, nullable=False),
+    Column("completed", Boolean, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "text"
+
+
+def read_records(stream, file_format, column):
+    """
+    Yield one raw record per input name.
+
+    CSV is parsed here because quoted fields may span lines; NDJSON and text
+    lines are passed on unparsed and decoded in the pool.
+    """
+    if file_format == "csv":
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        if column not in header:
+            raise ValueError(f"CSV has no '{column}' column (found: {', '.join(header)})")
+        index = header.index(column)
+        for row in reader:
+            if row:
+                yield row[index] if index < len(row) else None
+    else:
+        for line in stream:
+            yield line
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _quiet_worker():
+    # validation() logs every sanitized name; far too chatty for a bulk load
+    logging.getLogger("main").setLevel(logging.ERROR)
+
+
+def validate_chunk(records, file_format, field, dedup):
+    """
+    Validate one chunk in a pool process.
+
+    Returns:
+        tuple: (names, keys, rejected, reasons) where keys is None unless
+        dedup is set and reasons maps error messages to counts
+    """
+    names, rejected, reasons = [], 0, {}
+    for record in records:
+        if file_format != "csv":
+            if not record.strip():
+                continue
+            record = record.rstrip("\r\n")
+
+        if file_format == "ndjson":
+            try:
+                value = json.loads(record).get(field)
+            except (ValueError, AttributeError):
+                status, result = False, "Invalid JSON line."
+            else:
+                status, result = validation(value if value is None else str(value))
+        else:
+            status, result = validation(record)
+
+        if status:
+            names.append(result)
+        else:
+            rejected += 1
+            reasons[result] = reasons.get(result, 0) + 1
+
+    keys = [normalize_name(name) for name in names] if dedup else None
+    return names, keys, rejected, reasons
+
+
+def copy_escape(value):
+    """Escape a value for COPY's text format."""
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def load_chunk(conn, names, keys):
+    """Insert one validated chunk inside the caller's transaction."""
+    if not names:
+        return
+    if conn.dialect.name != "postgresql":
+        if keys is None:
+            conn.execute(table.insert(), [{"name": name} for name in names])
+        else:
+            for name in names:
+                upsert_name(conn, name)
+        return
+
+    cursor = conn.connection.cursor()
+    try:
+        if keys is None:
+            data = io.StringIO("".join(copy_escape(name) + "\n" for name in names))
+            cursor.copy_expert("COPY names (name) FROM STDIN", data)
+            return
+
+        # COPY cannot resolve conflicts: stage the chunk, then merge it
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS names_import_stage "
+            "(seq BIGSERIAL, name TEXT, name_key TEXT) ON COMMIT DELETE ROWS"
+        )
+        data = io.StringIO("".join(
+            f"{copy_escape(name)}\t{copy_escape(key)}\n" for name, key in zip(names, keys)
+        ))
+        cursor.copy_expert("COPY names_import_stage (name, name_key) FROM STDIN", data)
+        cursor.execute(
+            "INSERT INTO names (name, name_key, occurrences) "
+            "SELECT (array_agg(name ORDER BY seq))[1], name_key, count(*) "
+            "FROM names_import_stage GROUP BY name_key "
+            "ON CONFLICT (name_key) DO UPDATE SET occurrences = names.occurrences + EXCLUDED.occurrences"
+        )
+    finally:
+        cursor.close()
+
+
+def save_checkpoint(conn, source, chunk_size, chunks_done, rows_loaded, completed=False):
+    values = {
+        "source": source,
+        "chunk_size": chunk_size,
+        "chunks_done": chunks_done,
+        "rows_loaded": rows_loaded,
+        "completed": completed,
+        "updated_at": datetime.utcnow(),
+    }
+    stmt = UPSERT_INSERTS[conn.dialect.name](checkpoints).values(**values)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[checkpoints.c.source], set_=values))
+
+
+def source_key(path):
+    """Identify an input file for checkpoints; a changed size means a new import."""
+    return f"{os.path.realpath(path)}:{os.path.getsize(path)}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import names into the database")
+    parser.add_argument("path", help="Input file, or - for stdin (not resumable)")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument("--column", default="name", help="CSV column holding the name")
+    parser.add_argument("--field", default="name", help="NDJSON field holding the name")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Names per COPY and checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Validation processes")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    return parser.parse_args(argv)
+
+
+def run(args, out=sys.stderr):
+    """
+    Import a file as described by the parsed arguments.
+
+    Returns:
+        dict: Summary with read, loaded, rejected, skipped_chunks, seconds
+        and rows_per_second
+    """
+    file_format = args.format or detect_format(args.path)
+    resumable = args.path != "-"
+    source = source_key(args.path) if resumable else None
+    chunk_size = args.chunk_size
+    skip_chunks = loaded = 0
+
+    checkpoints.create(engine, checkfirst=True)
+    if resumable and not args.restart:
+        with engine.connect() as conn:
+            saved = conn.execute(select(checkpoints).where(checkpoints.c.source == source)).first()
+        if saved is not None:
+            if saved.completed:
+                print(f"{args.path} was already imported ({saved.rows_loaded} names); use --restart to load it again", file=out)
+                return {"read": 0, "loaded": 0, "rejected": 0, "skipped_chunks": saved.chunks_done,
+                        "seconds": 0.0, "rows_per_second": 0.0}
+            chunk_size, skip_chunks, loaded = saved.chunk_size, saved.chunks_done, saved.rows_loaded
+            print(f"Resuming {args.path} after chunk {skip_chunks} ({loaded} names loaded)", file=out)
+
+    dedup = main.DEDUP_NAMES
+    stream = sys.stdin if not resumable else open(args.path, newline="" if file_format == "csv" else None, encoding="utf-8")
+    started = time.monotonic()
+    read = rejected = 0
+    reasons = {}
+    chunks_done = skip_chunks
+
+    try:
+        chunks = chunked(read_records(stream, file_format, args.column), chunk_size)
+        for _ in range(skip_chunks):
+            if next(chunks, None) is None:
+                break
+
+        field = args.field if file_format == "ndjson" else None
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_quiet_worker) as pool, \
+                engine.connect() as conn:
+            pending = deque()
+            # Keep a bounded window in flight so the file is never read ahead in full
+            window = max(1, args.workers) * 2
+            for chunk in chunks:
+                pending.append(pool.submit(validate_chunk, chunk, file_format, field, dedup))
+                read += len(chunk)
+                if len(pending) >= window:
+                    loaded, rejected, chunks_done = _commit_next(
+                        conn, pending.popleft(), source, chunk_size, chunks_done, loaded, rejected, reasons)
+                    _report(out, read, loaded, rejected, started)
+            while pending:
+                loaded, rejected, chunks_done = _commit_next(
+                    conn, pending.popleft(), source, chunk_size, chunks_done, loaded, rejected, reasons)
+                _report(out, read, loaded, rejected, started)
+
+            if resumable:
+                save_checkpoint(conn, source, chunk_size, chunks_done, loaded, completed=True)
+            # Imported ids may commit far out of order; have snapshots reload
+            request_reload(conn, tombstones)
+            conn.commit()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    seconds = time.monotonic() - started
+    summary = {
+        "read": read,
+        "loaded": loaded,
+        "rejected": rejected,
+        "skipped_chunks": skip_chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(read / seconds, 1) if seconds > 0 else 0.0,
+    }
+    print(f"\nImported {loaded} names from {read} records in {seconds:.1f}s "
+          f"({summary['rows_per_second']:.0f} rows/s), {rejected} rejected", file=out)
+    for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+        print(f"  {count:>8}  {reason}", file=out)
+    return summary
+
+
+def _commit_next(conn, future, source, chunk_size, chunks_done, loaded, rejected, reasons):
+    """Load the oldest validated chunk and checkpoint it in one transaction."""
+    names, keys, chunk_rejected, chunk_reasons = future.result()
+    load_chunk(conn, names, keys)
+    chunks_done += 1
+    loaded += len(names)
+    if source is not None:
+        save_checkpoint(conn, source, chunk_size, chunks_done, loaded)
+    conn.commit()
+    for reason, count in chunk_reasons.items():
+        reasons[reason] = reasons.get(reason, 0) + count
+    return loaded, rejected + chunk_rejected, chunks_done
+
+
+def _report(out, read, loaded, rejected, started):
+    elapsed = time.monotonic() - started
+    rate = read / elapsed if elapsed > 0 else 0.0
+    end = "\r" if out.isatty() else "\n"
+    print(f"read {read}  loaded {loaded}  rejected {rejected}  {rate:,.0f} rows/s", end=end, file=out, flush=True)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if main.DATABASE_SHARD_URLS:
+        # Rows loaded here would get BIGSERIAL ids that name the wrong shard
+        print("import_names.py does not support DATABASE_SHARD_URLS; use an import job "
+              "(POST /api/jobs) instead", file=sys.stderr)
+        return 2
+    if args.chunk_size < 1:
+        print("--chunk-size must be at least 1", file=sys.stderr)
+        return 2
+    try:
+        run(args)
+    except (OSError, ValueError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,436 @@
+"""
+Background jobs for bulk operations that outlast an HTTP request.
+
+Jobs are rows in the ``jobs`` table. ``POST /api/jobs`` inserts one as
+``queued``, and JobRunner threads in every backend process claim queued jobs
+with ``SELECT ... FOR UPDATE SKIP LOCKED``. Each job is therefore run by
+exactly one worker, wherever it lives, and idle replicas pick up the next job
+instead of waiting on a locked row.
+
+A handler reports progress through ``JobContext.checkpoint()``. It commits
+the handler's own batch together with the job's progress and heartbeat, so a
+retried job knows exactly how much work is done. It also stops the job when
+a cancel was requested. While a job runs, its worker also updates a
+heartbeat. A job whose worker died stops heartbeating and is queued again
+after ``stale_seconds``, until it runs out of attempts. Every write a worker
+makes to a job is fenced on the attempt number, so a worker that was only
+slow cannot overwrite the attempt that replaced it.
+
+Statuses: queued -> running -> succeeded | failed | cancelled
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Index, Integer, LargeBinary, Table, Text,
+    delete, select, update,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# validate(params) returns an error message or None; run(context) returns the
+# job's result (JSON-serializable) or raises
+JobKind = namedtuple("JobKind", ["validate", "run"])
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.checkpoint() when the job was asked to stop."""
+
+
+class JobLost(Exception):
+    """Raised when the job was handed to another attempt meanwhile."""
+
+
+def jobs_tables(metadata):
+    """
+    Declare the job queue and the table holding job output chunks.
+
+    Returns:
+        tuple: (jobs, job_outputs)
+    """
+    jobs = Table(
+        "jobs",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("kind", Text, nullable=False),
+        Column("params", Text, nullable=False),
+        Column("status", Text, nullable=False, default=QUEUED),
+        Column("done", Integer, nullable=False, default=0),
+        Column("total", Integer, nullable=True),
+        Column("result", Text, nullable=True),
+        Column("error", Text, nullable=True),
+        Column("cancel_requested", Boolean, nullable=False, default=False),
+        Column("attempts", Integer, nullable=False, default=0),
+        Column("worker", Text, nullable=True),
+        Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+        Column("started_at", DateTime, nullable=True),
+        Column("heartbeat_at", DateTime, nullable=True),
+        Column("finished_at", DateTime, nullable=True),
+    )
+    # Claims only ever look at the few queued rows
+    Index("jobs_queued_idx", jobs.c.id,
+          postgresql_where=jobs.c.status == QUEUED, sqlite_where=jobs.c.status == QUEUED)
+    Index("jobs_running_heartbeat_idx", jobs.c.heartbeat_at,
+          postgresql_where=jobs.c.status == RUNNING, sqlite_where=jobs.c.status == RUNNING)
+    # Idle runners prune expired jobs on every poll
+    Index("jobs_finished_at_idx", jobs.c.finished_at,
+          postgresql_where=jobs.c.status.in_(FINISHED), sqlite_where=jobs.c.status.in_(FINISHED))
+    job_outputs = Table(
+        "job_outputs",
+        metadata,
+        Column("job_id", Integer, primary_key=True),
+        Column("seq", Integer, primary_key=True),
+        Column("data", LargeBinary, nullable=False),
+    )
+    return jobs, job_outputs
+
+
+def describe(row):
+    """Public JSON shape of a job row."""
+    return {
+        "id": row.id,
+        "kind": row.kind,
+        "status": row.status,
+        "progress": {"done": row.done, "total": row.total},
+        "cancel_requested": row.cancel_requested,
+        "attempts": row.attempts,
+        "result": json.loads(row.result) if row.result is not None else None,
+        "error": row.error,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+
+class JobQueue:
+    """
+    Submit, inspect and cancel jobs.
+
+    Args:
+        engine: SQLAlchemy engine of the primary database
+        jobs: Table from jobs_tables()
+        job_outputs: Table from jobs_tables()
+    """
+
+    def __init__(self, engine, jobs, job_outputs):
+        self.engine = engine
+        self.jobs = jobs
+        self.job_outputs = job_outputs
+
+    def submit(self, kind, params):
+        """Queue a job and return its row."""
+        with self.engine.connect() as conn:
+            job_id = conn.execute(
+                self.jobs.insert().values(kind=kind, params=json.dumps(params), status=QUEUED)
+            ).inserted_primary_key[0]
+            conn.commit()
+            return conn.execute(select(self.jobs).where(self.jobs.c.id == job_id)).first()
+
+    def get(self, job_id):
+        """Return a job row, or None."""
+        with self.engine.connect() as conn:
+            return conn.execute(select(self.jobs).where(self.jobs.c.id == job_id)).first()
+
+    def cancel(self, job_id):
+        """
+        Cancel a job.
+
+        Queued jobs are cancelled at once; running jobs are asked to stop and
+        do so at their next checkpoint.
+
+        Returns:
+            Row: The job after the request, or None if it does not exist
+        """
+        jobs = self.jobs
+        with self.engine.connect() as conn:
+            conn.execute(
+                update(jobs)
+                .where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+                .values(status=CANCELLED, cancel_requested=True, finished_at=datetime.utcnow())
+            )
+            conn.execute(
+                update(jobs)
+                .where(jobs.c.id == job_id, jobs.c.status == RUNNING)
+                .values(cancel_requested=True)
+            )
+            conn.commit()
+            return conn.execute(select(jobs).where(jobs.c.id == job_id)).first()
+
+    def output(self, job_id):
+        """Yield the stored output chunks of a job in order."""
+        outputs = self.job_outputs
+        last = -1
+        while True:
+            # One chunk per query keeps memory flat for large outputs
+            with self.engine.connect() as conn:
+                row = conn.execute(
+                    select(outputs.c.seq, outputs.c.data)
+                    .where(outputs.c.job_id == job_id, outputs.c.seq > last)
+                    .order_by(outputs.c.seq)
+                    .limit(1)
+                ).first()
+            if row is None:
+                return
+            last = row.seq
+            yield row.data
+
+
+class JobContext:
+    """
+    What a handler sees of the job it runs.
+
+    Attributes:
+        job_id (int): The job's id
+        params (dict): Parameters given at submission
+        done (int): Progress committed by earlier attempts
+        batch_size (int): Suggested rows per checkpoint
+    """
+
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job_id = job.id
+        self.attempt = job.attempts
+        self.params = json.loads(job.params)
+        self.done = job.done
+        self.batch_size = runner.batch_size
+
+    @property
+    def engine(self):
+        return self.runner.engine
+
+    def checkpoint(self, conn, done, total=None):
+        """
+        Commit the handler's work on ``conn`` together with the job's progress.
+
+        Raises:
+            JobCancelled: If a cancel was requested; the work is committed first
+            JobLost: If another attempt owns the job; the work is rolled back
+        """
+        jobs = self.runner.jobs
+        values = {"done": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["total"] = total
+        owned = conn.execute(
+            update(jobs).where(self.runner.owned(self.job_id, self.attempt)).values(**values)
+        ).rowcount
+        if not owned:
+            conn.rollback()
+            raise JobLost()
+        cancel = conn.execute(select(jobs.c.cancel_requested).where(jobs.c.id == self.job_id)).scalar()
+        conn.commit()
+        self.done = done
+        if cancel:
+            raise JobCancelled()
+
+    def write_output(self, conn, seq, data):
+        """Store one output chunk in the caller's transaction."""
+        conn.execute(self.runner.job_outputs.insert().values(job_id=self.job_id, seq=seq, data=data))
+
+    def clear_output(self, conn):
+        """Drop output written by an earlier attempt."""
+        conn.execute(delete(self.runner.job_outputs).where(self.runner.job_outputs.c.job_id == self.job_id))
+
+
+class JobRunner:
+    """
+    Threads that claim and run queued jobs.
+
+    Args:
+        engine: SQLAlchemy engine of the primary database
+        jobs: Table from jobs_tables()
+        job_outputs: Table from jobs_tables()
+        kinds (dict): JobKind per job kind
+        threads (int): Jobs this process runs at once; 0 runs none
+        poll_seconds (float): Idle wait between looks at the queue
+        batch_size (int): Suggested rows per checkpoint
+        stale_seconds (float): Heartbeat age after which a running job is
+            considered abandoned
+        max_attempts (int): Runs before an abandoned job is failed
+        retention_seconds (float): Age after which finished jobs are deleted
+    """
+
+    def __init__(self, engine, jobs, job_outputs, kinds, threads=1, poll_seconds=1.0, batch_size=1000,
+                 stale_seconds=60.0, max_attempts=3, retention_seconds=7 * 86400):
+        self.engine = engine
+        self.jobs = jobs
+        self.job_outputs = job_outputs
+        self.kinds = kinds
+        self.threads = threads
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the runner threads (again, after a fork) unless already running."""
+        with self._start_lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            self.name = f"{socket.gethostname()}:{os.getpid()}"
+            while len(self._workers) < self.threads:
+                worker = threading.Thread(target=self._run, name=f"job-runner-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Look at the queue now instead of after the poll interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+                if not ran:
+                    self.recover()
+            except Exception as e:
+                logger.error(f"Job runner error: {str(e)}")
+                ran = False
+            if not ran:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def claim(self):
+        """Take the oldest queued job, or return None."""
+        jobs = self.jobs
+        with self.engine.connect() as conn:
+            job_id = conn.execute(
+                select(jobs.c.id)
+                .where(jobs.c.status == QUEUED)
+                .order_by(jobs.c.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalar()
+            if job_id is None:
+                conn.rollback()
+                return None
+            now = datetime.utcnow()
+            # The status check also settles races where FOR UPDATE is a no-op (SQLite)
+            claimed = conn.execute(
+                update(jobs)
+                .where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+                .values(status=RUNNING, worker=self.name, attempts=jobs.c.attempts + 1,
+                        started_at=now, heartbeat_at=now)
+            ).rowcount
+            conn.commit()
+            if not claimed:
+                return None
+            return conn.execute(select(jobs).where(jobs.c.id == job_id)).first()
+
+    def run_once(self):
+        """
+        Claim and run one job.
+
+        Returns:
+            bool: True if a job was run
+        """
+        job = self.claim()
+        if job is None:
+            return False
+
+        kind = self.kinds.get(job.kind)
+        context = JobContext(self, job)
+        logger.info(f"Job {job.id} ({job.kind}) started by {self.name}, attempt {job.attempts}")
+        started = time.monotonic()
+        running = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, job.attempts, running), daemon=True)
+        heartbeat.start()
+        try:
+            if kind is None:
+                raise ValueError(f"Unknown job kind '{job.kind}'")
+            result = kind.run(context)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+            logger.info(f"Job {job.id} cancelled after {context.done} items")
+        except JobLost:
+            logger.warning(f"Job {job.id} attempt {job.attempts} was taken over by another worker")
+        except Exception as e:
+            self._finish(job, FAILED, error=str(e))
+            logger.error(f"Job {job.id} failed: {str(e)}")
+        else:
+            self._finish(job, SUCCEEDED, result=result)
+            logger.info(f"Job {job.id} succeeded in {time.monotonic() - started:.1f}s")
+        finally:
+            running.set()
+            heartbeat.join()
+        return True
+
+    def owned(self, job_id, attempt):
+        """Condition matching a job while the given attempt still runs it."""
+        jobs = self.jobs
+        return (jobs.c.id == job_id) & (jobs.c.status == RUNNING) & (jobs.c.attempts == attempt)
+
+    def _heartbeat(self, job_id, attempt, finished):
+        # Checkpoints heartbeat too; this covers handlers stuck in one long step
+        while not finished.wait(self.stale_seconds / 4):
+            try:
+                with self.engine.connect() as conn:
+                    conn.execute(
+                        update(self.jobs).where(self.owned(job_id, attempt)).values(heartbeat_at=datetime.utcnow())
+                    )
+                    conn.commit()
+            except Exception as e:
+                logger.warning(f"Job {job_id} heartbeat failed: {str(e)}")
+
+    def _finish(self, job, status, result=None, error=None):
+        with self.engine.connect() as conn:
+            conn.execute(
+                update(self.jobs)
+                .where(self.owned(job.id, job.attempts))
+                .values(status=status, finished_at=datetime.utcnow(), error=error,
+                        result=json.dumps(result) if result is not None else None)
+            )
+            conn.commit()
+
+    def recover(self):
+        """Requeue (or fail) running jobs whose worker stopped heartbeating, and prune old jobs."""
+        jobs = self.jobs
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.stale_seconds)
+        abandoned = (jobs.c.status == RUNNING) & (jobs.c.heartbeat_at < stale)
+        with self.engine.connect() as conn:
+            failed = conn.execute(
+                update(jobs)
+                .where(abandoned, jobs.c.attempts >= self.max_attempts)
+                .values(status=FAILED, finished_at=now, error="Worker stopped responding")
+            ).rowcount
+            requeued = conn.execute(
+                update(jobs)
+                .where(abandoned, jobs.c.cancel_requested == False)  # noqa: E712
+                .values(status=QUEUED, worker=None)
+            ).rowcount
+            conn.execute(
+                update(jobs)
+                .where(abandoned)
+                .values(status=CANCELLED, finished_at=now)
+            )
+            expired = select(jobs.c.id).where(
+                jobs.c.status.in_(FINISHED),
+                jobs.c.finished_at < now - timedelta(seconds=self.retention_seconds)
+            )
+            conn.execute(delete(self.job_outputs).where(self.job_outputs.c.job_id.in_(expired)))
+            conn.execute(delete(jobs).where(jobs.c.id.in_(expired)))
+            conn.commit()
+        if failed or requeued:
+            logger.warning(f"Recovered abandoned jobs: {requeued} requeued, {failed} failed")
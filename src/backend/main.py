@@ -1,9 +1,36 @@
 import os
 import logging
+import base64
+import hmac
+import gzip
 import html
+import json
 import re
-from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, Table, Column, Integer, Text, TIMESTAMP, MetaData, select, func
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from sqlalchemy import create_engine, Table, Column, Index, BigInteger, Integer, Text, TIMESTAMP, MetaData, bindparam, inspect, select, func, literal, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.schema import CreateIndex
+
+import deadlines
+import formats
+import jobs
+from coalesce import SingleFlight
+from compression import available_encodings, compress_response
+from deadlines import DeadlineQueuePool, REQUEST_TIMEOUT_HEADER
+from memtrace import GROUPINGS, MemoryTracer
+from replicas import ReadRouter, WRITE_POSITION_COOKIE
+from shards import CODE_POINT_COLLATIONS, ShardRouter
+import sqlite_store
+from snapshot import NamesSnapshot, SharedNamesSnapshot, record_deletion, request_reload, tombstones_table
+from suggest import PrefixIndex
+from throttling import (
+    LoadShedder, LocalBucketStore, RateLimiter, RedisBucketStore,
+    REQUEST_START_HEADER, client_key, parse_trusted_proxies, retry_after
+)
 
 # Configuration from environment variables
 # Support both DATABASE_URL (Swarm/standard) and DB_URL (legacy Compose)
@@ -16,24 +43,452 @@ DATABASE_URL = os.environ.get(
     )
 )
 
+# Optional comma-separated read replica URLs; reads use the primary when empty
+DATABASE_READ_URLS = [
+    url.strip() for url in os.environ.get("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", "30"))
+# How long a client is pinned to fresh data after it writes
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", "10"))
+
+# Optional comma-separated database URLs the names table is hash-sharded across
+# (jobs stay on DATABASE_URL). Shards are numbered in list order, which must not
+# change once names are stored.
+DATABASE_SHARD_URLS = [
+    url.strip() for url in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if url.strip()
+]
+
+# Connection pool per worker (ignored for SQLite)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+# SQLite file databases (sqlite:////data/names.db): WAL mode tuning and write batching
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KIB = int(os.environ.get("SQLITE_CACHE_KIB", "65536"))
+# Inserts committed per transaction by the writer thread; 1 disables batching
+SQLITE_WRITE_BATCH_SIZE = int(os.environ.get("SQLITE_WRITE_BATCH_SIZE", "64"))
+SQLITE_WRITE_BATCH_MS = float(os.environ.get("SQLITE_WRITE_BATCH_MS", "2"))
+
+# Longest a request waits for a pooled connection, further capped by its deadline
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# Request deadlines in ms (0 disables); ROUTE_DEADLINES_MS overrides per endpoint,
+# e.g. "list_names=2000,add_name=1000". nginx's X-Request-Timeout-Ms can shorten them.
+REQUEST_DEADLINE_MS = float(os.environ.get("REQUEST_DEADLINE_MS", "0"))
+ROUTE_DEADLINES_MS = deadlines.parse_route_deadlines(os.environ.get("ROUTE_DEADLINES_MS", ""))
+
+# Per-client token bucket; RATE_LIMIT_PER_SECOND=0 disables rate limiting
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "20"))
+# Optional Redis URL so all workers share one bucket per client
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "")
+# Proxies (addresses or CIDR ranges) whose X-Forwarded-For / X-Real-IP name the
+# client; requests from anywhere else are limited by their own address
+TRUSTED_PROXIES = parse_trusted_proxies(os.environ.get("TRUSTED_PROXIES", ""))
+
+# Load shedding thresholds per worker; 0/false disables each check
+SHED_MAX_IN_FLIGHT = int(os.environ.get("SHED_MAX_IN_FLIGHT", "0"))
+SHED_MAX_QUEUE_MS = float(os.environ.get("SHED_MAX_QUEUE_MS", "0"))
+SHED_ON_POOL_EXHAUSTED = os.environ.get("SHED_ON_POOL_EXHAUSTED", "false").lower() == "true"
+SHED_RETRY_AFTER_SECONDS = float(os.environ.get("SHED_RETRY_AFTER_SECONDS", "1"))
+
+# Seconds nginx may micro-cache GET /api/names (sent as X-Accel-Expires; 0 disables)
+LIST_CACHE_SECONDS = int(os.environ.get("LIST_CACHE_SECONDS", "1"))
+
+# Response compression when clients reach the backend without nginx
+# Encodings in preference order (zstd needs the zstandard package); empty disables
+COMPRESSION_ENCODINGS = [
+    e.strip() for e in os.environ.get("COMPRESSION_ENCODINGS", "zstd,gzip").split(",")
+    if e.strip() in available_encodings()
+]
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVELS = {
+    "gzip": int(os.environ.get("GZIP_LEVEL", "6")),
+    "zstd": int(os.environ.get("ZSTD_LEVEL", "3")),
+}
+# Rows per chunk streamed by GET /api/names/export
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+# Let identical concurrent GET /api/names requests share one query and body
+REQUEST_COALESCING = os.environ.get("REQUEST_COALESCING", "true").lower() == "true"
+
+# Largest page GET /api/names?limit= will return
+LIST_MAX_PAGE_SIZE = int(os.environ.get("LIST_MAX_PAGE_SIZE", "1000"))
+
+# Store each distinct (case/whitespace-normalized) name once and count repeats
+DEDUP_NAMES = os.environ.get("DEDUP_NAMES", "false").lower() == "true"
+
+# Serve GET /api/names from a per-worker in-memory snapshot of the table
+NAMES_SNAPSHOT = os.environ.get("NAMES_SNAPSHOT", "false").lower() == "true"
+# Seconds the snapshot may lag before a read refreshes it
+SNAPSHOT_REFRESH_SECONDS = float(os.environ.get("SNAPSHOT_REFRESH_SECONDS", "1"))
+# How long delete tombstones are kept; idle snapshots older than this reload in full
+SNAPSHOT_TOMBSTONE_RETENTION_SECONDS = float(os.environ.get("SNAPSHOT_TOMBSTONE_RETENTION_SECONDS", "3600"))
+# Share one snapshot between the workers of a pod through files in this directory (tmpfs)
+SNAPSHOT_SHARED_DIR = os.environ.get("SNAPSHOT_SHARED_DIR", "")
+# Readers ignore a shared snapshot not refreshed for this long (0: five refresh intervals, at least 5 s)
+SNAPSHOT_SHARED_MAX_AGE_SECONDS = float(os.environ.get("SNAPSHOT_SHARED_MAX_AGE_SECONDS", "0"))
+
+# Answer GET /api/names/suggest from a per-worker prefix index (about 200 bytes
+# of memory per stored row in every worker, so off by default)
+NAME_SUGGEST = os.environ.get("NAME_SUGGEST", "false").lower() == "true"
+# Seconds the index may lag writes made by other workers
+SUGGEST_REFRESH_SECONDS = float(os.environ.get("SUGGEST_REFRESH_SECONDS", "5"))
+# Most suggestions one request may ask for
+SUGGEST_MAX_LIMIT = int(os.environ.get("SUGGEST_MAX_LIMIT", "50"))
+
+# Background jobs (POST /api/jobs): runner threads per backend process (0 runs none here)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+# Rows each job commits per checkpoint
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "1000"))
+# A running job without a heartbeat for this long is handed to another worker
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs and their output are deleted after this long
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", "604800"))
+# Most names one import job may carry
+JOB_MAX_IMPORT_NAMES = int(os.environ.get("JOB_MAX_IMPORT_NAMES", "1000000"))
+
+# Memory diagnostics (GET /api/diagnostics/memory): traces allocations with
+# tracemalloc, which slows every request, so leave it off outside investigations
+MEMORY_DIAGNOSTICS = os.environ.get("MEMORY_DIAGNOSTICS", "false").lower() == "true"
+# Bearer token the diagnostics endpoints require; they stay off without one
+DIAGNOSTICS_TOKEN = os.environ.get("DIAGNOSTICS_TOKEN", "")
+# Stack frames recorded per allocation; more give fuller tracebacks but cost more
+MEMORY_TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", "1"))
+# Largest requests remembered per worker, and snapshots kept for diffs
+MEMORY_TOP_REQUESTS = int(os.environ.get("MEMORY_TOP_REQUESTS", "20"))
+MEMORY_SNAPSHOTS = int(os.environ.get("MEMORY_SNAPSHOTS", "4"))
+# Log a warning for requests whose peak exceeds this many MiB (0 disables)
+MEMORY_WARN_PEAK_MB = float(os.environ.get("MEMORY_WARN_PEAK_MB", "0"))
+
 MAX_NAME_LENGTH = int(os.environ.get("MAX_NAME_LENGTH", "50"))
 DB_ECHO = os.environ.get("DB_ECHO", "false").lower() == "true"
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", "8000"))
 
-engine = create_engine(DATABASE_URL, echo=DB_ECHO, future=True)
+def engine_options(url: str) -> dict:
+    """Pool settings for create_engine; SQLite keeps its default pool."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": DeadlineQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+engine = create_engine(DATABASE_URL, echo=DB_ECHO, future=True, **engine_options(DATABASE_URL))
+if DATABASE_SHARD_URLS and DATABASE_READ_URLS:
+    # Replicas mirror one database, not a set of shards
+    logging.getLogger(__name__).warning("DATABASE_READ_URLS is not supported with DATABASE_SHARD_URLS; ignoring replicas")
+    DATABASE_READ_URLS = []
+read_router = ReadRouter(
+    engine,
+    [
+        create_engine(url, echo=DB_ECHO, future=True, pool_pre_ping=True, **engine_options(url))
+        for url in DATABASE_READ_URLS
+    ],
+    max_lag_seconds=REPLICA_MAX_LAG_SECONDS,
+    retry_seconds=REPLICA_RETRY_SECONDS,
+)
+shard_router = None
+if DATABASE_SHARD_URLS:
+    shard_router = ShardRouter([
+        create_engine(url, echo=DB_ECHO, future=True, pool_pre_ping=True, **engine_options(url))
+        for url in DATABASE_SHARD_URLS
+    ])
+for db_engine in [engine, *read_router.replicas, *(shard_router.engines if shard_router else [])]:
+    deadlines.install_statement_timeout(db_engine)
+
+write_batcher = None
+if sqlite_store.is_file_url(DATABASE_URL):
+    sqlite_store.install_pragmas(
+        engine,
+        mmap_size=SQLITE_MMAP_SIZE,
+        busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+        cache_kib=SQLITE_CACHE_KIB,
+    )
+    if SQLITE_WRITE_BATCH_SIZE > 1:
+        write_batcher = sqlite_store.WriteBatcher(engine, SQLITE_WRITE_BATCH_SIZE, SQLITE_WRITE_BATCH_MS)
+# Local SQLite files can stand in for shard servers during development
+for url, shard_engine in zip(DATABASE_SHARD_URLS, shard_router.engines if shard_router else []):
+    if sqlite_store.is_file_url(url):
+        sqlite_store.install_pragmas(
+            shard_engine,
+            mmap_size=SQLITE_MMAP_SIZE,
+            busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+            cache_kib=SQLITE_CACHE_KIB,
+        )
 metadata = MetaData()
 
 table = Table(
     "names",
     metadata,
-    Column("id", Integer, primary_key=True),
+    # 64-bit so sharded mode can store snowflake ids; SQLite only
+    # autoincrements a plain INTEGER primary key
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True),
     Column("name", Text, nullable=False),
-    Column("created_at", TIMESTAMP, server_default=func.now())
+    # NOT NULL so every row has a keyset cursor value for sort=created_at
+    Column("created_at", TIMESTAMP, nullable=False, server_default=func.now()),
+    # Only populated in DEDUP_NAMES mode; NULL keys never conflict
+    Column("name_key", Text, nullable=True),
+    Column("occurrences", Integer, nullable=False, server_default="1")
 )
 
+names_name_key_idx = Index("names_name_key_idx", table.c.name_key, unique=True)
+# Covering indexes for the name and created_at sorts; descending sorts scan
+# them backwards. The id sort uses the primary key: rows are stored roughly
+# in id order, so its heap fetches are as cheap as an index-only scan.
+# INCLUDE is PostgreSQL-only, other dialects get the plain keys.
+SORT_INDEXES = [
+    Index("names_name_id_idx", table.c.name, table.c.id, postgresql_include=["created_at"]),
+    Index("names_created_at_id_idx", table.c.created_at, table.c.id, postgresql_include=["name"]),
+]
+
+tombstones = tombstones_table(metadata)
+jobs_table, job_outputs = jobs.jobs_tables(metadata)
+
+# Dialects that support INSERT ... ON CONFLICT for DEDUP_NAMES mode
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def normalize_name(sanitized_name: str) -> str:
+    """
+    Build the deduplication key for a name.
+    
+    Args:
+        sanitized_name (str): Name as returned by sanitize_input/validation
+        
+    Returns:
+        str: Case-folded name with whitespace collapsed to single spaces
+    """
+    return " ".join(sanitized_name.split()).casefold()
+
+# Stands in for a missing created_at (rows restored from old backups); sorts first
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1)
+
+def migrate_created_at(names_engine):
+    """
+    Backfill NULL created_at values and make the column NOT NULL.
+
+    Tables created before the column was NOT NULL may hold NULLs, e.g. from
+    restored backups, which keyset cursors cannot resume after. Cheap once
+    done: the NULL lookup uses the (created_at, id) index.
+    """
+    with names_engine.begin() as conn:
+        conn.execute(
+            table.update().where(table.c.created_at.is_(None)).values(created_at=UNKNOWN_CREATED_AT)
+        )
+        if conn.dialect.name == "postgresql":
+            nullable = conn.execute(text(
+                "SELECT is_nullable FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = 'names' AND column_name = 'created_at'"
+            )).scalar()
+            if nullable == "YES":
+                conn.execute(text("ALTER TABLE names ALTER COLUMN created_at SET NOT NULL"))
+
+def migrate_tombstone_ids(primary_engine):
+    """
+    Widen names_tombstones.name_id to BIGINT on PostgreSQL.
+
+    Tables created before the column matched names.id reject tombstones for
+    ids above 2^31. The table only holds recent deletes, so the rewrite is quick.
+    """
+    with primary_engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            return
+        data_type = conn.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'names_tombstones' AND column_name = 'name_id'"
+        )).scalar()
+        if data_type == "integer":
+            conn.execute(text("ALTER TABLE names_tombstones ALTER COLUMN name_id TYPE BIGINT"))
+
+def migrate_sort_indexes(names_engine):
+    """
+    Create the SORT_INDEXES that an existing names table lacks.
+
+    On PostgreSQL the indexes are built CONCURRENTLY, so the API keeps writing
+    meanwhile, under a session advisory lock so only one worker builds them.
+    An index left invalid by an interrupted build is dropped and rebuilt.
+    """
+    with names_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name != "postgresql":
+            for index in SORT_INDEXES:
+                index.create(conn, checkfirst=True)
+            return
+        conn.execute(text("SELECT pg_advisory_lock(hashtext('names_migration'))"))
+        try:
+            # Superseded by the primary key for sort=id
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS names_id_covering_idx"))
+            for index in SORT_INDEXES:
+                valid = conn.execute(
+                    text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                    {"name": index.name},
+                ).scalar()
+                if valid:
+                    continue
+                if valid is not None:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY {index.name}"))
+                ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+                conn.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('names_migration'))"))
+
+def lock_migration(conn):
+    """
+    Serialize a startup migration transaction between workers.
+    
+    Every worker runs the migrations on import. PostgreSQL takes a transaction
+    advisory lock; SQLite takes its write lock up front, so two workers never
+    act on the same read.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('names_migration'))"))
+    elif conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def migrate_dedup_columns(names_engine):
+    """
+    Add the DEDUP_NAMES columns and unique index to an existing names table.
+    
+    create_all only creates missing tables, so tables from before dedup mode
+    lack name_key and occurrences, and the ON CONFLICT target with them.
+    """
+    with names_engine.begin() as conn:
+        lock_migration(conn)
+        columns = {c["name"] for c in inspect(conn).get_columns("names")}
+        if "name_key" not in columns:
+            conn.execute(text("ALTER TABLE names ADD COLUMN name_key TEXT"))
+        if "occurrences" not in columns:
+            conn.execute(text("ALTER TABLE names ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1"))
+        names_name_key_idx.create(conn, checkfirst=True)
+
+def migrate_name_keys(names_engine, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Key the rows stored without a name_key and merge equivalent names.
+    
+    Rows written while DEDUP_NAMES was off have a NULL key. Each batch, in id
+    order, keeps one row per key and adds the others' occurrences to it before
+    deleting them. The kept row is the one already holding the key, if any, so
+    ids handed out in dedup mode stay valid; otherwise it is the oldest row.
+    
+    Returns:
+        int: Number of rows merged away
+    """
+    merged = 0
+    while True:
+        with names_engine.begin() as conn:
+            lock_migration(conn)
+            rows = conn.execute(
+                select(table.c.id, table.c.name, table.c.occurrences)
+                .where(table.c.name_key.is_(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return merged
+            groups = {}
+            for row in rows:
+                groups.setdefault(normalize_name(row.name), []).append(row)
+            keyed = dict(conn.execute(
+                select(table.c.name_key, table.c.id).where(table.c.name_key.in_(list(groups)))
+            ).all())
+            updates, extra_ids = [], []
+            for key, group in groups.items():
+                keep_id = keyed.get(key, group[0].id)
+                extra = [row for row in group if row.id != keep_id]
+                extra_ids.extend(row.id for row in extra)
+                updates.append({
+                    "keep_id": keep_id,
+                    "key": key,
+                    "merged": sum(row.occurrences for row in extra),
+                })
+            if extra_ids:
+                conn.execute(table.delete().where(table.c.id.in_(extra_ids)))
+            conn.execute(
+                table.update().where(table.c.id == bindparam("keep_id")).values(
+                    name_key=bindparam("key"),
+                    occurrences=table.c.occurrences + bindparam("merged"),
+                ),
+                updates,
+            )
+            merged += len(extra_ids)
+
 metadata.create_all(engine)
+if shard_router is not None:
+    for shard_engine in shard_router.engines:
+        metadata.create_all(shard_engine, tables=[table])
+        collation = CODE_POINT_COLLATIONS.get(shard_engine.dialect.name)
+        if collation:
+            # Index for sort=name, which compares names by code point when sharded
+            with shard_engine.begin() as conn:
+                conn.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS names_name_code_point_id_idx '
+                    f'ON names (name COLLATE "{collation}", id)'
+                ))
+migrate_tombstone_ids(engine)
+for names_engine in (shard_router.engines if shard_router is not None else [engine]):
+    migrate_created_at(names_engine)
+    migrate_dedup_columns(names_engine)
+    migrate_sort_indexes(names_engine)
+if DEDUP_NAMES and shard_router is None:
+    merged_names = migrate_name_keys(engine)
+    if merged_names:
+        logging.getLogger(__name__).info(f"DEDUP_NAMES - Merged {merged_names} duplicate names into existing rows")
+elif DEDUP_NAMES:
+    # Rows placed by id may sit on another shard than their key's, so merging
+    # within each shard would leave duplicates behind
+    for shard_engine in shard_router.engines:
+        with shard_engine.connect() as conn:
+            if conn.execute(select(table.c.id).where(table.c.name_key.is_(None)).limit(1)).first():
+                raise RuntimeError(
+                    "DEDUP_NAMES needs every sharded row to have a name_key; "
+                    "rows written without dedup cannot be merged across shards"
+                )
+
+name_snapshot = None
+if NAMES_SNAPSHOT and shard_router is not None:
+    # Snapshot refreshes follow one database's ids and tombstones
+    logging.getLogger(__name__).warning("NAMES_SNAPSHOT is not supported with DATABASE_SHARD_URLS; reading from the shards")
+elif NAMES_SNAPSHOT and DEDUP_NAMES:
+    # occurrences change in place, which id-based refreshes cannot see
+    logging.getLogger(__name__).warning("NAMES_SNAPSHOT is not supported with DEDUP_NAMES; reading from the database")
+elif NAMES_SNAPSHOT:
+    name_snapshot = NamesSnapshot(
+        table,
+        tombstones,
+        refresh_seconds=SNAPSHOT_REFRESH_SECONDS,
+        retention_seconds=SNAPSHOT_TOMBSTONE_RETENTION_SECONDS,
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    if SNAPSHOT_SHARED_DIR:
+        name_snapshot = SharedNamesSnapshot(
+            name_snapshot,
+            SNAPSHOT_SHARED_DIR,
+            read_router.execute,
+            max_age_seconds=SNAPSHOT_SHARED_MAX_AGE_SECONDS or None,
+        )
+
+list_flight = SingleFlight() if REQUEST_COALESCING else None
+
+rate_limiter = RateLimiter(
+    RedisBucketStore.from_url(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else LocalBucketStore(),
+    rate=RATE_LIMIT_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+)
+load_shedder = LoadShedder(
+    max_in_flight=SHED_MAX_IN_FLIGHT,
+    max_queue_ms=SHED_MAX_QUEUE_MS,
+    engine=engine,
+    pool_capacity=DB_POOL_SIZE + DB_MAX_OVERFLOW if SHED_ON_POOL_EXHAUSTED else 0,
+)
 
 app = Flask(__name__)
 
@@ -46,6 +501,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+memory_tracer = None
+if MEMORY_DIAGNOSTICS and not DIAGNOSTICS_TOKEN:
+    logger.warning("MEMORY_DIAGNOSTICS needs DIAGNOSTICS_TOKEN; memory diagnostics are disabled")
+elif MEMORY_DIAGNOSTICS:
+    memory_tracer = MemoryTracer(
+        frames=MEMORY_TRACE_FRAMES,
+        top_requests=MEMORY_TOP_REQUESTS,
+        snapshots=MEMORY_SNAPSHOTS,
+    )
+    # Started before the app serves anything, so workers inherit the baseline
+    memory_tracer.start()
+
 def sanitize_input(text: str) -> str:
     """
     Sanitize user input to prevent XSS attacks and other malicious content.
@@ -103,6 +570,329 @@ def validation(name: str):
     
     return True, sanitized_name
 
+def upsert_name(conn, name: str, name_id=None):
+    """
+    Insert a name, or count another occurrence of an equivalent stored name.
+    
+    Args:
+        conn: Open database connection
+        name (str): Sanitized name to store
+        name_id (int): Id for a new row in sharded mode; None lets the database pick
+        
+    Returns:
+        Row: (id, name, occurrences) of the stored name; the name keeps the
+        spelling of its first submission
+    """
+    insert = UPSERT_INSERTS[conn.dialect.name](table).values(
+        name=name,
+        name_key=normalize_name(name),
+        **({"id": name_id} if name_id is not None else {})
+    )
+    stmt = insert.on_conflict_do_update(
+        index_elements=[table.c.name_key],
+        set_={"occurrences": table.c.occurrences + 1}
+    ).returning(table.c.id, table.c.name, table.c.occurrences)
+    return conn.execute(stmt).one()
+
+def insert_name(conn, name: str, name_id=None):
+    """Insert a name and return its new id (name_id when given, as in sharded mode)."""
+    if name_id is not None:
+        conn.execute(table.insert().values(id=name_id, name=name))
+        return name_id
+    result = conn.execute(table.insert().values(name=name))
+    return result.inserted_primary_key[0] if result.inserted_primary_key else None
+
+def write(work, name_key=None):
+    """
+    Run a write callable in its own committed transaction.
+    
+    Goes through the SQLite writer thread when write batching is enabled. In
+    sharded mode the router picks the shard and the new row's id.
+    
+    Args:
+        work: Callable taking a connection, and the new row's id when sharded
+        name_key (str): Normalized name to place the row by when sharded, or
+            None to place it by id
+        
+    Returns:
+        tuple: (result of work, primary write position or None)
+    """
+    if shard_router is not None:
+        return shard_router.insert(work, name_key), None
+    if write_batcher is not None:
+        # Queued writes give up at the deadline like a pool checkout would
+        return write_batcher.submit(work, timeout=deadlines.remaining_seconds()), None
+    with engine.connect() as conn:
+        result = work(conn)
+        conn.commit()
+        position = read_router.write_position(conn) if read_router.enabled else None
+    return result, position
+
+# Orderings GET /api/names?sort= accepts; a leading "-" means descending
+SORT_KEYS = {
+    "id": table.c.id,
+    "name": table.c.name,
+    "created_at": table.c.created_at,
+}
+if shard_router is not None and shard_router.dialect in CODE_POINT_COLLATIONS:
+    # Sharded pages are merged in Python, which compares names by code point
+    SORT_KEYS["name"] = table.c.name.collate(CODE_POINT_COLLATIONS[shard_router.dialect])
+
+# SQLite compares timestamps as text and its CURRENT_TIMESTAMP default has no
+# fraction; whole-second cursor values are bound in that same format
+WHOLE_SECOND_TIMESTAMP = TIMESTAMP().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
+def encode_cursor(sort_key, row):
+    """
+    Build the opaque cursor that resumes a listing after a row.
+    
+    Args:
+        sort_key (str): Sort key without direction
+        row: Last row of the page
+        
+    Returns:
+        str: URL-safe token holding the row's sort value and id
+    """
+    value = getattr(row, sort_key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row.id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(sort_key, cursor):
+    """
+    Read a cursor made by encode_cursor for the same sort key.
+    
+    Returns:
+        tuple: (value, id)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if not isinstance(row_id, int):
+        raise ValueError("Invalid cursor.")
+    if sort_key == "id":
+        if value != row_id:
+            raise ValueError("Invalid cursor.")
+    elif sort_key == "created_at":
+        value = datetime.fromisoformat(value) if isinstance(value, str) else None
+        if value is None:
+            raise ValueError("Invalid cursor.")
+    elif not isinstance(value, str):
+        raise ValueError("Invalid cursor.")
+    return value, row_id
+
+def parse_page_params(args):
+    """
+    Read ordering and keyset pagination parameters for GET /api/names.
+    
+    Pages resume from ``cursor`` (any sort) or ``after_id`` (id sorts only).
+    
+    Args:
+        args: Request query string (request.args)
+        
+    Returns:
+        tuple: (is_valid: bool, result) where result is (limit, sort, after) or
+        an error message; limit is None when the whole list was requested,
+        sort is (key, descending) and after is the (value, id) of the row the
+        page starts after, or None
+    """
+    raw_sort = args.get("sort", "id")
+    sort_key = raw_sort.lstrip("-")
+    if sort_key not in SORT_KEYS or raw_sort.count("-") > 1:
+        return False, f"sort must be one of {', '.join(k + '|-' + k for k in SORT_KEYS)}."
+    sort = (sort_key, raw_sort.startswith("-"))
+
+    raw_limit = args.get("limit")
+    raw_after = args.get("after_id")
+    raw_cursor = args.get("cursor")
+    if raw_limit is None:
+        if raw_after is not None or raw_cursor is not None:
+            return False, "after_id and cursor require limit."
+        return True, (None, sort, None)
+    if raw_after is not None and raw_cursor is not None:
+        return False, "Use either after_id or cursor, not both."
+    if raw_after is not None and sort_key != "id":
+        return False, "after_id only works with sort=id or sort=-id; use cursor."
+
+    try:
+        limit = int(raw_limit)
+        after_id = int(raw_after) if raw_after is not None else None
+    except ValueError:
+        return False, "limit and after_id must be integers."
+
+    if limit < 1 or limit > LIST_MAX_PAGE_SIZE:
+        return False, f"limit must be between 1 and {LIST_MAX_PAGE_SIZE}."
+    if after_id is not None and after_id < 0:
+        return False, "after_id cannot be negative."
+
+    after = (after_id, after_id) if after_id is not None else None
+    if raw_cursor is not None:
+        try:
+            after = decode_cursor(sort_key, raw_cursor)
+        except ValueError as e:
+            return False, str(e)
+
+    return True, (limit, sort, after)
+
+def list_query(columns, sort, after, fetch):
+    """
+    Build the keyset query for one listing page.
+    
+    Ties on name or created_at are broken by id, so each ordering matches the
+    primary key or one of SORT_INDEXES and a page is an index range scan,
+    never a sort.
+    """
+    sort_key, descending = sort
+    key = SORT_KEYS[sort_key]
+    order = [key] if sort_key == "id" else [key, table.c.id]
+    stmt = select(*columns).order_by(*(c.desc() if descending else c.asc() for c in order))
+    if after is not None:
+        value, row_id = after
+        if sort_key == "id":
+            stmt = stmt.where(key < row_id if descending else key > row_id)
+        else:
+            # Row comparison keeps the range on the (key, id) index. created_at
+            # is NOT NULL, so no row falls outside the comparison.
+            if isinstance(value, datetime) and value.microsecond == 0:
+                value = literal(value, WHOLE_SECOND_TIMESTAMP)
+            else:
+                value = literal(value, key.type)
+            position = tuple_(key, table.c.id)
+            bound = tuple_(value, row_id)
+            stmt = stmt.where(position < bound if descending else position > bound)
+    if fetch is not None:
+        stmt = stmt.limit(fetch)
+    return stmt
+
+def sort_value(sort_key):
+    """Key function ordering rows the way list_query sorts them."""
+    if sort_key == "id":
+        return lambda row: row.id
+    return lambda row: (getattr(row, sort_key), row.id)
+
+def names_engines():
+    """Engines holding the names table: every shard, or just the primary."""
+    return shard_router.engines if shard_router is not None else [engine]
+
+def remember_write(response, position):
+    """
+    Pin the client to data at least as new as its last write.
+
+    Args:
+        response: Flask response for the write request
+        position (str or None): Primary write position from the read router
+    """
+    if read_router.enabled or name_snapshot is not None:
+        response.set_cookie(
+            WRITE_POSITION_COOKIE,
+            position or "primary",
+            max_age=READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="Lax"
+        )
+    return response
+
+def deadline_response(route: str, error):
+    """
+    Turn a database error caused by the request deadline into a response.
+
+    Args:
+        route (str): Route label for the log, e.g. "GET /api/names"
+        error: The exception raised by the handler
+
+    Returns:
+        tuple or None: 503 when no connection freed up in time, 504 when a
+        query was cancelled at the deadline, None for any other error
+    """
+    kind = deadlines.classify(error)
+    if kind == "pool":
+        logger.warning(f"{route} - Timed out waiting for a database connection")
+        response = jsonify({"error": "Server is busy, please retry shortly"})
+        response.headers["Retry-After"] = retry_after(SHED_RETRY_AFTER_SECONDS)
+        return response, 503
+    if kind == "statement":
+        logger.warning(f"{route} - Query cancelled at the request deadline")
+        return jsonify({"error": "Request deadline exceeded"}), 504
+    return None
+
+@app.before_request
+def guard_request():
+    """Shed load, apply per-client rate limits and start the request deadline."""
+    # Probes must keep answering while the API is busy
+    if request.path == "/healthz" or request.path.startswith("/api/health"):
+        return None
+
+    budget = deadlines.request_budget_ms(
+        ROUTE_DEADLINES_MS.get(request.endpoint, REQUEST_DEADLINE_MS),
+        request.headers.get(REQUEST_TIMEOUT_HEADER),
+        request.headers.get(REQUEST_START_HEADER)
+    )
+    if budget is not None and budget <= 0:
+        logger.warning(f"{request.method} {request.path} - Deadline passed before the request started")
+        return jsonify({"error": "Request deadline exceeded"}), 504
+
+    reason = load_shedder.overload_reason(request.headers.get(REQUEST_START_HEADER))
+    if reason:
+        logger.warning(f"{request.method} {request.path} - Shedding load: {reason}")
+        response = jsonify({"error": "Server is busy, please retry shortly"})
+        response.headers["Retry-After"] = retry_after(SHED_RETRY_AFTER_SECONDS)
+        return response, 503
+
+    key = client_key(request, TRUSTED_PROXIES)
+    wait = rate_limiter.check(key)
+    if wait:
+        logger.warning(f"{request.method} {request.path} - Rate limit exceeded for {key}")
+        response = jsonify({"error": "Too many requests"})
+        response.headers["Retry-After"] = retry_after(wait)
+        return response, 429
+
+    load_shedder.enter()
+    g.admitted = True
+    deadlines.start(budget)
+    return None
+
+@app.teardown_request
+def release_request(exc):
+    if g.pop("admitted", False):
+        load_shedder.exit()
+        deadlines.finish()
+
+@app.before_request
+def trace_request_memory():
+    """Start measuring the request's memory peak when diagnostics are on."""
+    # Reading the diagnostics would otherwise show up in them
+    if memory_tracer is not None and not request.path.startswith("/api/diagnostics"):
+        g.memory_trace = memory_tracer.begin()
+
+@app.teardown_request
+def finish_request_memory(exc):
+    trace = g.pop("memory_trace", None)
+    if trace is None:
+        return
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+    peak_bytes = memory_tracer.end(trace, route)
+    if MEMORY_WARN_PEAK_MB and peak_bytes > MEMORY_WARN_PEAK_MB * 1024 * 1024:
+        logger.warning(f"{route} - Request peaked at {peak_bytes / (1024 * 1024):.1f} MiB of Python memory")
+
+@app.after_request
+def compress(response):
+    """Compress large and streamed responses for clients that accept it."""
+    if not COMPRESSION_ENCODINGS:
+        return response
+    return compress_response(
+        response,
+        request.headers.get("Accept-Encoding", ""),
+        COMPRESSION_ENCODINGS,
+        min_size=COMPRESSION_MIN_BYTES,
+        levels=COMPRESSION_LEVELS
+    )
+
 @app.route("/api/names", methods=["POST"])
 def add_name():
     logger.info("POST /api/names - Request received")
@@ -120,71 +910,564 @@ def add_name():
         logger.warning(f"POST /api/names - Validation failed: {name}")
         return jsonify({"error": name}), 400
 
+    if DEDUP_NAMES:
+        return add_name_deduplicated(name)
+
     try:
-        with engine.connect() as conn:
-            insert = table.insert().values(name=name)
-            result = conn.execute(insert)
-            conn.commit() 
-            if result.inserted_primary_key:
-                new_id = result.inserted_primary_key[0]
-            else:
-                new_id = None
+        new_id, position = write(lambda conn, name_id=None: insert_name(conn, name, name_id))
+        if name_index is not None:
+            name_index.add(new_id, name)
         
         logger.info(f"POST /api/names - Successfully added name '{name}' with ID {new_id}")
-        return jsonify({"id": new_id, "name": name}), 201
+        return remember_write(jsonify({"id": new_id, "name": name}), position), 201
     
     except Exception as e:
+        timed_out = deadline_response("POST /api/names", e)
+        if timed_out:
+            return timed_out
         logger.error(f"POST /api/names - Database error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route("/api/names", methods=["GET"])
-def list_names():
-    logger.info("GET /api/names - Request received")
-    
+def add_name_deduplicated(name: str):
+    """Store a validated name in DEDUP_NAMES mode."""
     try:
-        with engine.connect() as conn:
-            stmt = select(
-                table.c.id,
-                table.c.name,
-                table.c.created_at
-            ).order_by(table.c.id.asc())
-            rows = conn.execute(stmt).fetchall()
+        row, position = write(
+            lambda conn, name_id=None: upsert_name(conn, name, name_id),
+            normalize_name(name)
+        )
+        if name_index is not None:
+            name_index.add(row.id, row.name)
+
+        if row.occurrences == 1:
+            logger.info(f"POST /api/names - Successfully added name '{row.name}' with ID {row.id}")
+            status_code = 201
+        else:
+            logger.info(f"POST /api/names - Name '{name}' matches ID {row.id} ({row.occurrences} occurrences)")
+            status_code = 200
+
+        body = {"id": row.id, "name": row.name, "occurrences": row.occurrences}
+        return remember_write(jsonify(body), position), status_code
 
+    except Exception as e:
+        timed_out = deadline_response("POST /api/names", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"POST /api/names - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def render_names_page(limit, sort, after, media_type, min_position):
+    """
+    Query one GET /api/names page and encode its body.
+    
+    Returns:
+        tuple: (body bytes, number of names)
+    """
+    # One extra row tells us whether another page follows
+    fetch = limit + 1 if limit is not None else None
+    # The snapshot is kept in id order; other sorts read the indexes.
+    # Clients that just wrote must see their write.
+    if name_snapshot is not None and sort == ("id", False) and name_snapshot.ensure_fresh(
+        lambda work: read_router.execute(work, min_position),
+        force=min_position is not None
+    ):
+        rows = name_snapshot.page(after[1] if after else None, fetch)
+    else:
+        columns = [table.c.id, table.c.name, table.c.created_at]
+        if DEDUP_NAMES:
+            columns.append(table.c.occurrences)
+        stmt = list_query(columns, sort, after, fetch)
+        if shard_router is not None:
+            # Every shard returns its own first page; the merge keeps the best
+            rows = shard_router.merge(
+                lambda conn: conn.execute(stmt).fetchall(),
+                sort_value(sort[0]),
+                descending=sort[1],
+                limit=fetch
+            )
+        else:
+            rows = read_router.execute(
+                lambda conn: conn.execute(stmt).fetchall(),
+                min_position
+            )
+
+    has_more = limit is not None and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+
+    next_after_id = rows[-1].id if has_more else None
+    next_cursor = encode_cursor(sort[0], rows[-1]) if has_more else None
+
+    if media_type == formats.JSON:
         results = []
         for r in rows:
-            results.append({
+            item = {
                 "id": r.id,
                 "name": r.name,
                 "created_at": r.created_at.isoformat() if r.created_at else None
-            })
+            }
+            if DEDUP_NAMES:
+                item["occurrences"] = r.occurrences
+            results.append(item)
+        body = {"names": results}
+        if limit is not None:
+            body["next_cursor"] = next_cursor
+            if sort[0] == "id":
+                body["next_after_id"] = next_after_id
+        data = jsonify(body).get_data()
+    else:
+        body = formats.columns(rows, with_occurrences=DEDUP_NAMES)
+        if limit is not None:
+            body["next_cursor"] = next_cursor
+            if sort[0] == "id":
+                body["next_after_id"] = next_after_id
+        data = formats.encode(body, media_type)
+
+    return data, len(rows)
 
-        logger.info(f"GET /api/names - Successfully retrieved {len(results)} names")
-        return jsonify({"names": results}), 200
+@app.route("/api/names", methods=["GET"])
+def list_names():
+    logger.info("GET /api/names - Request received")
+    
+    status, page = parse_page_params(request.args)
+    if not status:
+        logger.warning(f"GET /api/names - Invalid pagination: {page}")
+        return jsonify({"error": page}), 400
+    limit, sort, after = page
+    media_type = formats.negotiate(request.accept_mimetypes, formats.JSON)
+
+    try:
+        min_position = request.cookies.get(WRITE_POSITION_COOKIE)
+        # Clients that just wrote need their own read; everyone else may share
+        if list_flight is not None and min_position is None:
+            try:
+                (data, count), shared = list_flight.do(
+                    (limit, sort, after, media_type),
+                    lambda: render_names_page(limit, sort, after, media_type, None),
+                    timeout=deadlines.remaining_seconds()
+                )
+            except TimeoutError as e:
+                # Waiting on another request's query is waiting for a connection
+                raise PoolTimeoutError("Timed out waiting for a coalesced list request") from e
+        else:
+            data, count = render_names_page(limit, sort, after, media_type, min_position)
+            shared = False
+
+        logger.info(f"GET /api/names - Successfully retrieved {count} names" + (" (coalesced)" if shared else ""))
+        response = Response(data, mimetype=media_type)
+        response.vary.add("Accept")
+        # Shared proxy cache only; browsers always revalidate
+        response.headers["X-Accel-Expires"] = str(LIST_CACHE_SECONDS)
+        response.headers["Cache-Control"] = "no-cache"
+        return response, 200
     
     except Exception as e:
+        timed_out = deadline_response("GET /api/names", e)
+        if timed_out:
+            return timed_out
         logger.error(f"GET /api/names - Database error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route("/api/names/suggest", methods=["GET"])
+def suggest_names():
+    """
+    Suggest stored names starting with ?prefix= for typeahead.
+    
+    Matching ignores case and repeated whitespace. ``exists`` tells whether a
+    stored name matches the whole prefix, so clients can warn about
+    duplicates without loading the list.
+    """
+    logger.debug("GET /api/names/suggest - Request received")
+    if name_index is None:
+        return jsonify({"error": "Name suggestions are disabled."}), 404
+
+    prefix = sanitize_input(request.args.get("prefix", ""))
+    if not prefix:
+        return jsonify({"error": "prefix is required."}), 400
+    if len(prefix) > MAX_NAME_LENGTH:
+        return jsonify({"error": f"Max length is {MAX_NAME_LENGTH} characters."}), 400
+    try:
+        limit = int(request.args.get("limit", "10"))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer."}), 400
+    if limit < 1 or limit > SUGGEST_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {SUGGEST_MAX_LIMIT}."}), 400
+
+    try:
+        min_position = request.cookies.get(WRITE_POSITION_COOKIE)
+        name_index.ensure_fresh(lambda work: read_router.execute(work, min_position))
+        suggestions, exists = name_index.suggest(prefix, limit)
+    except Exception as e:
+        timed_out = deadline_response("GET /api/names/suggest", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"GET /api/names/suggest - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    return jsonify({
+        "prefix": prefix,
+        "exists": exists,
+        "suggestions": [{"name": s.name, "count": s.count} for s in suggestions],
+    }), 200
+
+def export_batches(stmt, min_position):
+    """
+    Stream an id-ordered query in EXPORT_BATCH_SIZE batches.
+    
+    Sharded mode merges a cursor on every shard; otherwise the query streams
+    from one read connection.
+    """
+    if shard_router is not None:
+        yield from shard_router.stream(stmt, sort_value("id"), EXPORT_BATCH_SIZE)
+        return
+    with read_router.connection(min_position) as conn:
+        result = conn.execution_options(
+            stream_results=True,
+            yield_per=EXPORT_BATCH_SIZE
+        ).execute(stmt)
+        yield from result.partitions()
+
+@app.route("/api/names/export", methods=["GET"])
+def export_names():
+    """
+    Stream every name without buffering the table.
+    
+    Sends NDJSON rows by default; clients asking for columnar JSON or
+    MessagePack get one columnar batch per EXPORT_BATCH_SIZE rows instead.
+    """
+    logger.info("GET /api/names/export - Request received")
+    media_type = formats.negotiate(request.accept_mimetypes, formats.NDJSON)
+
+    stmt = select(
+        table.c.id,
+        table.c.name,
+        table.c.created_at
+    ).order_by(table.c.id.asc())
+    min_position = request.cookies.get(WRITE_POSITION_COOKIE)
+
+    def generate():
+        exported = 0
+        try:
+            for rows in export_batches(stmt, min_position):
+                exported += len(rows)
+                if media_type == formats.NDJSON:
+                    yield "".join(
+                        json.dumps({
+                            "id": r.id,
+                            "name": r.name,
+                            "created_at": r.created_at.isoformat() if r.created_at else None
+                        }) + "\n"
+                        for r in rows
+                    )
+                else:
+                    yield formats.encode_stream_chunk(formats.columns(rows), media_type)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated stream
+            logger.error(f"GET /api/names/export - Database error after {exported} rows: {str(e)}")
+            return
+        logger.info(f"GET /api/names/export - Successfully exported {exported} names")
+
+    response = Response(generate(), mimetype=media_type)
+    response.vary.add("Accept")
+    return response
+
 @app.route("/api/names/<int:name_id>", methods=["DELETE"])
 def delete_name(name_id):
     logger.info(f"DELETE /api/names/{name_id} - Request received")
     
+    # A snowflake id names its shard
+    names_engine = shard_router.engine_for_id(name_id) if shard_router is not None else engine
+    if names_engine is None:
+        logger.warning(f"DELETE /api/names/{name_id} - Name not found")
+        return jsonify({"error": "Name not found"}), 404
+    
     try:
-        with engine.connect() as conn:
+        with names_engine.connect() as conn:
             stmt = table.delete().where(table.c.id == name_id)
             result = conn.execute(stmt)
+            if result.rowcount and (name_snapshot is not None or name_index is not None):
+                record_deletion(conn, tombstones, [name_id], SNAPSHOT_TOMBSTONE_RETENTION_SECONDS)
             conn.commit()
             if result.rowcount == 0:
                 logger.warning(f"DELETE /api/names/{name_id} - Name not found")
                 return jsonify({"error": "Name not found"}), 404
+            if name_index is not None:
+                name_index.discard(name_id)
+            position = read_router.write_position(conn) if read_router.enabled else None
         
         logger.info(f"DELETE /api/names/{name_id} - Successfully deleted name")
-        return jsonify({"deleted": name_id}), 200
+        return remember_write(jsonify({"deleted": name_id}), position), 200
     
     except Exception as e:
+        timed_out = deadline_response(f"DELETE /api/names/{name_id}", e)
+        if timed_out:
+            return timed_out
         logger.error(f"DELETE /api/names/{name_id} - Database error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@contextmanager
+def names_connection(names_engine, conn):
+    """
+    Connection for a job's work on the names stored in ``names_engine``.
+    
+    The primary reuses the job's connection ``conn``, so each batch commits
+    together with its checkpoint. A shard gets its own connection, which the
+    job commits just before the checkpoint.
+    """
+    if names_engine is engine:
+        yield conn
+    else:
+        with names_engine.connect() as names_conn:
+            yield names_conn
+
+def insert_names_sharded(names):
+    """Place sanitized names on the shards and insert them, one transaction per shard."""
+    if DEDUP_NAMES:
+        def work(conn, rows):
+            for name_id, name in rows:
+                upsert_name(conn, name, name_id)
+        shard_router.insert_many(names, work, key=normalize_name)
+    else:
+        shard_router.insert_many(
+            names,
+            lambda conn, rows: conn.execute(table.insert(), [{"id": i, "name": n} for i, n in rows])
+        )
+
+def validate_import_job(params):
+    names = params.get("names")
+    if not isinstance(names, list) or not names:
+        return "params.names must be a non-empty list."
+    if len(names) > JOB_MAX_IMPORT_NAMES:
+        return f"An import job takes at most {JOB_MAX_IMPORT_NAMES} names."
+    return None
+
+def run_import_job(context):
+    """Validate and insert params.names, one checkpoint per batch."""
+    names = context.params["names"]
+    imported = rejected = 0
+    try:
+        with engine.connect() as conn:
+            for start in range(0, len(names), context.batch_size):
+                batch = []
+                for raw in names[start:start + context.batch_size]:
+                    status, name = validation(raw if isinstance(raw, str) else None)
+                    if status:
+                        batch.append(name)
+                    else:
+                        rejected += 1
+                imported += len(batch)
+                end = min(start + context.batch_size, len(names))
+                # Batches committed by an earlier attempt are only counted
+                if end <= context.done:
+                    continue
+                if shard_router is not None:
+                    # Shards commit before the checkpoint, so a retry after a
+                    # crash in between stores that batch again
+                    insert_names_sharded(batch)
+                elif DEDUP_NAMES:
+                    for name in batch:
+                        upsert_name(conn, name)
+                elif batch:
+                    conn.execute(table.insert(), [{"name": name} for name in batch])
+                context.checkpoint(conn, end, len(names))
+    finally:
+        # Batches may commit out of id order with concurrent adds; also after a cancel
+        with engine.connect() as conn:
+            request_reload(conn, tombstones)
+            conn.commit()
+    return {"imported": imported, "rejected": rejected}
+
+def validate_delete_range_job(params):
+    min_id, max_id = params.get("min_id"), params.get("max_id")
+    if not isinstance(min_id, int) or not isinstance(max_id, int) or min_id > max_id:
+        return "params.min_id and params.max_id must be integers with min_id <= max_id."
+    return None
+
+def run_delete_range_job(context):
+    """Delete names with ids in [min_id, max_id], one checkpoint per batch."""
+    min_id, max_id = context.params["min_id"], context.params["max_id"]
+    in_range = (table.c.id >= min_id) & (table.c.id <= max_id)
+    deleted = context.done
+    count = select(func.count()).select_from(table).where(in_range)
+    with engine.connect() as conn:
+        # Deleted rows are gone, so a retry simply carries on with the rest
+        if shard_router is not None:
+            remaining = sum(shard_router.execute_all(lambda shard_conn: shard_conn.execute(count).scalar()))
+        else:
+            remaining = conn.execute(count).scalar()
+        total = deleted + remaining
+        for names_engine in names_engines():
+            with names_connection(names_engine, conn) as names_conn:
+                while True:
+                    ids = names_conn.execute(
+                        select(table.c.id).where(in_range).order_by(table.c.id).limit(context.batch_size)
+                    ).scalars().all()
+                    if not ids:
+                        break
+                    names_conn.execute(table.delete().where(table.c.id.in_(ids)))
+                    if name_snapshot is not None or name_index is not None:
+                        record_deletion(names_conn, tombstones, ids, SNAPSHOT_TOMBSTONE_RETENTION_SECONDS)
+                    deleted += len(ids)
+                    if names_conn is not conn:
+                        names_conn.commit()
+                    context.checkpoint(conn, deleted, total)
+                    if name_index is not None:
+                        for name_id in ids:
+                            name_index.discard(name_id)
+    return {"deleted": deleted}
+
+def validate_export_job(params):
+    return None
+
+def run_export_job(context):
+    """Write every name as gzipped NDJSON chunks into job_outputs."""
+    exported = size = 0
+    columns = [table.c.id, table.c.name, table.c.created_at]
+    count = select(func.count()).select_from(table)
+    with engine.connect() as conn:
+        # Output is rebuilt from scratch on every attempt
+        context.clear_output(conn)
+
+        def keyset_batches():
+            # Checkpoints commit on conn, so pages are separate queries
+            after = None
+            while True:
+                rows = conn.execute(list_query(columns, ("id", False), after, context.batch_size)).fetchall()
+                if not rows:
+                    return
+                yield rows
+                after = (rows[-1].id, rows[-1].id)
+
+        if shard_router is not None:
+            total = sum(shard_router.execute_all(lambda shard_conn: shard_conn.execute(count).scalar()))
+            batches = shard_router.stream(select(*columns).order_by(table.c.id), sort_value("id"), context.batch_size)
+        else:
+            total = conn.execute(count).scalar()
+            batches = keyset_batches()
+        for seq, rows in enumerate(batches):
+            chunk = gzip.compress("".join(
+                json.dumps({
+                    "id": r.id,
+                    "name": r.name,
+                    "created_at": r.created_at.isoformat() if r.created_at else None
+                }) + "\n"
+                for r in rows
+            ).encode("utf-8"))
+            context.write_output(conn, seq, chunk)
+            exported += len(rows)
+            size += len(chunk)
+            context.checkpoint(conn, exported, max(total, exported))
+    return {"exported": exported, "bytes": size, "output": f"/api/jobs/{context.job_id}/output"}
+
+JOB_KINDS = {
+    "import": jobs.JobKind(validate_import_job, run_import_job),
+    "delete_range": jobs.JobKind(validate_delete_range_job, run_delete_range_job),
+    "export": jobs.JobKind(validate_export_job, run_export_job),
+}
+
+job_queue = jobs.JobQueue(engine, jobs_table, job_outputs)
+job_runner = jobs.JobRunner(
+    engine,
+    jobs_table,
+    job_outputs,
+    JOB_KINDS,
+    threads=JOB_WORKERS,
+    poll_seconds=JOB_POLL_SECONDS,
+    batch_size=JOB_BATCH_SIZE,
+    stale_seconds=JOB_STALE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retention_seconds=JOB_RETENTION_SECONDS,
+)
+
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """
+    Queue a bulk operation to run in the background.
+    
+    Body: {"kind": "import" | "delete_range" | "export", "params": {...}}
+    Answers 202 with the job; poll GET /api/jobs/<id> for progress.
+    """
+    logger.info("POST /api/jobs - Request received")
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON body."}), 400
+    kind = JOB_KINDS.get(data.get("kind"))
+    if kind is None:
+        return jsonify({"error": f"kind must be one of {', '.join(JOB_KINDS)}."}), 400
+    params = data.get("params", {})
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object."}), 400
+    error = kind.validate(params)
+    if error:
+        logger.warning(f"POST /api/jobs - Invalid {data['kind']} job: {error}")
+        return jsonify({"error": error}), 400
+
+    try:
+        job = job_queue.submit(data["kind"], params)
+    except Exception as e:
+        timed_out = deadline_response("POST /api/jobs", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"POST /api/jobs - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    job_runner.wake()
+    logger.info(f"POST /api/jobs - Queued {job.kind} job {job.id}")
+    response = jsonify(jobs.describe(job))
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return response, 202
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    """Status and progress of a job."""
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        timed_out = deadline_response(f"GET /api/jobs/{job_id}", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"GET /api/jobs/{job_id} - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(jobs.describe(job)), 200
+
+@app.route("/api/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next checkpoint."""
+    logger.info(f"POST /api/jobs/{job_id}/cancel - Request received")
+    try:
+        job = job_queue.cancel(job_id)
+    except Exception as e:
+        timed_out = deadline_response(f"POST /api/jobs/{job_id}/cancel", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"POST /api/jobs/{job_id}/cancel - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status in (jobs.SUCCEEDED, jobs.FAILED):
+        return jsonify({"error": f"Job already {job.status}", **jobs.describe(job)}), 409
+    return jsonify(jobs.describe(job)), 200
+
+@app.route("/api/jobs/<int:job_id>/output", methods=["GET"])
+def job_output(job_id):
+    """Download the gzipped NDJSON written by a finished export job."""
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        timed_out = deadline_response(f"GET /api/jobs/{job_id}/output", e)
+        if timed_out:
+            return timed_out
+        logger.error(f"GET /api/jobs/{job_id}/output - Database error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+    if job is None or job.kind != "export":
+        return jsonify({"error": "Export job not found"}), 404
+    if job.status != jobs.SUCCEEDED:
+        return jsonify({"error": f"Job is {job.status}"}), 409
+    response = Response(stream_with_context(job_queue.output(job_id)), mimetype="application/gzip")
+    response.headers["Content-Disposition"] = f'attachment; filename="names-{job_id}.ndjson.gz"'
+    return response
+
 @app.route("/api/health", methods=["GET"])
 @app.route("/healthz", methods=["GET"])
 def health_check():
@@ -203,6 +1486,8 @@ def health_check_db():
             # Execute a simple query that doesn't require any tables
             result = conn.execute(select(func.now()))
             db_time = result.scalar()
+        if shard_router is not None:
+            shard_router.execute_all(lambda conn: conn.execute(select(func.now())).scalar())
         
         response = {
             "status": "healthy",
@@ -211,6 +1496,8 @@ def health_check_db():
             "db_time": str(db_time),
             "connection_url": DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else "configured"  # Hide credentials
         }
+        if shard_router is not None:
+            response["shards"] = len(shard_router.engines)
         
         logger.info("GET /api/health/db - Database connection successful")
         return jsonify(response), 200
@@ -227,6 +1514,144 @@ def health_check_db():
         logger.error(f"GET /api/health/db - Database connection failed: {str(e)}")
         return jsonify(response), 503
 
+@app.route("/api/health/snapshot", methods=["GET"])
+def health_check_snapshot():
+    """Size and freshness of this worker's in-memory names snapshot."""
+    if name_snapshot is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **name_snapshot.stats()}), 200
+
+@app.route("/api/health/suggest", methods=["GET"])
+def health_check_suggest():
+    """Size and freshness of this worker's name suggestion index."""
+    if name_index is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **name_index.stats()}), 200
+
+@app.route("/api/health/coalescing", methods=["GET"])
+def health_check_coalescing():
+    """How many of this worker's list requests shared another's query."""
+    if list_flight is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, "list_names": list_flight.stats()}), 200
+
+def diagnostics_denied():
+    """
+    Hide the diagnostics endpoints unless they are enabled and authorized.
+
+    Returns:
+        tuple or None: 404 when memory diagnostics are off, 401 without the
+        right bearer token, None when the request may proceed
+    """
+    if memory_tracer is None:
+        return jsonify({"error": "Not found"}), 404
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), DIAGNOSTICS_TOKEN.encode()):
+        logger.warning(f"{request.method} {request.path} - Rejected diagnostics request without a valid token")
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def parse_diagnostics_params(args):
+    """
+    Read the limit and group_by query parameters of the memory reports.
+
+    Returns:
+        tuple: (limit, group_by), or (None, error message) if invalid
+    """
+    try:
+        limit = int(args.get("limit", "20"))
+    except ValueError:
+        return None, "limit must be an integer"
+    if not 1 <= limit <= 500:
+        return None, "limit must be between 1 and 500"
+    group_by = args.get("group_by", "lineno")
+    if group_by not in GROUPINGS:
+        return None, f"group_by must be one of: {', '.join(GROUPINGS)}"
+    return limit, group_by
+
+@app.route("/api/diagnostics/memory", methods=["GET"])
+def memory_report():
+    """This worker's traced memory, per-route peaks, largest requests and top allocation sites."""
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    limit, group_by = parse_diagnostics_params(request.args)
+    if limit is None:
+        return jsonify({"error": group_by}), 400
+    logger.info("GET /api/diagnostics/memory - Memory report requested")
+    return jsonify({
+        **memory_tracer.stats(),
+        "routes": memory_tracer.routes(),
+        "largest_requests": memory_tracer.largest_requests(),
+        "top": memory_tracer.top(limit, group_by),
+    }), 200
+
+@app.route("/api/diagnostics/memory/snapshots", methods=["POST"])
+def take_memory_snapshot():
+    """Keep a snapshot of this worker's allocations to diff against later."""
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    snapshot = memory_tracer.take_snapshot()
+    logger.info(f"POST /api/diagnostics/memory/snapshots - Took snapshot {snapshot['id']}")
+    return jsonify(snapshot), 201
+
+@app.route("/api/diagnostics/memory/snapshots", methods=["GET"])
+def list_memory_snapshots():
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    return jsonify({"snapshots": memory_tracer.snapshots()}), 200
+
+@app.route("/api/diagnostics/memory/diff", methods=["GET"])
+def memory_diff():
+    """
+    Allocation sites that grew between two snapshots.
+
+    ``since`` defaults to the snapshot taken at startup and ``until`` to a
+    fresh snapshot, so a bare request shows what grew since the worker started.
+    """
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    limit, group_by = parse_diagnostics_params(request.args)
+    if limit is None:
+        return jsonify({"error": group_by}), 400
+    since = request.args.get("since", type=int)
+    until = request.args.get("until", type=int)
+    if (since is None and "since" in request.args) or (until is None and "until" in request.args):
+        return jsonify({"error": "since and until must be snapshot ids"}), 400
+    logger.info(f"GET /api/diagnostics/memory/diff - Comparing snapshot {since} to {until}")
+    diff = memory_tracer.diff(since, until, limit, group_by)
+    if diff is None:
+        return jsonify({"error": "Snapshot not found"}), 404
+    return jsonify(diff), 200
+
+name_index = None
+if NAME_SUGGEST and shard_router is not None:
+    # Index refreshes follow one database's ids and tombstones
+    logger.warning("NAME_SUGGEST is not supported with DATABASE_SHARD_URLS; suggestions are disabled")
+elif NAME_SUGGEST:
+    name_index = PrefixIndex(
+        table,
+        tombstones,
+        normalize_name,
+        refresh_seconds=SUGGEST_REFRESH_SECONDS,
+        retention_seconds=SNAPSHOT_TOMBSTONE_RETENTION_SECONDS,
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+
+def warm_name_index():
+    """Build the suggestion index before the first lookup needs it; runs in each worker."""
+    if name_index is None:
+        return
+    try:
+        name_index.ensure_fresh(read_router.execute)
+    except Exception as e:
+        logger.warning(f"Name suggestion index not built at startup, retrying on first use: {str(e)}")
+
 if __name__ == "__main__":
     logger.info(f"Names Manager API starting up on host={SERVER_HOST}, port={SERVER_PORT}")
+    job_runner.start()
+    threading.Thread(target=warm_name_index, name="name-suggest-warmup", daemon=True).start()
     app.run(host=SERVER_HOST, port=SERVER_PORT)
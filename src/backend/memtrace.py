@@ -0,0 +1,247 @@
+"""
+Memory diagnostics built on tracemalloc.
+
+When MEMORY_DIAGNOSTICS is on, each worker traces its Python allocations and
+records the peak every request reaches above the memory in use when it
+started, tagged with its route. The diagnostics endpoints then show which
+routes and requests drive a worker towards its memory limit, the source lines
+holding the most memory, and what grew between two snapshots.
+
+tracemalloc keeps one peak per process. A request's peak is exact when it
+ran alone; when requests overlap in a threaded worker, each of them is marked
+``overlapped`` and may be charged for memory its neighbours allocated.
+
+Tracing costs CPU and memory (roughly 30% slower allocations, plus the
+traces themselves), so enable it on one pod while investigating.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+
+# Allocations made by tracemalloc itself and by the import system are noise
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+GROUPINGS = ("lineno", "filename", "traceback")
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Trace:
+    """One request being measured."""
+
+    __slots__ = ("start_bytes", "started", "overlapped")
+
+    def __init__(self, start_bytes, overlapped):
+        self.start_bytes = start_bytes
+        self.started = time.monotonic()
+        self.overlapped = overlapped
+
+
+class MemoryTracer:
+    """
+    Per-worker allocation tracing and per-request peaks.
+
+    Args:
+        frames (int): Stack frames stored per allocation; more frames give
+            fuller tracebacks at a higher cost
+        top_requests (int): How many of the largest requests to remember
+        snapshots (int): How many snapshots to keep for diffs, including the
+            one taken at start
+    """
+
+    def __init__(self, frames=1, top_requests=20, snapshots=4):
+        self.frames = frames
+        self.top_requests = top_requests
+        self.max_snapshots = snapshots
+        self._lock = threading.Lock()
+        self._active = set()
+        self._routes = {}
+        self._largest = []
+        self._sequence = itertools.count()
+        self._snapshots = []
+        self._snapshot_ids = itertools.count()
+
+    def start(self):
+        """Start tracing (if not already) and keep a baseline snapshot."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        if not self._snapshots:
+            self.take_snapshot()
+
+    def begin(self):
+        """Start measuring a request; pass the result to end()."""
+        with self._lock:
+            if not self._active:
+                # Nothing else runs, so the peak from here on is this request's
+                tracemalloc.reset_peak()
+                overlapped = False
+            else:
+                overlapped = True
+                for other in self._active:
+                    other.overlapped = True
+            trace = _Trace(tracemalloc.get_traced_memory()[0], overlapped)
+            self._active.add(trace)
+        return trace
+
+    def end(self, trace, route):
+        """
+        Finish measuring a request.
+
+        Args:
+            trace: Value returned by begin()
+            route (str): Route label, e.g. "GET /api/names"
+
+        Returns:
+            int: Bytes the request's peak reached above the memory in use
+            when it started
+        """
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._active.discard(trace)
+            peak_bytes = max(0, peak - trace.start_bytes)
+            stats = self._routes.setdefault(route, {"requests": 0, "total_peak": 0, "max_peak": 0})
+            stats["requests"] += 1
+            stats["total_peak"] += peak_bytes
+            stats["max_peak"] = max(stats["max_peak"], peak_bytes)
+            record = {
+                "route": route,
+                "peak_bytes": peak_bytes,
+                "retained_bytes": current - trace.start_bytes,
+                "duration_ms": round((time.monotonic() - trace.started) * 1000, 1),
+                "overlapped": trace.overlapped,
+                "at": time.time(),
+            }
+            entry = (peak_bytes, next(self._sequence), record)
+            if len(self._largest) < self.top_requests:
+                heapq.heappush(self._largest, entry)
+            else:
+                heapq.heappushpop(self._largest, entry)
+        return peak_bytes
+
+    def routes(self):
+        """Peak statistics per route since the worker started."""
+        with self._lock:
+            return {
+                route: {
+                    "requests": s["requests"],
+                    "mean_peak_bytes": s["total_peak"] // s["requests"],
+                    "max_peak_bytes": s["max_peak"],
+                }
+                for route, s in sorted(self._routes.items(), key=lambda item: -item[1]["max_peak"])
+            }
+
+    def largest_requests(self):
+        """The requests with the highest peaks, largest first."""
+        with self._lock:
+            return [record for _, _, record in sorted(self._largest, reverse=True)]
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def top(self, limit=20, group_by="lineno"):
+        """
+        Allocation sites holding the most memory right now.
+
+        Args:
+            limit (int): Number of sites
+            group_by (str): "lineno", "filename" or "traceback"
+
+        Returns:
+            list: Dicts with size_bytes, count and the site's frames
+        """
+        stats = self._snapshot().statistics(group_by)
+        return [self._describe(stat, stat.size, stat.count) for stat in stats[:limit]]
+
+    def take_snapshot(self):
+        """Keep a snapshot for later diffs; the oldest non-baseline one is dropped."""
+        snapshot = self._snapshot()
+        entry = {
+            "id": next(self._snapshot_ids),
+            "taken_at": time.time(),
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "snapshot": snapshot,
+        }
+        with self._lock:
+            self._snapshots.append(entry)
+            if len(self._snapshots) > self.max_snapshots:
+                # The baseline from start() stays for "what grew since startup"
+                del self._snapshots[1]
+        return self._public(entry)
+
+    def snapshots(self):
+        with self._lock:
+            return [self._public(entry) for entry in self._snapshots]
+
+    def diff(self, since=None, until=None, limit=20, group_by="lineno"):
+        """
+        Allocation sites that grew the most between two snapshots.
+
+        Args:
+            since (int): Snapshot id to compare from; the baseline by default
+            until (int): Snapshot id to compare to; a fresh snapshot by default
+
+        Returns:
+            dict or None: The snapshots compared and the top differences, or
+            None if a snapshot id is unknown
+        """
+        with self._lock:
+            stored = {entry["id"]: entry for entry in self._snapshots}
+            baseline = self._snapshots[0] if self._snapshots else None
+        old = stored.get(since) if since is not None else baseline
+        if until is None:
+            new = {"id": None, "taken_at": time.time(), "snapshot": self._snapshot()}
+        else:
+            new = stored.get(until)
+        if old is None or new is None:
+            return None
+        stats = new["snapshot"].compare_to(old["snapshot"], group_by)
+        return {
+            "since": old["id"],
+            "until": new["id"],
+            "seconds": round(new["taken_at"] - old["taken_at"], 1),
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "top": [
+                {**self._describe(stat, stat.size, stat.count), "size_diff_bytes": stat.size_diff,
+                 "count_diff": stat.count_diff}
+                for stat in stats[:limit]
+            ],
+        }
+
+    def stats(self):
+        """Current and peak traced memory of the worker."""
+        return {
+            "pid": os.getpid(),
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "rss_bytes": rss_bytes(),
+            "requests_in_flight": len(self._active),
+        }
+
+    @staticmethod
+    def _describe(stat, size, count):
+        return {
+            "size_bytes": size,
+            "count": count,
+            "frames": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        }
+
+    @staticmethod
+    def _public(entry):
+        return {key: value for key, value in entry.items() if key != "snapshot"}
@@ -0,0 +1,188 @@
+"""
+Read-replica routing for the Names Manager API.
+
+Read-only queries are sent to one of the configured replica engines when it is
+reachable and caught up with the primary. A client that has just written is
+given a cookie holding the primary's WAL position so its next reads only go to
+a replica that has replayed that write; otherwise they fall back to the primary.
+"""
+import itertools
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+# Cookie carrying the client's last write position (a Postgres LSN, or
+# "primary" when the database cannot report one)
+WRITE_POSITION_COOKIE = "nm_lsn"
+
+_LSN_PATTERN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+_REPLAYED_SQL = text("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)")
+_WRITE_POSITION_SQL = text("SELECT pg_current_wal_lsn()::text")
+
+
+class ReadRouter:
+    """
+    Choose the engine that serves a read-only query.
+
+    Args:
+        primary: Engine for the primary database, used as the fallback
+        replicas: Engines for read replicas (may be empty)
+        max_lag_seconds (float): Replicas further behind than this are skipped
+        retry_seconds (float): How long a failing replica is taken out of rotation
+        check_interval (float): How long a passed lag check is trusted for
+    """
+
+    def __init__(self, primary, replicas=(), max_lag_seconds=5.0,
+                 retry_seconds=30.0, check_interval=1.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag_seconds = max_lag_seconds
+        self.retry_seconds = retry_seconds
+        self.check_interval = check_interval
+        self._down_until = {}
+        self._fresh_until = {}
+        self._rotation = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def write_position(self, conn):
+        """
+        Return the primary's current WAL position after a write.
+
+        Args:
+            conn: Connection to the primary that performed the write
+
+        Returns:
+            str or None: The LSN as text, or None when the database has no WAL
+        """
+        if conn.dialect.name != "postgresql":
+            return None
+        return conn.execute(_WRITE_POSITION_SQL).scalar()
+
+    def execute(self, work, min_position=None):
+        """
+        Run a read-only callable on a replica, falling back to the primary.
+
+        Args:
+            work: Callable taking a connection and returning the query result
+            min_position (str): Write position the replica must have replayed,
+                usually taken from the client's cookie
+
+        Returns:
+            Whatever ``work`` returns
+        """
+        replica, conn = self._replica_connection(min_position)
+        if conn is not None:
+            try:
+                with conn:
+                    return work(conn)
+            except DBAPIError as e:
+                if deadlines.classify(e) == "statement":
+                    # Out of time; the primary would not answer sooner
+                    raise
+                logger.warning(f"Read replica query failed, retrying on primary: {str(e)}")
+                self._mark_down(replica)
+
+        with self.primary.connect() as conn:
+            return work(conn)
+
+    def connection(self, min_position=None):
+        """
+        Open a connection for a long-running read, such as a streamed export.
+
+        Unlike execute(), a replica that fails after the connection is handed
+        out is not retried on the primary.
+
+        Args:
+            min_position (str): Write position the replica must have replayed
+
+        Returns:
+            Connection: Replica connection if one is fresh enough, else primary;
+            the caller must close it
+        """
+        _, conn = self._replica_connection(min_position)
+        return conn if conn is not None else self.primary.connect()
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._rotation)
+            down_until = dict(self._down_until)
+        count = len(self.replicas)
+        ordered = [self.replicas[(start + i) % count] for i in range(count)]
+        return [r for r in ordered if down_until.get(id(r), 0) <= now]
+
+    def _mark_down(self, replica):
+        with self._lock:
+            self._down_until[id(replica)] = time.monotonic() + self.retry_seconds
+            self._fresh_until.pop(id(replica), None)
+
+    def _replica_connection(self, min_position):
+        if not self.replicas:
+            return None, None
+
+        for replica in self._candidates():
+            try:
+                conn = replica.connect()
+            except DBAPIError as e:
+                logger.warning(f"Read replica unavailable: {str(e)}")
+                self._mark_down(replica)
+                continue
+
+            try:
+                fresh = self._is_fresh(replica, conn, min_position)
+            except DBAPIError as e:
+                logger.warning(f"Read replica status check failed: {str(e)}")
+                conn.close()
+                self._mark_down(replica)
+                continue
+
+            if fresh:
+                return replica, conn
+            conn.close()
+
+        logger.debug("No read replica is fresh enough, using primary")
+        return None, None
+
+    def _is_fresh(self, replica, conn, min_position):
+        if min_position is not None and not _LSN_PATTERN.match(min_position):
+            # The write position is unknown, so only the primary is safe
+            return False
+
+        if conn.dialect.name != "postgresql":
+            # Nothing to compare positions against; fine for reads that do
+            # not need to observe a recent write
+            return min_position is None
+
+        if min_position is not None:
+            return bool(conn.execute(_REPLAYED_SQL, {"lsn": min_position}).scalar())
+
+        now = time.monotonic()
+        if self._fresh_until.get(id(replica), 0) > now:
+            return True
+
+        lag = conn.execute(_LAG_SQL).scalar()
+        if lag is None or float(lag) > self.max_lag_seconds:
+            logger.info(f"Read replica lagging ({lag}s), skipping")
+            return False
+
+        with self._lock:
+            self._fresh_until[id(replica)] = now + self.check_interval
+        return True
@@ -0,0 +1,284 @@
+"""
+Hash sharding of the names table across several databases.
+
+In sharded mode every database in DATABASE_SHARD_URLS holds a ``names`` table
+with a slice of the rows. Row ids are generated by the API instead of a
+SERIAL column, snowflake style: a millisecond timestamp, the number of the
+shard the row lives on and a per-millisecond sequence. Any id therefore tells
+which shard to ask, ids from different shards never collide, and sorting by
+id still means roughly sorting by insertion time.
+
+Ids stay below 2**53 so browsers can hold them in a JavaScript number:
+
+    41 bits  milliseconds since 2024-01-01 (until 2093)
+     4 bits  shard number (at most 16 shards)
+     8 bits  sequence within the millisecond
+
+New rows are spread by a hash of their id, or by a hash of the normalized
+name when names are deduplicated (so equal names meet on one shard and its
+unique index still catches them). Listings query every shard with the same
+keyset query and merge the sorted pages.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from sqlalchemy.exc import IntegrityError
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+TIMESTAMP_BITS = 41
+SHARD_BITS = 4
+SEQUENCE_BITS = 8
+MAX_SHARDS = 1 << SHARD_BITS
+
+_SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+# Collations that order text by code point, like Python's str comparison.
+# Shards must sort names this way for their pages to merge correctly;
+# SQLite's default BINARY collation already does.
+CODE_POINT_COLLATIONS = {"postgresql": "C"}
+
+
+def compose_id(timestamp_ms, shard, sequence):
+    """Pack the parts of a snowflake id."""
+    return (
+        ((timestamp_ms - EPOCH_MS) << (SHARD_BITS + SEQUENCE_BITS))
+        | (shard << SEQUENCE_BITS)
+        | sequence
+    )
+
+
+def shard_of(name_id):
+    """Shard number stored in a snowflake id."""
+    return (name_id >> SEQUENCE_BITS) & (MAX_SHARDS - 1)
+
+
+def name_hash(key):
+    """Stable hash of a normalized name, the same in every process."""
+    return zlib.crc32(key.encode("utf-8"))
+
+
+class SnowflakeIds:
+    """
+    Thread-safe generator of (timestamp_ms, sequence) pairs for new ids.
+
+    The sequence starts at a random value each millisecond, so processes
+    writing to the same shard in the same millisecond rarely pick the same
+    id; the shard's primary key catches the rare collision and the router
+    retries with a fresh id.
+
+    Args:
+        clock: Callable returning the time in seconds
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._start = 0
+        self._sequence = 0
+
+    def next(self):
+        """Return a (timestamp_ms, sequence) pair not handed out before."""
+        with self._lock:
+            while True:
+                now_ms = int(self.clock() * 1000)
+                if now_ms > self._last_ms:
+                    self._last_ms = now_ms
+                    self._start = self._sequence = random.getrandbits(SEQUENCE_BITS)
+                    return now_ms, self._sequence
+                # Same millisecond, or the clock stepped back: keep counting
+                # on the last one until its sequence runs out
+                sequence = (self._sequence + 1) & _SEQUENCE_MASK
+                if sequence != self._start:
+                    self._sequence = sequence
+                    return self._last_ms, sequence
+                time.sleep(0.0005)
+
+
+class ShardRouter:
+    """
+    Route names to shards and gather listings from all of them.
+
+    Args:
+        engines: One engine per shard, in shard-number order; the order must
+            never change once rows are stored
+        ids: SnowflakeIds generator (a new one by default)
+        attempts (int): Tries per insert when a generated id collides
+    """
+
+    def __init__(self, engines, ids=None, attempts=3):
+        if not engines:
+            raise ValueError("At least one shard is required.")
+        if len(engines) > MAX_SHARDS:
+            raise ValueError(f"At most {MAX_SHARDS} shards are supported.")
+        self.engines = list(engines)
+        self.ids = ids or SnowflakeIds()
+        self.attempts = attempts
+        self.dialect = self.engines[0].dialect.name
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    def engine_for_id(self, name_id):
+        """Engine of the shard holding ``name_id``, or None for ids no shard issued."""
+        shard = shard_of(name_id)
+        return self.engines[shard] if shard < len(self.engines) and name_id > 0 else None
+
+    def place(self, name_key=None):
+        """
+        Pick the shard and id for a new row.
+
+        Args:
+            name_key (str): Normalized name when rows are placed by name
+
+        Returns:
+            tuple: (id, shard number)
+        """
+        timestamp_ms, sequence = self.ids.next()
+        if name_key is not None:
+            shard = name_hash(name_key) % len(self.engines)
+        else:
+            body = (timestamp_ms << SEQUENCE_BITS) | sequence
+            shard = zlib.crc32(body.to_bytes(8, "big")) % len(self.engines)
+        return compose_id(timestamp_ms, shard, sequence), shard
+
+    def new_id(self, shard):
+        """Another id on a given shard, e.g. after a collision."""
+        timestamp_ms, sequence = self.ids.next()
+        return compose_id(timestamp_ms, shard, sequence)
+
+    def insert(self, work, name_key=None):
+        """
+        Run ``work(conn, new_id)`` in a committed transaction on the new row's shard.
+
+        Returns:
+            Whatever ``work`` returned
+
+        Raises:
+            IntegrityError: If every attempt collided
+        """
+        name_id, shard = self.place(name_key)
+        for attempt in range(self.attempts):
+            try:
+                with self.engines[shard].begin() as conn:
+                    return work(conn, name_id)
+            except IntegrityError:
+                if attempt == self.attempts - 1:
+                    raise
+                name_id = self.new_id(shard)
+
+    def insert_many(self, values, work, key=None):
+        """
+        Place many rows and insert them with one transaction per shard.
+
+        Args:
+            values: Values to store, e.g. sanitized names
+            work: Callable ``work(conn, [(new_id, value), ...])`` inserting one
+                shard's rows
+            key: Callable giving the normalized name to place a value by, or
+                None to place by id
+
+        Returns:
+            list: Results of ``work``, one per shard that received rows
+        """
+        placed = {}
+        for value in values:
+            name_id, shard = self.place(key(value) if key else None)
+            placed.setdefault(shard, []).append((name_id, value))
+
+        results = []
+        for shard, rows in placed.items():
+            for attempt in range(self.attempts):
+                try:
+                    with self.engines[shard].begin() as conn:
+                        results.append(work(conn, rows))
+                    break
+                except IntegrityError:
+                    if attempt == self.attempts - 1:
+                        raise
+                    rows = [(self.new_id(shard), value) for _, value in rows]
+        return results
+
+    def _pool(self):
+        # Threads do not survive a fork, so each worker starts its own pool
+        with self._executor_lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=len(self.engines), thread_name_prefix="shard-query"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def execute_all(self, work):
+        """
+        Run ``work(conn)`` on every shard at once.
+
+        Each call runs in a copy of the caller's context, so the request
+        deadline still bounds it.
+
+        Returns:
+            list: Results in shard order
+
+        Raises:
+            The first shard's error, if any shard failed
+        """
+        def run(shard_engine):
+            with shard_engine.connect() as conn:
+                return work(conn)
+
+        if len(self.engines) == 1:
+            return [run(self.engines[0])]
+        futures = [
+            self._pool().submit(contextvars.copy_context().run, run, shard_engine)
+            for shard_engine in self.engines
+        ]
+        return [future.result() for future in futures]
+
+    def merge(self, work, key, descending=False, limit=None):
+        """
+        Scatter a sorted query to every shard and merge the pages.
+
+        Args:
+            work: Callable ``work(conn)`` returning one shard's rows, sorted
+                and limited like the wanted result
+            key: Callable giving a row's sort key
+            descending (bool): Whether the rows are sorted descending
+            limit (int): Most rows to return, or None for all
+
+        Returns:
+            list: The first ``limit`` rows of all shards in order
+        """
+        pages = self.execute_all(work)
+        merged = heapq.merge(*pages, key=key, reverse=descending)
+        return list(itertools.islice(merged, limit))
+
+    def stream(self, stmt, key, batch_size):
+        """
+        Stream a query from every shard in merged order.
+
+        Keeps one server-side cursor open per shard.
+
+        Yields:
+            list: Up to ``batch_size`` rows at a time
+        """
+        with ExitStack() as stack:
+            results = []
+            for shard_engine in self.engines:
+                conn = stack.enter_context(shard_engine.connect())
+                results.append(
+                    conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+                )
+            merged = heapq.merge(*results, key=key)
+            while True:
+                rows = list(itertools.islice(merged, batch_size))
+                if not rows:
+                    return
+                yield rows
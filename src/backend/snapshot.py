@@ -0,0 +1,590 @@
+"""
+In-worker columnar snapshot of the names table.
+
+Read-heavy deployments can serve GET /api/names from memory instead of the
+database. Rows are held column by column in compact buffers rather than as a
+list of dicts:
+
+- ids and created_at (epoch microseconds) in ``array('q')``
+- all names in one UTF-8 ``bytearray`` with an ``array('I')`` of offsets
+- a ``bytearray`` liveness flag per row, so deletes do not shift the buffers
+
+The snapshot is refreshed incrementally: only rows with ``id`` above the last
+one seen are fetched, and deletes are replayed from the ``names_tombstones``
+table that the delete path writes to.
+
+SharedNamesSnapshot lets the workers of one pod share a single copy: one
+worker refreshes the snapshot and publishes it as a memory-mapped file, the
+others map the published file read-only.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, Table, delete, func, select
+
+logger = logging.getLogger(__name__)
+
+SnapshotRow = namedtuple("SnapshotRow", ["id", "name", "created_at"])
+
+# Marks a row without a created_at value
+NO_TIMESTAMP = -(2 ** 63)
+
+# Tombstone name_id asking every snapshot to reload in full (ids start at 1)
+RELOAD_MARKER = 0
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def tombstones_table(metadata):
+    """Declare the table recording deleted name ids for snapshot refreshes."""
+    return Table(
+        "names_tombstones",
+        metadata,
+        Column("seq", Integer, primary_key=True),
+        # Matches names.id, which holds 64-bit snowflake ids when sharded
+        Column("name_id", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+        Column("deleted_at", DateTime, nullable=False, default=datetime.utcnow, index=True),
+    )
+
+
+def record_deletion(conn, tombstones, name_ids, retention_seconds):
+    """
+    Write tombstones for deleted names and prune ones no snapshot still needs.
+
+    Must run in the same transaction as the delete.
+
+    Args:
+        conn: Connection performing the delete
+        tombstones: Table from tombstones_table()
+        name_ids (list): Ids of the deleted names
+        retention_seconds (float): Age after which tombstones are dropped
+    """
+    if not name_ids:
+        return
+    conn.execute(tombstones.insert(), [{"name_id": name_id} for name_id in name_ids])
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    conn.execute(delete(tombstones).where(tombstones.c.deleted_at < cutoff))
+
+
+def request_reload(conn, tombstones):
+    """
+    Make every snapshot reload in full on its next refresh.
+
+    For bulk loads whose rows may commit far out of id order.
+    """
+    conn.execute(tombstones.insert().values(name_id=RELOAD_MARKER))
+
+
+class TombstoneCursor:
+    """
+    Which tombstones an in-memory copy of the names table has replayed.
+
+    Tombstone seqs are handed out when a delete starts, but concurrent deletes
+    can commit in a different order, so a seq below the highest one applied
+    may still appear. Each read therefore looks ``overlap_seqs`` below the
+    highest seq applied and skips the seqs it has already applied.
+
+    Args:
+        tombstones: Table from tombstones_table()
+        overlap_seqs (int): How far below the highest applied seq to look
+    """
+
+    def __init__(self, tombstones, overlap_seqs=1000):
+        self.tombstones = tombstones
+        self.overlap_seqs = overlap_seqs
+        self.last_seq = 0
+        self._applied = set()
+
+    def position(self, conn):
+        """
+        Read the tombstones already reflected in a full load.
+
+        Call before reading the rows, and pass the result to reset() once
+        the load is installed, so deletes racing the load replay later.
+        """
+        last_seq = conn.execute(
+            select(func.coalesce(func.max(self.tombstones.c.seq), 0))
+        ).scalar()
+        applied = set(conn.execute(
+            select(self.tombstones.c.seq).where(self.tombstones.c.seq > last_seq - self.overlap_seqs)
+        ).scalars())
+        return last_seq, applied
+
+    def reset(self, position):
+        self.last_seq, self._applied = position[0], set(position[1])
+
+    def pending(self, conn):
+        """Tombstones not applied yet, in seq order."""
+        rows = conn.execute(
+            select(self.tombstones.c.seq, self.tombstones.c.name_id)
+            .where(self.tombstones.c.seq > self.last_seq - self.overlap_seqs)
+            .order_by(self.tombstones.c.seq)
+        ).fetchall()
+        return [t for t in rows if t.seq not in self._applied]
+
+    def applied(self, rows):
+        """Record tombstones from pending() as replayed."""
+        for t in rows:
+            self._applied.add(t.seq)
+            self.last_seq = max(self.last_seq, t.seq)
+        floor = self.last_seq - self.overlap_seqs
+        self._applied = {seq for seq in self._applied if seq > floor}
+
+
+def _to_micros(value):
+    if value is None:
+        return NO_TIMESTAMP
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(value):
+    if value == NO_TIMESTAMP:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+class _Columns:
+    """The buffers of one snapshot generation."""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.created = array("q")
+        self.offsets = array("I", [0])
+        self.names = bytearray()
+        self.alive = bytearray()
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row_id, name, created_at):
+        encoded = name.encode("utf-8")
+        self.ids.append(row_id)
+        self.created.append(_to_micros(created_at))
+        self.names += encoded
+        self.offsets.append(len(self.names))
+        self.alive.append(1)
+
+    def insert(self, position, row_id, name, created_at):
+        """Insert a row that committed out of id order (rare)."""
+        encoded = name.encode("utf-8")
+        start = self.offsets[position]
+        self.ids.insert(position, row_id)
+        self.created.insert(position, _to_micros(created_at))
+        self.names[start:start] = encoded
+        self.offsets.insert(position + 1, start + len(encoded))
+        for i in range(position + 2, len(self.offsets)):
+            self.offsets[i] += len(encoded)
+        self.alive.insert(position, 1)
+
+    def find(self, row_id):
+        position = bisect_left(self.ids, row_id)
+        if position < len(self.ids) and self.ids[position] == row_id:
+            return position
+        return None
+
+    def name_at(self, position):
+        return self.names[self.offsets[position]:self.offsets[position + 1]].decode("utf-8")
+
+    def compacted(self):
+        fresh = _Columns()
+        for i in range(len(self.ids)):
+            if self.alive[i]:
+                fresh.ids.append(self.ids[i])
+                fresh.created.append(self.created[i])
+                fresh.names += self.names[self.offsets[i]:self.offsets[i + 1]]
+                fresh.offsets.append(len(fresh.names))
+                fresh.alive.append(1)
+        return fresh
+
+    def nbytes(self):
+        return (
+            self.ids.buffer_info()[1] * self.ids.itemsize
+            + self.created.buffer_info()[1] * self.created.itemsize
+            + self.offsets.buffer_info()[1] * self.offsets.itemsize
+            + len(self.names)
+            + len(self.alive)
+        )
+
+
+class NamesSnapshot:
+    """
+    Columnar in-memory copy of the names table for one worker.
+
+    Args:
+        table: The names Table
+        tombstones: Table from tombstones_table()
+        refresh_seconds (float): How stale the snapshot may get before a read
+            triggers a refresh
+        retention_seconds (float): Tombstone retention; a snapshot idle for
+            longer reloads in full because deletes may have been pruned
+        overlap_ids (int): How far below the last seen id a refresh looks, to
+            catch rows whose transactions committed out of id order
+        overlap_seqs (int): The same for tombstones (see TombstoneCursor)
+        compact_ratio (float): Fraction of deleted rows that triggers compaction
+    """
+
+    def __init__(self, table, tombstones, refresh_seconds=1.0, retention_seconds=3600.0,
+                 overlap_ids=1000, overlap_seqs=1000, compact_ratio=0.25, batch_size=10000):
+        self.table = table
+        self.tombstones = tombstones
+        self.deletes = TombstoneCursor(tombstones, overlap_seqs)
+        self.refresh_seconds = refresh_seconds
+        self.retention_seconds = retention_seconds
+        self.overlap_ids = overlap_ids
+        self.compact_ratio = compact_ratio
+        self.batch_size = batch_size
+        self._columns = _Columns()
+        self._refreshed_at = None
+        # Bumped whenever the rows change
+        self.version = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at is not None
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def ensure_fresh(self, execute, force=False):
+        """
+        Refresh the snapshot if it is stale.
+
+        While one thread refreshes, others keep serving the current data
+        unless they need it fresh (force) or nothing is loaded yet.
+
+        Args:
+            execute: Callable running ``work(conn)`` on a database connection
+            force (bool): Refresh even if the snapshot is recent, e.g. because
+                the client has just written
+        Returns:
+            bool: True; the snapshot can always serve the read
+        """
+        if not force and not self.is_stale():
+            return True
+        if not self._refresh_lock.acquire(blocking=force or not self.loaded):
+            return True
+        try:
+            if force or self.is_stale():
+                execute(self.refresh)
+        finally:
+            self._refresh_lock.release()
+        return True
+
+    def refresh(self, conn):
+        """Bring the snapshot up to date using the given connection."""
+        started = time.monotonic()
+        if not self.loaded or started - self._refreshed_at > self.retention_seconds:
+            self._load(conn)
+        else:
+            self._apply_changes(conn)
+        self._refreshed_at = started
+
+    def _load(self, conn):
+        # Read the tombstone position first so deletes racing the load replay later
+        position = self.deletes.position(conn)
+
+        fresh = _Columns()
+        stmt = select(self.table.c.id, self.table.c.name, self.table.c.created_at).order_by(self.table.c.id)
+        result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(stmt)
+        for rows in result.partitions():
+            for r in rows:
+                fresh.append(r.id, r.name, r.created_at)
+
+        with self._lock:
+            self._columns = fresh
+            self.deletes.reset(position)
+            self.version += 1
+        logger.info(f"Names snapshot loaded: {len(fresh)} rows, {fresh.nbytes()} bytes")
+
+    def _apply_changes(self, conn):
+        columns = self._columns
+        last_id = columns.ids[-1] if len(columns) else 0
+        rows = conn.execute(
+            select(self.table.c.id, self.table.c.name, self.table.c.created_at)
+            .where(self.table.c.id > last_id - self.overlap_ids)
+            .order_by(self.table.c.id)
+        ).fetchall()
+        deleted = self.deletes.pending(conn)
+        if any(t.name_id == RELOAD_MARKER for t in deleted):
+            self._load(conn)
+            return
+
+        with self._lock:
+            columns = self._columns
+            changed = False
+            for r in rows:
+                if not len(columns) or r.id > columns.ids[-1]:
+                    columns.append(r.id, r.name, r.created_at)
+                    changed = True
+                elif columns.find(r.id) is None:
+                    columns.insert(bisect_left(columns.ids, r.id), r.id, r.name, r.created_at)
+                    changed = True
+
+            for t in deleted:
+                position = columns.find(t.name_id)
+                if position is not None and columns.alive[position]:
+                    columns.alive[position] = 0
+                    columns.dead += 1
+                    changed = True
+            self.deletes.applied(deleted)
+
+            if changed:
+                self.version += 1
+
+            if columns.dead and columns.dead >= len(columns) * self.compact_ratio:
+                self._columns = columns.compacted()
+
+    def page(self, after_id=None, limit=None):
+        """
+        Return live rows in id order.
+
+        Args:
+            after_id (int): Only rows with a larger id
+            limit (int): Maximum rows to return, or None for all
+
+        Returns:
+            list: SnapshotRow tuples
+        """
+        with self._lock:
+            columns = self._columns
+            start = 0 if after_id is None else bisect_right(columns.ids, after_id)
+            rows = []
+            for i in range(start, len(columns)):
+                if not columns.alive[i]:
+                    continue
+                rows.append(SnapshotRow(columns.ids[i], columns.name_at(i), _from_micros(columns.created[i])))
+                if limit is not None and len(rows) >= limit:
+                    break
+            return rows
+
+    def stats(self):
+        """Row counts and memory use of the snapshot."""
+        with self._lock:
+            columns = self._columns
+            live = len(columns) - columns.dead
+            nbytes = columns.nbytes()
+        return {
+            "loaded": self.loaded,
+            "rows": live,
+            "deleted_rows_pending_compaction": columns.dead,
+            "bytes": nbytes,
+            "bytes_per_row": round(nbytes / live, 1) if live else 0.0,
+            "last_id": columns.ids[-1] if len(columns) else None,
+            "age_seconds": round(time.monotonic() - self._refreshed_at, 3) if self.loaded else None,
+        }
+
+
+# magic, version, row count, name bytes, publish time (epoch seconds)
+_FILE_HEADER = struct.Struct("<8sQQQd")
+_FILE_MAGIC = b"NMSNAP1\0"
+
+
+class _MappedColumns:
+    """Read-only column views over one published snapshot file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, count, names_len, self.published_at = _FILE_HEADER.unpack_from(self._map)
+        if magic != _FILE_MAGIC:
+            raise ValueError(f"{path} is not a names snapshot")
+
+        view = memoryview(self._map)
+        start = _FILE_HEADER.size
+        self.ids = view[start:start + 8 * count].cast("q")
+        start += 8 * count
+        self.created = view[start:start + 8 * count].cast("q")
+        start += 8 * count
+        self.offsets = view[start:start + 4 * (count + 1)].cast("I")
+        start += 4 * (count + 1)
+        self.names = view[start:start + names_len]
+        self.nbytes = len(self._map)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SharedNamesSnapshot:
+    """
+    A NamesSnapshot shared by all workers of a pod through a mapped file.
+
+    Every worker starts a refresher thread that waits for an exclusive lock on
+    ``<directory>/names.snapshot.lock``; the worker holding it refreshes its
+    private NamesSnapshot and, whenever the rows change, writes a new file and
+    renames it over ``names.snapshot``. Readers map that file and remap when
+    its inode changes, so each publish is a new version and a mapping in use
+    stays valid until dropped. When the writer exits, the lock passes to
+    another worker.
+
+    After every successful refresh the writer also touches the file, so its
+    modification time tells readers when the data was last known current. A
+    file older than ``max_age_seconds`` (the writer keeps failing, or it was
+    left behind by an earlier container) is not served.
+
+    Args:
+        snapshot: NamesSnapshot the writer refreshes
+        directory (str): Where to publish; should be tmpfs such as /dev/shm
+        execute: Callable running ``work(conn)`` for the refresher thread
+        max_age_seconds (float): Oldest refresh readers accept; defaults to
+            five refresh intervals, and at least five seconds
+    """
+
+    def __init__(self, snapshot, directory, execute, max_age_seconds=None):
+        self.snapshot = snapshot
+        self.path = os.path.join(directory, "names.snapshot")
+        self.lock_path = self.path + ".lock"
+        self.execute = execute
+        self.max_age_seconds = (
+            max_age_seconds if max_age_seconds is not None else max(5 * snapshot.refresh_seconds, 5.0)
+        )
+        self._stale = False
+        self.is_writer = False
+        self._mapped = None
+        self._published_version = None
+        self._refresher = None
+        self._start_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Start this worker's refresher thread once, after fork."""
+        with self._start_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop, name="names-snapshot-refresher", daemon=True
+                )
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        lock_file = open(self.lock_path, "a")
+        # Blocks until no other worker of this pod is refreshing
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        self.is_writer = True
+        logger.info(f"Worker {os.getpid()} is refreshing the shared names snapshot")
+        while True:
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.warning(f"Shared names snapshot refresh failed: {str(e)}")
+            time.sleep(self.snapshot.refresh_seconds)
+
+    def refresh_once(self):
+        """Refresh the private snapshot and publish it if the rows changed."""
+        self.execute(self.snapshot.refresh)
+        if self.snapshot.version != self._published_version:
+            self.publish()
+        else:
+            # Still current: tell readers the published data was just checked
+            os.utime(self.path)
+
+    def publish(self):
+        """Write the current rows to a new file and swap it in atomically."""
+        snapshot = self.snapshot
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with snapshot._lock:
+            columns = snapshot._columns.compacted() if snapshot._columns.dead else snapshot._columns
+            version = snapshot.version
+            with open(tmp_path, "wb") as f:
+                f.write(_FILE_HEADER.pack(_FILE_MAGIC, version, len(columns), len(columns.names), time.time()))
+                f.write(columns.ids)
+                f.write(columns.created)
+                f.write(columns.offsets)
+                f.write(columns.names)
+        os.replace(tmp_path, self.path)
+        self._published_version = version
+
+    def _current(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+        mapped = self._mapped
+        if mapped is None or mapped.inode != inode:
+            try:
+                mapped = _MappedColumns(self.path)
+            except (FileNotFoundError, ValueError):
+                # Replaced between stat and open, or still being written
+                return self._mapped
+            # Views of the previous mapping close once no reader holds them
+            self._mapped = mapped
+        return mapped
+
+    def age_seconds(self):
+        """Seconds since the writer last refreshed the published file, or None."""
+        try:
+            return max(0.0, time.time() - os.stat(self.path).st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def ensure_fresh(self, execute, force=False):
+        """
+        Check that the shared snapshot can serve a read.
+
+        Refreshing is left to the refresher thread, so ``execute`` is unused.
+
+        Returns:
+            bool: False when nothing is published yet, the published data is
+                older than ``max_age_seconds`` or the client needs data newer
+                than the last publish; read from the database instead
+        """
+        self.start()
+        if force or self._current() is None:
+            return False
+        age = self.age_seconds()
+        stale = age is None or age > self.max_age_seconds
+        if stale != self._stale:
+            self._stale = stale
+            if stale:
+                logger.warning(f"Shared names snapshot not refreshed for {age}s; reading from the database")
+            else:
+                logger.info("Shared names snapshot is current again")
+        return not stale
+
+    def page(self, after_id=None, limit=None):
+        """Return rows in id order from the published snapshot (see NamesSnapshot.page)."""
+        mapped = self._current()
+        if mapped is None:
+            return []
+        ids, created, offsets, names = mapped.ids, mapped.created, mapped.offsets, mapped.names
+        start = 0 if after_id is None else bisect_right(ids, after_id)
+        stop = len(ids) if limit is None else min(len(ids), start + limit)
+        return [
+            SnapshotRow(ids[i], str(names[offsets[i]:offsets[i + 1]], "utf-8"), _from_micros(created[i]))
+            for i in range(start, stop)
+        ]
+
+    def stats(self):
+        """Published version, size and age as seen by this worker."""
+        mapped = self._current()
+        if mapped is None:
+            return {"loaded": False, "shared": True, "writer": self.is_writer}
+        rows = len(mapped)
+        refreshed = self.age_seconds()
+        return {
+            "loaded": True,
+            "shared": True,
+            "writer": self.is_writer,
+            "version": mapped.version,
+            "rows": rows,
+            "bytes": mapped.nbytes,
+            "bytes_per_row": round(mapped.nbytes / rows, 1) if rows else 0.0,
+            "last_id": mapped.ids[-1] if rows else None,
+            "age_seconds": round(time.time() - mapped.published_at, 3),
+            "refreshed_seconds_ago": round(refreshed, 3) if refreshed is not None else None,
+            "stale": refreshed is None or refreshed > self.max_age_seconds,
+        }
@@ -0,0 +1,157 @@
+"""
+Embedded SQLite storage for single-node and edge deployments.
+
+With ``DATABASE_URL=sqlite:////data/names.db`` the API runs without a database
+server. Every connection is switched to WAL journaling so readers never block
+the writer, with ``synchronous=NORMAL`` (commits skip fsync; the WAL is synced
+at checkpoints), a memory-mapped read path and a busy timeout for the moments
+when several workers write at once.
+
+SQLite allows one writer at a time, so concurrent inserts from the threads of
+a worker would mostly wait on each other's locks. WriteBatcher funnels them
+through one writer thread that commits many of them per transaction.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from sqlalchemy import event, exc
+
+logger = logging.getLogger(__name__)
+
+
+def is_file_url(url: str) -> bool:
+    """True for SQLite URLs that point at a database file."""
+    if not url.startswith("sqlite"):
+        return False
+    path = url.split("://", 1)[-1].lstrip("/")
+    return path not in ("", ":memory:") and "mode=memory" not in url
+
+
+def pragmas(mmap_size: int, busy_timeout_ms: int, cache_kib: int) -> list:
+    """PRAGMA statements applied to every new connection."""
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={int(mmap_size)}",
+        f"PRAGMA busy_timeout={int(busy_timeout_ms)}",
+        # Negative values are KiB rather than pages
+        f"PRAGMA cache_size=-{int(cache_kib)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def install_pragmas(engine, mmap_size=256 * 1024 * 1024, busy_timeout_ms=5000, cache_kib=65536):
+    """Tune every connection the engine opens for concurrent web traffic."""
+    statements = pragmas(mmap_size, busy_timeout_ms, cache_kib)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+class WriteBatcher:
+    """
+    Run small write transactions from many threads as a few larger ones.
+
+    Callers submit ``work(conn)``; a single writer thread collects up to
+    ``max_batch`` items, waiting at most ``max_wait_ms`` for more to arrive,
+    runs them in one transaction and hands each caller its own result. If a
+    batch fails, its items are retried one transaction each so one bad write
+    does not fail the others.
+
+    Args:
+        engine: SQLAlchemy engine to write through
+        max_batch (int): Most writes committed together
+        max_wait_ms (float): How long the writer waits to fill a batch
+    """
+
+    def __init__(self, engine, max_batch=64, max_wait_ms=2.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._writer = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, work, timeout=None):
+        """
+        Run ``work(conn)`` in the next batch and wait for it to commit.
+
+        Args:
+            work: Callable taking a connection
+            timeout (float): Seconds to wait for the writer to pick the work
+                up, or None to wait indefinitely. Work the writer has
+                started is waited for, since it may already have committed.
+
+        Returns:
+            Whatever ``work`` returned
+
+        Raises:
+            sqlalchemy.exc.TimeoutError: The work was still queued after
+                ``timeout``; it is dropped and never runs
+            The exception ``work`` or the commit raised
+        """
+        self._start()
+        future = Future()
+        self._queue.put((work, future))
+        try:
+            return future.result(timeout=None if timeout is None else max(0.0, timeout))
+        except FutureTimeoutError:
+            if future.cancel():
+                raise exc.TimeoutError(f"Write still queued for the SQLite writer after {timeout:.3f}s") from None
+            return future.result()
+
+    def _start(self):
+        # Started lazily so the thread exists in each forked worker, not the master
+        with self._start_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._writer.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        try:
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get(timeout=self.max_wait) if self.max_wait else self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            # Skips writes whose callers gave up while they were queued
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                with self.engine.connect() as conn:
+                    results = [work(conn) for work, _ in batch]
+                    conn.commit()
+            except Exception as e:
+                if len(batch) > 1:
+                    logger.warning(f"Write batch of {len(batch)} failed, retrying one by one: {str(e)}")
+                    for item in batch:
+                        self._run_single(*item)
+                else:
+                    batch[0][1].set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_single(self, work, future):
+        try:
+            with self.engine.connect() as conn:
+                result = work(conn)
+                conn.commit()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
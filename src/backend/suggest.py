@@ -0,0 +1,227 @@
+"""
+In-worker prefix index for name suggestions.
+
+GET /api/names/suggest answers typeahead queries from memory. Distinct
+normalized names are kept in one sorted list, so the names starting with a
+prefix are a contiguous run found with ``bisect``: a lookup costs a binary
+search plus the rows returned, however many names are stored.
+
+- ``keys``: sorted normalized names (see ``main.normalize_name``)
+- ``displays``: the spelling first seen for each key, in the same order
+- ``counts``: how many stored rows share each key, in an ``array('I')``
+- ``ids`` with a parallel list of keys, so deletes (which only know the id)
+  find their key again
+
+The index is built in each worker, off the request path, and kept current by the add and
+delete paths of the worker itself. Writes made by other workers arrive with a
+periodic delta sync that, like the names snapshot, fetches rows above the
+last id seen and replays deletes from the ``names_tombstones`` table.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from snapshot import RELOAD_MARKER, TombstoneCursor
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple("Suggestion", ["name", "count"])
+
+
+class PrefixIndex:
+    """
+    Sorted index of normalized names for one worker.
+
+    Args:
+        table: The names Table
+        tombstones: Table from snapshot.tombstones_table()
+        normalize: Function mapping a stored name to its index key
+        refresh_seconds (float): How old the index may get before a query
+            triggers a delta sync
+        retention_seconds (float): Tombstone retention; an index idle for
+            longer reloads in full because deletes may have been pruned
+        overlap_ids (int): How far below the last seen id a sync looks, to
+            catch rows whose transactions committed out of id order
+        overlap_seqs (int): The same for tombstones (see snapshot.TombstoneCursor)
+    """
+
+    def __init__(self, table, tombstones, normalize, refresh_seconds=5.0, retention_seconds=3600.0,
+                 overlap_ids=1000, overlap_seqs=1000, batch_size=10000):
+        self.table = table
+        self.tombstones = tombstones
+        self.deletes = TombstoneCursor(tombstones, overlap_seqs)
+        self.normalize = normalize
+        self.refresh_seconds = refresh_seconds
+        self.retention_seconds = retention_seconds
+        self.overlap_ids = overlap_ids
+        self.batch_size = batch_size
+        self._clear()
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _clear(self):
+        self.keys = []
+        self.displays = []
+        self.counts = array("I")
+        self.ids = array("q")
+        self.id_keys = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at is not None
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def ensure_fresh(self, execute, force=False):
+        """
+        Sync the index if it is stale.
+
+        While one thread syncs, others keep answering from the current data
+        unless they need it fresh (force) or nothing is loaded yet.
+
+        Args:
+            execute: Callable running ``work(conn)`` on a database connection
+            force (bool): Sync even if the index is recent
+        """
+        if not force and not self.is_stale():
+            return
+        if not self._refresh_lock.acquire(blocking=force or not self.loaded):
+            return
+        try:
+            if force or self.is_stale():
+                execute(self.refresh)
+        finally:
+            self._refresh_lock.release()
+
+    def refresh(self, conn):
+        """Bring the index up to date using the given connection."""
+        started = time.monotonic()
+        if not self.loaded or started - self._refreshed_at > self.retention_seconds:
+            self._load(conn)
+        else:
+            self._apply_changes(conn)
+        self._refreshed_at = started
+
+    def _load(self, conn):
+        position = self.deletes.position(conn)
+
+        # Collect first, then sort once: far cheaper than inserting in order
+        entries = {}
+        ids, id_keys = array("q"), []
+        stmt = select(self.table.c.id, self.table.c.name).order_by(self.table.c.id)
+        result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(stmt)
+        for rows in result.partitions():
+            for r in rows:
+                key = sys.intern(self.normalize(r.name))
+                entry = entries.get(key)
+                if entry is None:
+                    entries[key] = [r.name, 1]
+                else:
+                    entry[1] += 1
+                ids.append(r.id)
+                id_keys.append(key)
+
+        keys = sorted(entries)
+        with self._lock:
+            self.keys = keys
+            self.displays = [entries[key][0] for key in keys]
+            self.counts = array("I", (entries[key][1] for key in keys))
+            self.ids = ids
+            self.id_keys = id_keys
+            self.deletes.reset(position)
+        logger.info(f"Name suggestion index loaded: {len(keys)} distinct names from {len(ids)} rows")
+
+    def _apply_changes(self, conn):
+        last_id = self.ids[-1] if len(self.ids) else 0
+        rows = conn.execute(
+            select(self.table.c.id, self.table.c.name)
+            .where(self.table.c.id > last_id - self.overlap_ids)
+            .order_by(self.table.c.id)
+        ).fetchall()
+        deleted = self.deletes.pending(conn)
+        if any(t.name_id == RELOAD_MARKER for t in deleted):
+            self._load(conn)
+            return
+
+        for r in rows:
+            self.add(r.id, r.name)
+        for t in deleted:
+            self.discard(t.name_id)
+        self.deletes.applied(deleted)
+
+    def add(self, name_id, name):
+        """Count a stored row; rows already in the index are ignored."""
+        key = sys.intern(self.normalize(name))
+        with self._lock:
+            position = bisect_left(self.ids, name_id)
+            if position < len(self.ids) and self.ids[position] == name_id:
+                return
+            self.ids.insert(position, name_id)
+            self.id_keys.insert(position, key)
+
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                self.counts[position] += 1
+            else:
+                self.keys.insert(position, key)
+                self.displays.insert(position, name)
+                self.counts.insert(position, 1)
+
+    def discard(self, name_id):
+        """Forget a deleted row; unknown ids are ignored."""
+        with self._lock:
+            position = bisect_left(self.ids, name_id)
+            if position == len(self.ids) or self.ids[position] != name_id:
+                return
+            del self.ids[position]
+            key = self.id_keys.pop(position)
+
+            position = bisect_left(self.keys, key)
+            if self.counts[position] > 1:
+                self.counts[position] -= 1
+            else:
+                del self.keys[position]
+                del self.displays[position]
+                del self.counts[position]
+
+    def suggest(self, prefix, limit=10):
+        """
+        Find stored names starting with a prefix.
+
+        Args:
+            prefix (str): Typed text, already sanitized like a stored name
+            limit (int): Most suggestions to return
+
+        Returns:
+            tuple: (suggestions, exists) where suggestions is a list of
+            Suggestion tuples in key order and exists tells whether a stored
+            name normalizes to exactly the prefix
+        """
+        key = self.normalize(prefix)
+        with self._lock:
+            start = bisect_left(self.keys, key)
+            exists = start < len(self.keys) and self.keys[start] == key
+            suggestions = []
+            for position in range(start, min(start + limit, len(self.keys))):
+                if not self.keys[position].startswith(key):
+                    break
+                suggestions.append(Suggestion(self.displays[position], self.counts[position]))
+        return suggestions, exists
+
+    def stats(self):
+        """Sizes of the index."""
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "distinct_names": len(self.keys),
+                "rows": len(self.ids),
+                "age_seconds": round(time.monotonic() - self._refreshed_at, 3) if self.loaded else None,
+            }
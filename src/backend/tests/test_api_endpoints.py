@@ -135,6 +135,200 @@ class TestGetNamesEndpoint:
             assert name in returned_names
 
 
+    def test_get_names_cache_headers(self, client, fresh_db):
+        """Test that the list may be micro-cached by nginx but not by browsers."""
+        import main
+
+        response = client.get('/api/names')
+
+        assert response.headers['X-Accel-Expires'] == str(main.LIST_CACHE_SECONDS)
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+
+class TestGetNamesPagination:
+    """Test keyset pagination on GET /api/names."""
+    
+    def _add(self, client, count):
+        return [
+            client.post('/api/names', json={'name': f'Person {i}'}).get_json()['id']
+            for i in range(count)
+        ]
+    
+    def test_first_page(self, client, fresh_db):
+        """Test that limit returns the first rows and a cursor."""
+        ids = self._add(client, 5)
+        
+        response = client.get('/api/names?limit=2')
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [n['id'] for n in data['names']] == ids[:2]
+        assert data['next_after_id'] == ids[1]
+    
+    def test_walk_all_pages(self, client, fresh_db):
+        """Test following next_after_id until the last page."""
+        ids = self._add(client, 5)
+        
+        seen = []
+        after_id = None
+        while True:
+            query = '/api/names?limit=2' + (f'&after_id={after_id}' if after_id else '')
+            data = client.get(query).get_json()
+            seen.extend(n['id'] for n in data['names'])
+            after_id = data['next_after_id']
+            if after_id is None:
+                break
+        
+        assert seen == ids
+    
+    def test_exact_last_page_has_no_cursor(self, client, fresh_db):
+        """Test that a full final page does not promise another one."""
+        self._add(client, 2)
+        
+        data = client.get('/api/names?limit=2').get_json()
+        
+        assert len(data['names']) == 2
+        assert data['next_after_id'] is None
+    
+    def test_unpaginated_response_unchanged(self, client, fresh_db):
+        """Test that the list without limit has no cursor field."""
+        self._add(client, 2)
+        
+        data = client.get('/api/names').get_json()
+        
+        assert 'next_after_id' not in data
+        assert len(data['names']) == 2
+    
+    @pytest.mark.parametrize('query', [
+        'limit=0', 'limit=abc', 'limit=100000', 'limit=5&after_id=-1', 'after_id=3'
+    ])
+    def test_invalid_parameters(self, client, fresh_db, query):
+        """Test that bad pagination parameters are rejected."""
+        response = client.get(f'/api/names?{query}')
+        
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+class TestGetNamesSorting:
+    """Test sort= orderings and their cursors on GET /api/names."""
+    
+    NAMES = ['Carol', 'alice', 'Bob', 'Alice', 'Dave']
+    
+    def _add(self, client):
+        return [
+            client.post('/api/names', json={'name': name}).get_json()['id']
+            for name in self.NAMES
+        ]
+    
+    def _walk(self, client, sort, limit=2):
+        seen = []
+        cursor = None
+        while True:
+            query = f'/api/names?sort={sort}&limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+            response = client.get(query)
+            assert response.status_code == 200
+            data = response.get_json()
+            seen.extend((n['id'], n['name']) for n in data['names'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return seen
+    
+    @pytest.mark.parametrize('sort', ['id', '-id', 'name', '-name', 'created_at', '-created_at'])
+    def test_pages_match_full_ordering(self, client, fresh_db, sort):
+        """Test that walking cursors returns the same rows as the unpaged sort."""
+        self._add(client)
+        
+        full = [(n['id'], n['name']) for n in client.get(f'/api/names?sort={sort}').get_json()['names']]
+        
+        assert self._walk(client, sort) == full
+        assert len(full) == len(self.NAMES)
+    
+    def test_name_order_breaks_ties_by_id(self, client, fresh_db):
+        """Test name sorts, including duplicates split across pages."""
+        client.post('/api/names', json={'name': 'Same'})
+        self._add(client)
+        client.post('/api/names', json={'name': 'Same'})
+        
+        ascending = self._walk(client, 'name', limit=1)
+        descending = self._walk(client, '-name', limit=1)
+        
+        assert ascending == sorted(ascending, key=lambda row: (row[1], row[0]))
+        assert descending == ascending[::-1]
+    
+    def test_created_at_order_breaks_ties_by_id(self, client, fresh_db):
+        """Test that names created in the same second page by id."""
+        ids = self._add(client)
+        
+        assert [row[0] for row in self._walk(client, 'created_at')] == ids
+        assert [row[0] for row in self._walk(client, '-created_at')] == ids[::-1]
+    
+    def test_newest_first_with_after_id(self, client, fresh_db):
+        """Test that -id keeps accepting after_id cursors."""
+        ids = self._add(client)
+        
+        data = client.get('/api/names?sort=-id&limit=2').get_json()
+        assert [n['id'] for n in data['names']] == ids[:-3:-1]
+        
+        data = client.get(f"/api/names?sort=-id&limit=2&after_id={data['next_after_id']}").get_json()
+        assert [n['id'] for n in data['names']] == ids[-3:-5:-1]
+    
+    def test_default_sort_is_id(self, client, fresh_db):
+        """Test that omitting sort keeps the id ordering and after_id cursor."""
+        ids = self._add(client)
+        
+        data = client.get('/api/names?limit=2').get_json()
+        
+        assert [n['id'] for n in data['names']] == ids[:2]
+        assert data['next_after_id'] == ids[1]
+        assert data['next_cursor']
+    
+    def test_name_sort_has_no_after_id(self, client, fresh_db):
+        """Test that only id sorts expose next_after_id."""
+        self._add(client)
+        
+        data = client.get('/api/names?sort=name&limit=2').get_json()
+        
+        assert 'next_after_id' not in data
+        assert data['next_cursor']
+    
+    @pytest.mark.parametrize('query', [
+        'sort=size', 'sort=--id', 'sort=name&limit=2&after_id=3', 'sort=name&cursor=abc',
+        'limit=2&cursor=!!', 'limit=2&cursor=abc&after_id=1',
+    ])
+    def test_invalid_parameters(self, client, fresh_db, query):
+        """Test that unknown sorts and bad cursors are rejected."""
+        response = client.get(f'/api/names?{query}')
+        
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+    
+    def test_cursor_from_another_sort_rejected(self, client, fresh_db):
+        """Test that a name cursor is not accepted for a created_at sort."""
+        self._add(client)
+        cursor = client.get('/api/names?sort=name&limit=2').get_json()['next_cursor']
+        
+        response = client.get(f'/api/names?sort=created_at&limit=2&cursor={cursor}')
+        
+        assert response.status_code == 400
+    
+    def test_sort_indexes_added_to_existing_table(self, tmp_path):
+        """Test that startup creates the sort indexes on a table from before them."""
+        import main
+        from sqlalchemy import create_engine
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+        with legacy.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP)")
+        
+        main.migrate_sort_indexes(legacy)
+        main.migrate_sort_indexes(legacy)
+        
+        with legacy.connect() as conn:
+            indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(names)")}
+        legacy.dispose()
+        assert indexes == {'names_name_id_idx', 'names_created_at_id_idx'}
+
+
 class TestDeleteNamesEndpoint:
     """Test the DELETE /api/names/<id> endpoint."""
     
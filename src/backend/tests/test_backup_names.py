@@ -0,0 +1,172 @@
+"""
+Tests for the parallel backup and restore CLI.
+"""
+import pytest
+import io
+import json
+import os
+from datetime import datetime
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import backup_names
+import main
+from main import metadata, table
+from sqlalchemy import create_engine, inspect, select
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    # Shards run on separate threads, which need to share one database
+    db = create_engine(f"sqlite:///{tmp_path / 'names.db'}", future=True)
+    metadata.create_all(db)
+    yield db
+    db.dispose()
+
+
+def seed(db, count):
+    with db.connect() as conn:
+        conn.execute(table.insert(), [
+            {"name": f"Person {i}", "created_at": datetime(2025, 10, 11, 7, 45, i % 60, 123456)}
+            for i in range(count)
+        ])
+        conn.execute(table.insert().values(
+            name="Zoë", created_at=datetime(2024, 2, 29), name_key="zoë", occurrences=3
+        ))
+        conn.commit()
+
+
+def dump(db):
+    with db.connect() as conn:
+        return [tuple(r) for r in conn.execute(select(*backup_names.COLUMNS).order_by(table.c.id))]
+
+
+class TestSplitRanges:
+    def test_covers_all_ids(self):
+        ranges = backup_names.split_ranges(1, 10, 3)
+
+        assert ranges == [(0, 4), (4, 8), (8, 10)]
+
+    def test_more_shards_than_ids(self):
+        assert backup_names.split_ranges(5, 6, 8) == [(4, 5), (5, 6)]
+
+    def test_empty_table(self):
+        assert backup_names.split_ranges(None, None, 4) == []
+
+
+class TestBackupRoundTrip:
+    """Export to shards and restore into an empty database."""
+
+    @pytest.mark.parametrize("file_format,compression", [
+        ("ndjson", "gzip"),
+        ("columnar", "none"),
+        ("msgpack", "zstd"),
+    ])
+    def test_round_trip(self, file_engine, tmp_path, file_format, compression):
+        seed(file_engine, 250)
+        original = dump(file_engine)
+        backup_dir = tmp_path / "backup"
+
+        manifest = backup_names.export(
+            file_engine, str(backup_dir), jobs=3, shards=5, file_format=file_format,
+            compression=compression, batch_size=40, out=io.StringIO()
+        )
+        assert manifest["rows"] == 251
+        assert len(manifest["shards"]) == 5
+        assert json.loads((backup_dir / "manifest.json").read_text())["shards"] == manifest["shards"]
+
+        with file_engine.connect() as conn:
+            conn.execute(table.delete())
+            conn.commit()
+        restored = backup_names.restore(file_engine, str(backup_dir), jobs=3, out=io.StringIO())
+
+        assert restored == 251
+        assert dump(file_engine) == original
+
+    def test_restore_refuses_non_empty_table(self, file_engine, tmp_path):
+        seed(file_engine, 5)
+        backup_names.export(file_engine, str(tmp_path), jobs=2, out=io.StringIO())
+
+        with pytest.raises(ValueError, match="--truncate"):
+            backup_names.restore(file_engine, str(tmp_path), out=io.StringIO())
+
+        assert backup_names.restore(file_engine, str(tmp_path), truncate=True, out=io.StringIO()) == 6
+
+    def test_failed_restore_keeps_existing_names(self, file_engine, tmp_path):
+        seed(file_engine, 50)
+        backup_names.export(file_engine, str(tmp_path), jobs=2, shards=3, out=io.StringIO())
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        manifest["shards"][1]["rows"] += 1
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+        with file_engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.id > 10))
+        before = dump(file_engine)
+
+        with pytest.raises(ValueError, match="expected"):
+            backup_names.restore(file_engine, str(tmp_path), jobs=2, truncate=True, out=io.StringIO())
+
+        assert dump(file_engine) == before
+        with file_engine.connect() as conn:
+            assert not inspect(conn).has_table(backup_names.staging.name)
+
+    def test_export_of_table_without_dedup_columns(self, file_engine, tmp_path):
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+        with legacy.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP NOT NULL)"
+            )
+            conn.exec_driver_sql("INSERT INTO names (name, created_at) VALUES ('Old', '2024-05-01 10:00:00')")
+        backup_names.export(legacy, str(tmp_path / "backup"), jobs=1, out=io.StringIO())
+        legacy.dispose()
+
+        backup_names.restore(file_engine, str(tmp_path / "backup"), out=io.StringIO())
+
+        assert dump(file_engine) == [(1, "Old", datetime(2024, 5, 1, 10), None, 1)]
+
+    def test_missing_created_at_is_filled_on_restore(self, file_engine, tmp_path):
+        # A backup of a table from before created_at was NOT NULL
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+        with legacy.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP, "
+                "name_key TEXT, occurrences INTEGER NOT NULL DEFAULT 1)"
+            )
+            conn.exec_driver_sql("INSERT INTO names (name) VALUES ('Old')")
+        backup_names.export(legacy, str(tmp_path / "backup"), jobs=1, out=io.StringIO())
+        legacy.dispose()
+
+        backup_names.restore(file_engine, str(tmp_path / "backup"), out=io.StringIO())
+
+        assert [r[:3] for r in dump(file_engine)] == [(1, "Old", main.UNKNOWN_CREATED_AT)]
+
+    def test_migration_backfills_null_created_at(self, tmp_path):
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+        with legacy.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP)")
+            conn.exec_driver_sql("INSERT INTO names (name, created_at) VALUES ('Old', NULL), ('New', '2025-01-01 00:00:00')")
+
+        main.migrate_created_at(legacy)
+
+        with legacy.connect() as conn:
+            assert conn.exec_driver_sql("SELECT name, created_at FROM names ORDER BY id").fetchall() == [
+                ("Old", "1970-01-01 00:00:00.000000"), ("New", "2025-01-01 00:00:00")
+            ]
+        legacy.dispose()
+
+    @pytest.mark.parametrize("command", ["export", "restore"])
+    def test_refuses_sharded_databases(self, tmp_path, monkeypatch, capsys, command):
+        monkeypatch.setattr(backup_names, "DATABASE_SHARD_URLS", ["sqlite://", "sqlite://"])
+
+        assert backup_names.main_cli([command, str(tmp_path)]) == 2
+        assert "DATABASE_SHARD_URLS" in capsys.readouterr().err
+        assert list(tmp_path.iterdir()) == []
+
+    def test_corrupt_shard_is_rejected(self, file_engine, tmp_path):
+        seed(file_engine, 5)
+        manifest = backup_names.export(file_engine, str(tmp_path), jobs=1, out=io.StringIO())
+        with open(tmp_path / manifest["shards"][0]["file"], "ab") as f:
+            f.write(b"garbage")
+
+        with pytest.raises(ValueError, match="checksum"):
+            backup_names.restore(file_engine, str(tmp_path), truncate=True, out=io.StringIO())
@@ -0,0 +1,234 @@
+"""
+Tests for single-flight coalescing of identical list requests.
+"""
+import pytest
+import os
+import threading
+import time
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata
+from coalesce import SingleFlight
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+def run_together(count, target):
+    """Start count threads running target(index) and wait for them."""
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+
+class TestSingleFlight:
+    """Test sharing of in-flight results."""
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = [None] * 5
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "page"
+
+        def leader(_):
+            results[0] = flight.do("key", work)
+
+        def follower(i):
+            results[i] = flight.do("key", work)
+
+        first = threading.Thread(target=leader, args=(0,))
+        first.start()
+        started.wait(5)
+        followers = [threading.Thread(target=follower, args=(i,)) for i in range(1, 5)]
+        for thread in followers:
+            thread.start()
+        while flight.stats()["coalesced"] < 4:
+            time.sleep(0.001)
+        release.set()
+        first.join(5)
+        for thread in followers:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results[0] == ("page", False)
+        assert results[1:] == [("page", True)] * 4
+        stats = flight.stats()
+        assert stats["executed"] == 1
+        assert stats["coalesced"] == 4
+        assert stats["largest_group"] == 5
+        assert stats["in_flight"] == 0
+
+    def test_different_keys_do_not_share(self):
+        flight = SingleFlight()
+
+        assert flight.do("a", lambda: 1) == (1, False)
+        assert flight.do("b", lambda: 2) == (2, False)
+        assert flight.stats()["coalesced"] == 0
+
+    def test_finished_results_are_not_reused(self):
+        flight = SingleFlight()
+        values = iter([1, 2])
+
+        assert flight.do("key", lambda: next(values))[0] == 1
+        assert flight.do("key", lambda: next(values))[0] == 2
+
+    def test_errors_reach_every_waiter(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def work():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("database down")
+
+        def call(_):
+            try:
+                flight.do("key", work)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        first = threading.Thread(target=call, args=(0,))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=call, args=(1,))
+        second.start()
+        while flight.stats()["coalesced"] < 1:
+            time.sleep(0.001)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        assert errors == ["database down", "database down"]
+        assert flight.stats()["in_flight"] == 0
+
+    def test_waiter_gives_up_at_its_timeout(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def work():
+            started.set()
+            release.wait(5)
+            return "page"
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+        leader.start()
+        started.wait(5)
+
+        began = time.monotonic()
+        with pytest.raises(TimeoutError):
+            flight.do("key", work, timeout=0.05)
+        assert time.monotonic() - began < 1
+        release.set()
+        leader.join(5)
+
+        assert results == [("page", False)]
+        assert flight.stats()["in_flight"] == 0
+
+
+class TestListCoalescing:
+    """Test GET /api/names with coalescing enabled."""
+
+    @pytest.fixture
+    def flight(self, monkeypatch, fresh_db):
+        flight = SingleFlight()
+        monkeypatch.setattr(main, 'list_flight', flight)
+        return flight
+
+    @pytest.fixture
+    def slow_render(self, monkeypatch):
+        # In-memory SQLite is per thread, so concurrent requests get a fake page
+        calls = []
+
+        def slow(limit, *args):
+            calls.append(args)
+            time.sleep(0.2)
+            return f'{{"names": [], "limit": {limit}}}'.encode(), 0
+
+        monkeypatch.setattr(main, 'render_names_page', slow)
+        return calls
+
+    def test_identical_requests_share_one_query(self, app, flight, slow_render):
+        responses = [None] * 6
+
+        def fetch(i):
+            responses[i] = app.test_client().get('/api/names?limit=10')
+
+        run_together(6, fetch)
+
+        assert all(r.status_code == 200 for r in responses)
+        assert {r.get_data() for r in responses} == {responses[0].get_data()}
+        assert len(slow_render) < 6
+        assert flight.stats()["coalesced"] == 6 - len(slow_render)
+
+    def test_different_pages_are_not_shared(self, app, flight, slow_render):
+        responses = [None] * 2
+
+        def fetch(i):
+            responses[i] = app.test_client().get(f'/api/names?limit={i + 1}')
+
+        run_together(2, fetch)
+
+        assert len(slow_render) == 2
+        assert flight.stats()["coalesced"] == 0
+
+    def test_followers_keep_their_own_deadline(self, app, flight, slow_render, monkeypatch):
+        monkeypatch.setattr(main, 'ROUTE_DEADLINES_MS', {'list_names': 50})
+        responses = [None] * 2
+
+        def fetch(i):
+            time.sleep(0.05 * i)
+            responses[i] = app.test_client().get('/api/names?limit=10')
+
+        run_together(2, fetch)
+
+        # The fake leader ignores the deadline; the follower must not
+        assert responses[0].status_code == 200
+        assert responses[1].status_code == 503
+        assert 'Retry-After' in responses[1].headers
+
+    def test_clients_that_just_wrote_skip_coalescing(self, client, flight, monkeypatch):
+        monkeypatch.setattr(main, 'name_snapshot', None)
+        client.set_cookie('nm_lsn', 'primary')
+
+        assert client.get('/api/names').status_code == 200
+        assert flight.stats()["requests"] == 0
+
+    def test_response_headers_preserved(self, client, flight):
+        response = client.get('/api/names', headers={'Accept': 'application/vnd.names.columnar+json'})
+
+        assert response.mimetype == 'application/vnd.names.columnar+json'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert 'Accept' in response.headers['Vary']
+
+    def test_stats_endpoint(self, client, flight):
+        client.get('/api/names')
+        data = client.get('/api/health/coalescing').get_json()
+
+        assert data['enabled'] is True
+        assert data['list_names']['executed'] == 1
+
+    def test_stats_endpoint_disabled(self, client, fresh_db, monkeypatch):
+        monkeypatch.setattr(main, 'list_flight', None)
+
+        assert client.get('/api/health/coalescing').get_json() == {'enabled': False}
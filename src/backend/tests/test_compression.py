@@ -0,0 +1,131 @@
+"""
+Tests for backend response compression and the streaming export endpoint.
+"""
+import gzip
+import json
+import os
+import zlib
+
+import pytest
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata, table
+from compression import choose_encoding, compress_stream, zstandard
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def many_names(fresh_db):
+    """Insert enough rows for the list to pass the compression threshold."""
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{"name": f"Person {i}"} for i in range(200)])
+
+
+class TestChooseEncoding:
+    """Test Accept-Encoding negotiation."""
+
+    def test_server_preference_wins(self):
+        assert choose_encoding('gzip, zstd', ['zstd', 'gzip']) == 'zstd'
+
+    def test_only_accepted_encodings(self):
+        assert choose_encoding('gzip, deflate, br', ['zstd', 'gzip']) == 'gzip'
+        assert choose_encoding('br', ['zstd', 'gzip']) is None
+        assert choose_encoding('', ['gzip']) is None
+
+    def test_quality_zero_refuses(self):
+        assert choose_encoding('zstd;q=0, gzip;q=0.5', ['zstd', 'gzip']) == 'gzip'
+        assert choose_encoding('*;q=0', ['gzip']) is None
+
+    def test_wildcard(self):
+        assert choose_encoding('*', ['gzip']) == 'gzip'
+
+
+class TestCompressStream:
+    """Test chunk-by-chunk compression."""
+
+    def test_each_chunk_is_decodable_as_it_arrives(self):
+        decoder = zlib.decompressobj(31)
+        chunks = compress_stream(iter(['{"id": 1}\n', '{"id": 2}\n']), 'gzip', 6)
+
+        assert decoder.decompress(next(chunks)) == b'{"id": 1}\n'
+        assert decoder.decompress(next(chunks)) == b'{"id": 2}\n'
+        decoder.decompress(b''.join(chunks))
+        assert decoder.eof
+
+
+class TestResponseCompression:
+    """Test the after_request compression hook."""
+
+    def test_large_list_is_gzipped(self, client, many_names):
+        response = client.get('/api/names', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        body = json.loads(gzip.decompress(response.data))
+        assert len(body['names']) == 200
+        assert int(response.headers['Content-Length']) == len(response.data)
+
+    @pytest.mark.skipif(zstandard is None, reason="zstandard not installed")
+    def test_large_list_is_zstd_compressed(self, client, many_names):
+        response = client.get('/api/names', headers={'Accept-Encoding': 'gzip, zstd'})
+
+        assert response.headers['Content-Encoding'] == 'zstd'
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(response.data)
+        assert len(json.loads(data)['names']) == 200
+
+    def test_small_response_is_not_compressed(self, client, fresh_db):
+        response = client.get('/api/names', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json() == {'names': []}
+
+    def test_no_accept_encoding(self, client, many_names):
+        response = client.get('/api/names')
+
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_json()['names']) == 200
+
+    def test_disabled(self, client, many_names, monkeypatch):
+        monkeypatch.setattr(main, 'COMPRESSION_ENCODINGS', [])
+        response = client.get('/api/names', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+
+
+class TestExportEndpoint:
+    """Test GET /api/names/export."""
+
+    def test_export_streams_ndjson(self, client, many_names, monkeypatch):
+        monkeypatch.setattr(main, 'EXPORT_BATCH_SIZE', 50)
+        response = client.get('/api/names/export')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert len(rows) == 200
+        assert rows[0]['name'] == 'Person 0'
+        assert [r['id'] for r in rows] == sorted(r['id'] for r in rows)
+
+    def test_export_is_stream_compressed(self, client, many_names):
+        response = client.get('/api/names/export', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        lines = gzip.decompress(response.data).decode().splitlines()
+        assert len(lines) == 200
+
+    def test_export_empty_table(self, client, fresh_db):
+        response = client.get('/api/names/export')
+
+        assert response.status_code == 200
+        assert response.data == b''
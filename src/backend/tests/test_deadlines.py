@@ -0,0 +1,154 @@
+"""
+Tests for request deadlines, statement timeouts and pool checkout timeouts.
+"""
+import pytest
+import os
+import sqlite3
+import time
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+import deadlines
+from main import engine, metadata
+from sqlalchemy import exc
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture(autouse=True)
+def no_deadline():
+    yield
+    deadlines.finish()
+
+
+class CancelledQuery(Exception):
+    pgcode = deadlines.QUERY_CANCELED
+
+
+class TestRequestBudget:
+    """Test combining route limits with the proxy's timeout."""
+
+    def test_parse_route_deadlines(self):
+        assert deadlines.parse_route_deadlines("list_names=2000, add_name = 500,,bad") == {
+            "list_names": 2000.0,
+            "add_name": 500.0,
+        }
+
+    def test_no_limits(self):
+        assert deadlines.request_budget_ms(0) is None
+
+    def test_route_limit(self):
+        assert deadlines.request_budget_ms(2000) == 2000
+
+    def test_proxy_timeout_minus_queue_time(self):
+        budget = deadlines.request_budget_ms(0, "30000", "t=100.000", now=105.0)
+
+        assert budget == pytest.approx(25000)
+
+    def test_shorter_limit_wins(self):
+        assert deadlines.request_budget_ms(2000, "30000", "t=100.0", now=101.0) == 2000
+        assert deadlines.request_budget_ms(2000, "1500", "t=100.0", now=100.5) == pytest.approx(1000)
+
+    def test_expired_proxy_deadline(self):
+        assert deadlines.request_budget_ms(0, "1000", "t=100.0", now=102.0) < 0
+
+    def test_malformed_header_ignored(self):
+        assert deadlines.request_budget_ms(500, "soon") == 500
+
+
+class TestDeadlineQueuePool:
+    """Test that pool checkouts give up at the request deadline."""
+
+    def make_pool(self):
+        return deadlines.DeadlineQueuePool(
+            lambda: sqlite3.connect(":memory:", check_same_thread=False),
+            pool_size=1, max_overflow=0, timeout=10
+        )
+
+    def test_base_timeout_without_deadline(self):
+        assert self.make_pool()._timeout == 10
+
+    def test_timeout_capped_by_deadline(self):
+        pool = self.make_pool()
+        deadlines.start(200)
+
+        assert 0 < pool._timeout <= 0.2
+
+    def test_checkout_fails_at_deadline(self):
+        pool = self.make_pool()
+        held = pool.connect()
+        deadlines.start(50)
+        started = time.monotonic()
+
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+        assert time.monotonic() - started < 1
+        held.close()
+
+
+class TestClassify:
+    def test_pool_timeout(self):
+        assert deadlines.classify(exc.TimeoutError("pool")) == "pool"
+
+    def test_cancelled_statement(self):
+        error = exc.OperationalError("SELECT", {}, CancelledQuery())
+
+        assert deadlines.classify(error) == "statement"
+
+    def test_other_errors(self):
+        assert deadlines.classify(ValueError("boom")) is None
+
+
+class TestDeadlineResponses:
+    """Test how the API reports requests that ran out of time."""
+
+    def test_expired_deadline_rejected_before_work(self, client, fresh_db):
+        start = f"t={time.time() - 5:.3f}"
+        response = client.get('/api/names', headers={
+            'X-Request-Start': start,
+            'X-Request-Timeout-Ms': '1000',
+        })
+
+        assert response.status_code == 504
+
+    def test_cancelled_query_returns_504(self, client, fresh_db, monkeypatch):
+        def cancelled(work, min_position=None):
+            raise exc.OperationalError("SELECT", {}, CancelledQuery())
+        monkeypatch.setattr(main.read_router, 'execute', cancelled)
+
+        response = client.get('/api/names')
+
+        assert response.status_code == 504
+        assert response.get_json()['error'] == 'Request deadline exceeded'
+
+    def test_pool_timeout_returns_503(self, client, fresh_db, monkeypatch):
+        def exhausted(work, min_position=None):
+            raise exc.TimeoutError("QueuePool limit reached")
+        monkeypatch.setattr(main.read_router, 'execute', exhausted)
+
+        response = client.get('/api/names')
+
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+
+    def test_route_deadline_applies_during_request(self, client, fresh_db, monkeypatch):
+        seen = []
+        monkeypatch.setattr(main, 'ROUTE_DEADLINES_MS', {'list_names': 2000})
+
+        def record(work, min_position=None):
+            seen.append(deadlines.remaining_seconds())
+            return []
+        monkeypatch.setattr(main.read_router, 'execute', record)
+
+        client.get('/api/names')
+
+        assert 0 < seen[0] <= 2
+        assert deadlines.remaining_seconds() is None
@@ -0,0 +1,151 @@
+"""
+Tests for DEDUP_NAMES mode, where equivalent names are stored once.
+"""
+import pytest
+import os
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata, normalize_name
+from sqlalchemy import create_engine
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    monkeypatch.setattr(main, 'DEDUP_NAMES', True)
+
+
+class TestNormalizeName:
+    """Test the deduplication key."""
+
+    def test_case_folded(self):
+        assert normalize_name("John DOE") == "john doe"
+        assert normalize_name("Straße") == normalize_name("STRASSE")
+
+    def test_whitespace_collapsed(self):
+        assert normalize_name("John \t  Doe") == "john doe"
+
+    def test_escaped_content_preserved(self):
+        assert normalize_name("A &amp; B") == "a &amp; b"
+
+
+class TestDedupMode:
+    """Test POST/GET /api/names with DEDUP_NAMES enabled."""
+
+    def test_first_submission_is_created(self, client, fresh_db, dedup):
+        response = client.post('/api/names', json={'name': 'John Doe'})
+
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['name'] == 'John Doe'
+        assert data['occurrences'] == 1
+
+    def test_repeat_returns_existing_id(self, client, fresh_db, dedup):
+        first = client.post('/api/names', json={'name': 'John Doe'}).get_json()
+        response = client.post('/api/names', json={'name': '  john   DOE '})
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['id'] == first['id']
+        assert data['name'] == 'John Doe'
+        assert data['occurrences'] == 2
+
+    def test_list_scales_with_distinct_names(self, client, fresh_db, dedup):
+        for name in ['John Doe', 'JOHN DOE', 'Jane Smith', 'john doe']:
+            client.post('/api/names', json={'name': name})
+
+        names = client.get('/api/names').get_json()['names']
+        assert [(n['name'], n['occurrences']) for n in names] == [
+            ('John Doe', 3),
+            ('Jane Smith', 1),
+        ]
+
+    def test_delete_removes_all_occurrences(self, client, fresh_db, dedup):
+        name_id = client.post('/api/names', json={'name': 'John Doe'}).get_json()['id']
+        client.post('/api/names', json={'name': 'john doe'})
+
+        assert client.delete(f'/api/names/{name_id}').status_code == 200
+        response = client.post('/api/names', json={'name': 'John Doe'})
+        assert response.status_code == 201
+        assert response.get_json()['occurrences'] == 1
+
+    def test_duplicates_kept_when_disabled(self, client, fresh_db):
+        client.post('/api/names', json={'name': 'John Doe'})
+        response = client.post('/api/names', json={'name': 'John Doe'})
+
+        assert response.status_code == 201
+        names = client.get('/api/names').get_json()['names']
+        assert len(names) == 2
+        assert 'occurrences' not in names[0]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A names table from before dedup mode, without its columns or index."""
+    db = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+    with db.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO names (name) VALUES ('John Doe'), ('Jane'), ('JOHN  doe'), ('john doe')"
+        )
+    yield db
+    db.dispose()
+
+
+def stored(db):
+    with db.connect() as conn:
+        return conn.exec_driver_sql("SELECT id, name, name_key, occurrences FROM names ORDER BY id").fetchall()
+
+
+class TestDedupMigration:
+    """Test upgrading a names table that predates DEDUP_NAMES."""
+
+    def test_adds_columns_and_unique_index(self, legacy_db):
+        main.migrate_dedup_columns(legacy_db)
+        main.migrate_dedup_columns(legacy_db)
+
+        assert stored(legacy_db)[0] == (1, 'John Doe', None, 1)
+        with legacy_db.connect() as conn:
+            indexes = conn.exec_driver_sql("PRAGMA index_list(names)").fetchall()
+        assert [(i[1], i[2]) for i in indexes] == [('names_name_key_idx', 1)]
+
+    def test_merges_existing_duplicates(self, legacy_db):
+        main.migrate_dedup_columns(legacy_db)
+
+        assert main.migrate_name_keys(legacy_db, batch_size=2) == 2
+
+        assert stored(legacy_db) == [(1, 'John Doe', 'john doe', 3), (2, 'Jane', 'jane', 1)]
+        assert main.migrate_name_keys(legacy_db) == 0
+
+    def test_keeps_the_row_already_keyed(self, legacy_db):
+        main.migrate_dedup_columns(legacy_db)
+        with legacy_db.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO names (name, name_key, occurrences) VALUES ('Jane', 'jane', 2)"
+            )
+
+        main.migrate_name_keys(legacy_db)
+
+        assert stored(legacy_db) == [(1, 'John Doe', 'john doe', 3), (5, 'Jane', 'jane', 3)]
+
+    def test_upgraded_table_accepts_dedup_inserts(self, legacy_db):
+        main.migrate_dedup_columns(legacy_db)
+        main.migrate_name_keys(legacy_db)
+
+        with legacy_db.begin() as conn:
+            row = main.upsert_name(conn, 'JOHN DOE')
+
+        assert (row.id, row.occurrences) == (1, 4)
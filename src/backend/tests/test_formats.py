@@ -0,0 +1,117 @@
+"""
+Tests for columnar JSON and MessagePack list formats.
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import formats
+from main import engine, metadata, table
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def three_names(fresh_db):
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [
+            {"name": "Ann", "created_at": datetime(2025, 1, 1, 0, 0, 0)},
+            {"name": "Bob", "created_at": datetime(2025, 1, 1, 0, 0, 1)},
+            {"name": "Cy", "created_at": datetime(2025, 1, 1, 0, 0, 2)},
+        ])
+
+
+class TestEpochMs:
+    """Test timestamp conversion."""
+
+    def test_naive_is_utc(self):
+        assert formats.epoch_ms(datetime(1970, 1, 1, 0, 0, 1, 500000)) == 1500
+
+    def test_aware(self):
+        assert formats.epoch_ms(datetime(1970, 1, 1, 0, 0, 2, tzinfo=timezone.utc)) == 2000
+
+    def test_none(self):
+        assert formats.epoch_ms(None) is None
+
+
+class TestListFormats:
+    """Test Accept negotiation on GET /api/names."""
+
+    def test_default_is_row_json(self, client, three_names):
+        response = client.get('/api/names')
+
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['names'][0]['name'] == 'Ann'
+        assert 'Accept' in response.headers['Vary']
+
+    def test_columnar_json(self, client, three_names):
+        response = client.get('/api/names', headers={'Accept': formats.COLUMNAR_JSON})
+
+        assert response.mimetype == formats.COLUMNAR_JSON
+        body = json.loads(response.data)
+        assert body['names'] == ['Ann', 'Bob', 'Cy']
+        assert body['created_at'] == [1735689600000, 1735689601000, 1735689602000]
+        assert len(body['ids']) == 3
+        assert 'next_after_id' not in body
+
+    def test_columnar_pages(self, client, three_names):
+        response = client.get('/api/names?limit=2', headers={'Accept': formats.COLUMNAR_JSON})
+
+        body = json.loads(response.data)
+        assert body['names'] == ['Ann', 'Bob']
+        assert body['next_after_id'] == body['ids'][-1]
+
+    @pytest.mark.skipif(formats.msgpack is None, reason="msgpack not installed")
+    @pytest.mark.parametrize('accept', ['application/msgpack', 'application/x-msgpack'])
+    def test_msgpack(self, client, three_names, accept):
+        response = client.get('/api/names', headers={'Accept': accept})
+
+        assert response.mimetype == formats.MSGPACK
+        body = formats.msgpack.unpackb(response.data)
+        assert body['names'] == ['Ann', 'Bob', 'Cy']
+        assert len(response.data) < len(client.get('/api/names').data)
+
+    def test_unsupported_accept_falls_back_to_json(self, client, three_names):
+        response = client.get('/api/names', headers={'Accept': 'text/csv'})
+
+        assert response.mimetype == 'application/json'
+
+    def test_browser_accept_gets_json(self, client, three_names):
+        accept = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+        response = client.get('/api/names', headers={'Accept': accept})
+
+        assert response.mimetype == 'application/json'
+
+
+class TestExportFormats:
+    """Test Accept negotiation on GET /api/names/export."""
+
+    def test_columnar_batches(self, client, three_names, monkeypatch):
+        import main
+        monkeypatch.setattr(main, 'EXPORT_BATCH_SIZE', 2)
+        response = client.get('/api/names/export', headers={'Accept': formats.COLUMNAR_JSON})
+
+        assert response.mimetype == formats.COLUMNAR_JSON
+        batches = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert [b['names'] for b in batches] == [['Ann', 'Bob'], ['Cy']]
+
+    @pytest.mark.skipif(formats.msgpack is None, reason="msgpack not installed")
+    def test_msgpack_stream(self, client, three_names, monkeypatch):
+        import main
+        monkeypatch.setattr(main, 'EXPORT_BATCH_SIZE', 2)
+        response = client.get('/api/names/export', headers={'Accept': formats.MSGPACK})
+
+        unpacker = formats.msgpack.Unpacker()
+        unpacker.feed(response.data)
+        assert [b['names'] for b in unpacker] == [['Ann', 'Bob'], ['Cy']]
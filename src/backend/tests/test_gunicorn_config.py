@@ -0,0 +1,130 @@
+"""
+Tests for the gunicorn configuration module (gunicorn.conf.py).
+"""
+import importlib.util
+import os
+
+import pytest
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+
+def load_config(monkeypatch, **env):
+    """Import gunicorn.conf.py with the given environment."""
+    for name in list(os.environ):
+        if name.startswith('GUNICORN_'):
+            monkeypatch.delenv(name)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', CONFIG_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def config(monkeypatch):
+    return load_config(monkeypatch)
+
+
+class TestDetectCpuLimit:
+    """Test cgroup CPU quota detection."""
+
+    def test_cgroup_v2_quota(self, config, tmp_path):
+        (tmp_path / 'cpu.max').write_text('50000 100000\n')
+        assert config.detect_cpu_limit(str(tmp_path)) == pytest.approx(0.5)
+
+    def test_cgroup_v2_unlimited(self, config, tmp_path):
+        (tmp_path / 'cpu.max').write_text('max 100000\n')
+        assert config.detect_cpu_limit(str(tmp_path)) == len(os.sched_getaffinity(0))
+
+    def test_cgroup_v1_quota(self, config, tmp_path):
+        (tmp_path / 'cpu').mkdir()
+        (tmp_path / 'cpu' / 'cpu.cfs_quota_us').write_text('25000\n')
+        (tmp_path / 'cpu' / 'cpu.cfs_period_us').write_text('100000\n')
+        assert config.detect_cpu_limit(str(tmp_path)) == pytest.approx(0.25)
+
+    def test_quota_above_host_cpus_is_capped(self, config, tmp_path):
+        (tmp_path / 'cpu.max').write_text('100000000 100000\n')
+        assert config.detect_cpu_limit(str(tmp_path)) == len(os.sched_getaffinity(0))
+
+    def test_no_cgroup_files(self, config, tmp_path):
+        assert config.detect_cpu_limit(str(tmp_path)) == len(os.sched_getaffinity(0))
+
+
+class TestPlanWorkers:
+    """Test automatic worker sizing."""
+
+    def test_sync_oversubscribes(self, config):
+        assert config.plan_workers('sync', 0.5) == (2, 1)
+        assert config.plan_workers('sync', 4) == (9, 1)
+
+    def test_gthread_one_worker_per_cpu(self, config):
+        assert config.plan_workers('gthread', 0.5) == (1, 4)
+        assert config.plan_workers('gthread', 2.5) == (3, 4)
+
+    def test_gevent_one_worker_per_cpu(self, config):
+        assert config.plan_workers('gevent', 2) == (2, 1)
+
+    def test_explicit_counts_win(self, config):
+        assert config.plan_workers('gthread', 8, workers=2, threads=16) == (2, 16)
+        assert config.plan_workers('sync', 8, workers=3) == (3, 1)
+
+
+class TestEnvironmentSettings:
+    """Test settings read from GUNICORN_* variables."""
+
+    def test_defaults(self, config):
+        assert config.worker_class == 'gthread'
+        assert config.keepalive == 75
+        assert config.max_requests == 1000
+        assert config.max_requests_jitter == 100
+        assert config.preload_app is False
+
+    def test_overrides(self, monkeypatch):
+        config = load_config(
+            monkeypatch,
+            GUNICORN_WORKER_CLASS='sync',
+            GUNICORN_WORKERS='3',
+            GUNICORN_KEEPALIVE='10',
+            GUNICORN_MAX_REQUESTS='0',
+            GUNICORN_PRELOAD='true',
+        )
+        assert (config.worker_class, config.workers, config.threads) == ('sync', 3, 1)
+        assert config.keepalive == 10
+        assert config.max_requests == 0
+        assert config.preload_app is True
+
+    def test_unknown_worker_class_falls_back(self, monkeypatch):
+        config = load_config(monkeypatch, GUNICORN_WORKER_CLASS='eventlet')
+        assert config.worker_class == 'gthread'
+
+
+class TestPreload:
+    """Test the fork hooks when the app is preloaded in the master."""
+
+    def test_load_shedder_follows_pool_replaced_after_fork(self, monkeypatch, tmp_path):
+        os.environ.setdefault('DB_URL', 'sqlite:///:memory:')
+        import main
+        from sqlalchemy import create_engine
+        from replicas import ReadRouter
+        from throttling import LoadShedder
+
+        # The app's shedder looks the pool up through the engine
+        assert main.load_shedder.engine is main.engine
+        engine = create_engine(f"sqlite:///{tmp_path}/names.db", future=True)
+        shedder = LoadShedder(engine=engine, pool_capacity=1)
+        monkeypatch.setattr(main, 'engine', engine)
+        monkeypatch.setattr(main, 'read_router', ReadRouter(engine))
+        monkeypatch.setattr(main, 'shard_router', None)
+        monkeypatch.setattr(main, 'load_shedder', shedder)
+        config = load_config(monkeypatch, GUNICORN_PRELOAD='true')
+        master_pool = engine.pool
+
+        config.post_fork(server=None, worker=None)
+
+        assert engine.pool is not master_pool
+        with engine.connect():
+            assert 'database connections' in shedder.overload_reason()
+        assert shedder.overload_reason() is None
+        engine.dispose()
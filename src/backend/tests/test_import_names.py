@@ -0,0 +1,148 @@
+"""
+Tests for the bulk import CLI.
+"""
+import pytest
+import io
+import os
+from unittest.mock import patch
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+import import_names
+from main import engine, metadata, table
+from sqlalchemy import select
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+def stored_names():
+    with engine.connect() as conn:
+        return [r.name for r in conn.execute(select(table.c.name).order_by(table.c.id))]
+
+
+def run(path, *extra):
+    args = import_names.parse_args([str(path), "--workers", "2", *extra])
+    return import_names.run(args, out=io.StringIO())
+
+
+class TestValidateChunk:
+    """Test validation of raw records in pool workers."""
+
+    def test_text_lines_are_sanitized(self):
+        names, keys, rejected, reasons = import_names.validate_chunk(
+            ["Alice\n", "  Bob   Smith \n", "<b>Eve</b>\n", "\n"], "text", None, False
+        )
+
+        assert names == ["Alice", "Bob Smith", "&lt;b&gt;Eve&lt;/b&gt;"]
+        assert keys is None
+        assert rejected == 0
+
+    def test_invalid_records_are_counted(self):
+        names, _, rejected, reasons = import_names.validate_chunk(
+            ['{"name": "Alice"}\n', '{"other": 1}\n', 'not json\n', '{"name": "' + 'x' * 60 + '"}\n'],
+            "ndjson", "name", False
+        )
+
+        assert names == ["Alice"]
+        assert rejected == 3
+        assert reasons["Invalid JSON line."] == 1
+        assert reasons["Name cannot be empty."] == 1
+
+    def test_dedup_keys(self):
+        names, keys, _, _ = import_names.validate_chunk(["John DOE\n"], "text", None, True)
+
+        assert keys == ["john doe"]
+
+
+class TestCopyEscape:
+    def test_special_characters(self):
+        assert import_names.copy_escape("a\\b\tc\nd") == "a\\\\b\\tc\\nd"
+
+
+class TestImport:
+    """Test end-to-end imports into SQLite."""
+
+    def test_text_import(self, fresh_db, tmp_path):
+        path = tmp_path / "names.txt"
+        path.write_text("Alice\nBob\n\nCarol\n")
+        summary = run(path, "--chunk-size", "2")
+
+        assert stored_names() == ["Alice", "Bob", "Carol"]
+        assert summary["loaded"] == 3
+        assert summary["rows_per_second"] > 0
+
+    def test_csv_import(self, fresh_db, tmp_path):
+        path = tmp_path / "people.csv"
+        path.write_text('id,full_name\n1,Alice\n2,"Smith, Bob"\n3,\n')
+        summary = run(path, "--column", "full_name")
+
+        assert stored_names() == ["Alice", "Smith, Bob"]
+        assert summary["rejected"] == 1
+
+    def test_missing_csv_column(self, fresh_db, tmp_path):
+        path = tmp_path / "people.csv"
+        path.write_text("id,other\n1,Alice\n")
+
+        with pytest.raises(ValueError):
+            run(path)
+
+    def test_completed_import_is_not_repeated(self, fresh_db, tmp_path):
+        path = tmp_path / "names.txt"
+        path.write_text("Alice\nBob\n")
+        run(path)
+        summary = run(path)
+
+        assert summary["loaded"] == 0
+        assert stored_names() == ["Alice", "Bob"]
+
+        run(path, "--restart")
+        assert stored_names() == ["Alice", "Bob", "Alice", "Bob"]
+
+    def test_resume_after_failure(self, fresh_db, tmp_path):
+        path = tmp_path / "names.txt"
+        path.write_text("".join(f"Name {i}\n" for i in range(10)))
+        real_load = import_names.load_chunk
+        calls = []
+
+        def failing_load(conn, names, keys):
+            calls.append(names)
+            if len(calls) == 3:
+                raise OSError("connection lost")
+            real_load(conn, names, keys)
+
+        with patch.object(import_names, "load_chunk", failing_load):
+            with pytest.raises(OSError):
+                run(path, "--chunk-size", "2")
+        assert stored_names() == [f"Name {i}" for i in range(4)]
+
+        summary = run(path, "--chunk-size", "2")
+
+        assert summary["skipped_chunks"] == 2
+        assert stored_names() == [f"Name {i}" for i in range(10)]
+
+    def test_dedup_import(self, fresh_db, tmp_path, monkeypatch):
+        monkeypatch.setattr(main, "DEDUP_NAMES", True)
+        path = tmp_path / "names.txt"
+        path.write_text("Alice\nalice\nBob\n")
+        run(path)
+
+        with engine.connect() as conn:
+            rows = conn.execute(select(table.c.name, table.c.occurrences).order_by(table.c.id)).fetchall()
+        assert [(r.name, r.occurrences) for r in rows] == [("Alice", 2), ("Bob", 1)]
+
+    def test_refuses_sharded_databases(self, fresh_db, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(main, "DATABASE_SHARD_URLS", ["sqlite://", "sqlite://"])
+        path = tmp_path / "names.txt"
+        path.write_text("Alice\n")
+
+        assert import_names.main_cli([str(path)]) == 2
+        assert "DATABASE_SHARD_URLS" in capsys.readouterr().err
+        assert stored_names() == []
@@ -0,0 +1,299 @@
+"""
+Tests for the background job queue, runner and /api/jobs endpoints.
+"""
+import pytest
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import exc, select, update
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+import jobs
+from main import engine, metadata, table, tombstones, jobs_table, job_outputs
+from suggest import PrefixIndex
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def runner(fresh_db, monkeypatch):
+    """The app's runner with small batches; tests run jobs with run_once()."""
+    monkeypatch.setattr(main.job_runner, 'batch_size', 2)
+    return main.job_runner
+
+
+def submit(client, kind, **params):
+    response = client.post('/api/jobs', json={'kind': kind, 'params': params})
+    assert response.status_code == 202
+    return response.get_json()['id']
+
+
+def stored_names():
+    with engine.connect() as conn:
+        return [r.name for r in conn.execute(select(table.c.name).order_by(table.c.id))]
+
+
+def set_job(job_id, **values):
+    with engine.connect() as conn:
+        conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(**values))
+        conn.commit()
+
+
+class TestJobEndpoints:
+    """Test submitting, polling and cancelling jobs."""
+
+    def test_submit_returns_queued_job(self, client, runner):
+        response = client.post('/api/jobs', json={'kind': 'import', 'params': {'names': ['Alice']}})
+
+        assert response.status_code == 202
+        job = response.get_json()
+        assert job['status'] == 'queued'
+        assert response.headers['Location'] == f"/api/jobs/{job['id']}"
+        assert client.get(f"/api/jobs/{job['id']}").get_json()['status'] == 'queued'
+
+    @pytest.mark.parametrize('body', [
+        None,
+        {'kind': 'reindex'},
+        {'kind': 'import', 'params': []},
+        {'kind': 'import', 'params': {'names': []}},
+        {'kind': 'delete_range', 'params': {'min_id': 5, 'max_id': 1}},
+        {'kind': 'delete_range', 'params': {'min_id': 'a', 'max_id': 1}},
+    ])
+    def test_invalid_submissions(self, client, runner, body):
+        response = client.post('/api/jobs', json=body)
+
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+    def test_import_size_limit(self, client, runner, monkeypatch):
+        monkeypatch.setattr(main, 'JOB_MAX_IMPORT_NAMES', 2)
+
+        response = client.post('/api/jobs', json={'kind': 'import', 'params': {'names': ['A', 'B', 'C']}})
+
+        assert response.status_code == 400
+
+    def test_unknown_job(self, client, runner):
+        assert client.get('/api/jobs/999').status_code == 404
+        assert client.post('/api/jobs/999/cancel').status_code == 404
+
+    @pytest.mark.parametrize('url', ['/api/jobs/1', '/api/jobs/1/output'])
+    def test_lookup_errors_are_json(self, client, runner, monkeypatch, url):
+        def exhausted(job_id):
+            raise exc.TimeoutError("QueuePool limit reached")
+
+        monkeypatch.setattr(main.job_queue, 'get', exhausted)
+
+        response = client.get(url)
+
+        assert response.status_code == 503
+        assert 'error' in response.get_json()
+
+        def broken(job_id):
+            raise RuntimeError("database down")
+
+        monkeypatch.setattr(main.job_queue, 'get', broken)
+
+        response = client.get(url)
+
+        assert response.status_code == 500
+        assert response.get_json() == {'error': 'Internal server error'}
+
+    def test_cancel_queued_job(self, client, runner):
+        job_id = submit(client, 'import', names=['Alice'])
+
+        response = client.post(f'/api/jobs/{job_id}/cancel')
+
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'cancelled'
+        assert runner.run_once() is False
+        assert stored_names() == []
+
+    def test_cancel_finished_job_conflicts(self, client, runner):
+        job_id = submit(client, 'import', names=['Alice'])
+        runner.run_once()
+
+        assert client.post(f'/api/jobs/{job_id}/cancel').status_code == 409
+
+
+class TestJobKinds:
+    """Test the import, delete_range and export handlers."""
+
+    def test_import(self, client, runner):
+        job_id = submit(client, 'import', names=['Alice', '', 'Bob', 'x' * 60, 'Carol'])
+
+        assert runner.run_once() is True
+
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        assert job['status'] == 'succeeded'
+        assert job['progress'] == {'done': 5, 'total': 5}
+        assert job['result'] == {'imported': 3, 'rejected': 2}
+        assert stored_names() == ['Alice', 'Bob', 'Carol']
+
+    def test_import_resumes_after_committed_batches(self, client, runner):
+        job_id = submit(client, 'import', names=['Alice', 'Bob', 'Carol', 'Dave'])
+        # An earlier attempt committed the first batch
+        client.post('/api/names', json={'name': 'Alice'})
+        client.post('/api/names', json={'name': 'Bob'})
+        set_job(job_id, done=2)
+
+        runner.run_once()
+
+        assert stored_names() == ['Alice', 'Bob', 'Carol', 'Dave']
+        assert client.get(f'/api/jobs/{job_id}').get_json()['result'] == {'imported': 4, 'rejected': 0}
+
+    def test_delete_range(self, client, runner):
+        ids = [client.post('/api/names', json={'name': f'Person {i}'}).get_json()['id'] for i in range(6)]
+        job_id = submit(client, 'delete_range', min_id=ids[1], max_id=ids[4])
+
+        runner.run_once()
+
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        assert job['status'] == 'succeeded'
+        assert job['result'] == {'deleted': 4}
+        assert job['progress'] == {'done': 4, 'total': 4}
+        assert stored_names() == ['Person 0', 'Person 5']
+
+    def test_delete_range_writes_tombstones(self, client, runner, monkeypatch):
+        # Tombstones are only written while an in-memory copy reads them
+        monkeypatch.setattr(main, 'name_index', PrefixIndex(table, tombstones, main.normalize_name))
+        ids = [client.post('/api/names', json={'name': f'Person {i}'}).get_json()['id'] for i in range(3)]
+        submit(client, 'delete_range', min_id=ids[0], max_id=ids[1])
+
+        runner.run_once()
+
+        with engine.connect() as conn:
+            assert sorted(conn.execute(select(tombstones.c.name_id)).scalars()) == ids[:2]
+
+    def test_export_output(self, client, runner):
+        for name in ['Alice', 'Bob', 'Carol']:
+            client.post('/api/names', json={'name': name})
+        job_id = submit(client, 'export')
+
+        assert client.get(f'/api/jobs/{job_id}/output').status_code == 409
+        runner.run_once()
+
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        assert job['result']['exported'] == 3
+        assert job['result']['output'] == f'/api/jobs/{job_id}/output'
+        response = client.get(f'/api/jobs/{job_id}/output')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/gzip'
+        lines = gzip.decompress(response.get_data()).decode().splitlines()
+        assert [json.loads(line)['name'] for line in lines] == ['Alice', 'Bob', 'Carol']
+
+    def test_output_only_for_exports(self, client, runner):
+        job_id = submit(client, 'import', names=['Alice'])
+        runner.run_once()
+
+        assert client.get(f'/api/jobs/{job_id}/output').status_code == 404
+
+
+class TestJobRunner:
+    """Test claiming, cancellation, fencing and recovery."""
+
+    def make_runner(self, run):
+        return jobs.JobRunner(
+            engine, jobs_table, job_outputs,
+            {'custom': jobs.JobKind(lambda params: None, run)},
+            batch_size=2, stale_seconds=30, max_attempts=2,
+        )
+
+    def queue(self, kind='custom'):
+        return main.job_queue.submit(kind, {}).id
+
+    def test_claims_oldest_job_once(self, fresh_db):
+        runner = self.make_runner(lambda context: None)
+        first, second = self.queue(), self.queue()
+
+        assert runner.claim().id == first
+        assert runner.claim().id == second
+        assert runner.claim() is None
+
+    def test_running_job_stops_at_checkpoint_after_cancel(self, fresh_db):
+        def run(context):
+            with engine.connect() as conn:
+                conn.execute(table.insert().values(name='Kept'))
+                main.job_queue.cancel(context.job_id)
+                context.checkpoint(conn, 1)
+                conn.execute(table.insert().values(name='Never'))
+                context.checkpoint(conn, 2)
+
+        runner = self.make_runner(run)
+        job_id = self.queue()
+        runner.run_once()
+
+        job = main.job_queue.get(job_id)
+        assert job.status == 'cancelled'
+        assert job.done == 1
+        assert stored_names() == ['Kept']
+
+    def test_handler_errors_fail_the_job(self, fresh_db):
+        def run(context):
+            raise RuntimeError("disk full")
+
+        job_id = self.queue()
+        self.make_runner(run).run_once()
+
+        job = main.job_queue.get(job_id)
+        assert job.status == 'failed'
+        assert job.error == 'disk full'
+
+    def test_unknown_kind_fails(self, fresh_db):
+        job_id = self.queue('vanished')
+        self.make_runner(lambda context: None).run_once()
+
+        assert main.job_queue.get(job_id).status == 'failed'
+
+    def test_superseded_attempt_cannot_write(self, fresh_db):
+        def run(context):
+            # Meanwhile the job was recovered and claimed again
+            set_job(context.job_id, attempts=context.attempt + 1)
+            with engine.connect() as conn:
+                conn.execute(table.insert().values(name='Lost'))
+                context.checkpoint(conn, 1)
+
+        job_id = self.queue()
+        self.make_runner(run).run_once()
+
+        job = main.job_queue.get(job_id)
+        assert job.status == 'running'
+        assert job.done == 0
+        assert stored_names() == []
+
+    def test_recover_requeues_then_fails_abandoned_jobs(self, fresh_db):
+        runner = self.make_runner(lambda context: None)
+        old = datetime.utcnow() - timedelta(minutes=5)
+        retry, exhausted, cancelling = self.queue(), self.queue(), self.queue()
+        set_job(retry, status='running', attempts=1, heartbeat_at=old)
+        set_job(exhausted, status='running', attempts=2, heartbeat_at=old)
+        set_job(cancelling, status='running', attempts=1, heartbeat_at=old, cancel_requested=True)
+
+        runner.recover()
+
+        assert main.job_queue.get(retry).status == 'queued'
+        assert main.job_queue.get(exhausted).status == 'failed'
+        assert main.job_queue.get(cancelling).status == 'cancelled'
+
+    def test_recover_prunes_old_finished_jobs(self, fresh_db):
+        runner = self.make_runner(lambda context: None)
+        job_id = self.queue()
+        set_job(job_id, status='succeeded', finished_at=datetime.utcnow() - timedelta(days=30))
+        with engine.connect() as conn:
+            conn.execute(job_outputs.insert().values(job_id=job_id, seq=0, data=b'x'))
+            conn.commit()
+
+        runner.recover()
+
+        assert main.job_queue.get(job_id) is None
+        assert list(main.job_queue.output(job_id)) == []
@@ -0,0 +1,184 @@
+"""
+Tests for tracemalloc-based memory diagnostics.
+"""
+import pytest
+import os
+import tracemalloc
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata
+from memtrace import MemoryTracer
+
+TOKEN = "test-token"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def tracer():
+    tracer = MemoryTracer(top_requests=3, snapshots=3)
+    tracer.start()
+    yield tracer
+    tracemalloc.stop()
+
+
+@pytest.fixture
+def diagnostics(fresh_db, tracer, monkeypatch):
+    """Turn memory diagnostics on for the API."""
+    monkeypatch.setattr(main, 'memory_tracer', tracer)
+    monkeypatch.setattr(main, 'DIAGNOSTICS_TOKEN', TOKEN)
+    return tracer
+
+
+def allocate(size):
+    return bytearray(size)
+
+
+class TestMemoryTracer:
+    """Test per-request peaks, reports and snapshot diffs."""
+
+    def test_request_peak_covers_freed_memory(self, tracer):
+        trace = tracer.begin()
+        block = allocate(2_000_000)
+        del block
+
+        peak = tracer.end(trace, "GET /a")
+
+        assert peak >= 2_000_000
+        request = tracer.largest_requests()[0]
+        assert request["route"] == "GET /a"
+        assert request["overlapped"] is False
+        assert request["retained_bytes"] < 1_000_000
+
+    def test_overlapping_requests_are_marked(self, tracer):
+        first = tracer.begin()
+        second = tracer.begin()
+        tracer.end(second, "GET /b")
+        tracer.end(first, "GET /a")
+
+        tracer.end(tracer.begin(), "GET /c")
+
+        overlapped = {r["route"]: r["overlapped"] for r in tracer.largest_requests()}
+        assert overlapped == {"GET /a": True, "GET /b": True, "GET /c": False}
+
+    def test_routes_aggregate_peaks(self, tracer):
+        for size in (1_000_000, 3_000_000):
+            trace = tracer.begin()
+            allocate(size)
+            tracer.end(trace, "POST /api/jobs")
+        tracer.end(tracer.begin(), "GET /api/health")
+
+        routes = tracer.routes()
+
+        assert list(routes) == ["POST /api/jobs", "GET /api/health"]
+        assert routes["POST /api/jobs"]["requests"] == 2
+        assert routes["POST /api/jobs"]["max_peak_bytes"] >= 3_000_000
+        assert routes["POST /api/jobs"]["mean_peak_bytes"] >= 2_000_000
+
+    def test_keeps_only_the_largest_requests(self, tracer):
+        for i, size in enumerate((100_000, 4_000_000, 200_000, 3_000_000, 2_000_000)):
+            trace = tracer.begin()
+            allocate(size)
+            tracer.end(trace, f"GET /{i}")
+
+        assert [r["route"] for r in tracer.largest_requests()] == ["GET /1", "GET /3", "GET /4"]
+
+    def test_diff_shows_growth_between_snapshots(self, tracer):
+        before = tracer.take_snapshot()
+        kept = allocate(3_000_000)
+        after = tracer.take_snapshot()
+
+        diff = tracer.diff(before["id"], after["id"])
+
+        assert diff["since"] == before["id"]
+        assert diff["until"] == after["id"]
+        assert diff["size_diff_bytes"] >= 3_000_000
+        assert any(__file__ in frame for frame in diff["top"][0]["frames"])
+        del kept
+
+    def test_snapshots_keep_the_baseline(self, tracer):
+        for _ in range(4):
+            tracer.take_snapshot()
+
+        assert [s["id"] for s in tracer.snapshots()] == [0, 3, 4]
+        assert "snapshot" not in tracer.snapshots()[0]
+
+    def test_diff_with_unknown_snapshot(self, tracer):
+        assert tracer.diff(since=99) is None
+        assert tracer.diff(until=99) is None
+        assert tracer.diff()["since"] == 0
+
+    def test_top_groups_by_file(self, tracer):
+        kept = allocate(3_000_000)
+
+        top = tracer.top(limit=5, group_by="filename")
+
+        assert len(top) <= 5
+        assert top[0]["size_bytes"] >= 3_000_000
+        assert top[0]["frames"][0].startswith(__file__)
+        del kept
+
+
+class TestMemoryEndpoints:
+    """Test the diagnostics endpoints and request tagging."""
+
+    def test_hidden_when_disabled(self, client, fresh_db):
+        assert client.get('/api/diagnostics/memory', headers=AUTH).status_code == 404
+
+    @pytest.mark.parametrize('headers', [{}, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}])
+    def test_requires_token(self, client, diagnostics, headers):
+        assert client.get('/api/diagnostics/memory', headers=headers).status_code == 401
+        assert client.post('/api/diagnostics/memory/snapshots', headers=headers).status_code == 401
+
+    def test_report_tags_requests_with_routes(self, client, diagnostics):
+        client.post('/api/names', json={'name': 'Alice'})
+        client.get('/api/names')
+        client.delete('/api/names/12345')
+
+        data = client.get('/api/diagnostics/memory', headers=AUTH).get_json()
+
+        assert data['tracing'] is True
+        assert data['pid'] == os.getpid()
+        assert set(data['routes']) == {
+            'POST /api/names', 'GET /api/names', 'DELETE /api/names/<int:name_id>'
+        }
+        assert len(data['largest_requests']) == 3
+        assert 0 < len(data['top']) <= 20
+
+    def test_rejects_bad_parameters(self, client, diagnostics):
+        assert client.get('/api/diagnostics/memory?group_by=module', headers=AUTH).status_code == 400
+        assert client.get('/api/diagnostics/memory?limit=0', headers=AUTH).status_code == 400
+        assert client.get('/api/diagnostics/memory/diff?since=x', headers=AUTH).status_code == 400
+
+    def test_snapshot_and_diff(self, client, diagnostics):
+        taken = client.post('/api/diagnostics/memory/snapshots', headers=AUTH)
+        assert taken.status_code == 201
+        snapshot_id = taken.get_json()['id']
+
+        listed = client.get('/api/diagnostics/memory/snapshots', headers=AUTH).get_json()['snapshots']
+        assert [s['id'] for s in listed] == [0, snapshot_id]
+
+        diff = client.get(f'/api/diagnostics/memory/diff?since={snapshot_id}&limit=5', headers=AUTH)
+        assert diff.status_code == 200
+        assert diff.get_json()['since'] == snapshot_id
+        assert len(diff.get_json()['top']) <= 5
+
+        missing = client.get('/api/diagnostics/memory/diff?since=99', headers=AUTH)
+        assert missing.status_code == 404
+
+    def test_warns_about_large_requests(self, client, diagnostics, monkeypatch, caplog):
+        monkeypatch.setattr(main, 'MEMORY_WARN_PEAK_MB', 0.000001)
+
+        client.get('/api/names')
+
+        assert any('GET /api/names - Request peaked at' in r.message for r in caplog.records)
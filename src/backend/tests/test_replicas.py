@@ -0,0 +1,107 @@
+"""
+Tests for read-replica routing.
+
+SQLite files stand in for the primary and replica databases so routing and
+fallback can be checked without a Postgres cluster.
+"""
+import pytest
+import os
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+from sqlalchemy import create_engine, text
+
+import main
+from replicas import ReadRouter, WRITE_POSITION_COOKIE
+
+
+def _engine_with_marker(path, marker):
+    """Create a SQLite engine whose database identifies itself."""
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE whoami (label TEXT)"))
+        conn.execute(text("INSERT INTO whoami VALUES (:label)"), {"label": marker})
+    return engine
+
+
+def _whoami(conn):
+    return conn.execute(text("SELECT label FROM whoami")).scalar()
+
+
+@pytest.fixture
+def primary(tmp_path):
+    return _engine_with_marker(tmp_path / "primary.db", "primary")
+
+
+@pytest.fixture
+def replica(tmp_path):
+    return _engine_with_marker(tmp_path / "replica.db", "replica")
+
+
+@pytest.fixture
+def broken_replica(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db", future=True)
+
+
+class TestReadRouter:
+    """Test replica selection and fallback."""
+
+    def test_without_replicas_reads_use_primary(self, primary):
+        router = ReadRouter(primary)
+        assert router.enabled is False
+        assert router.execute(_whoami) == "primary"
+
+    def test_reads_use_replica(self, primary, replica):
+        router = ReadRouter(primary, [replica])
+        assert router.execute(_whoami) == "replica"
+
+    def test_unreachable_replica_falls_back_to_primary(self, primary, broken_replica):
+        router = ReadRouter(primary, [broken_replica])
+        assert router.execute(_whoami) == "primary"
+
+    def test_unreachable_replica_is_skipped_until_retry(self, primary, replica, broken_replica):
+        router = ReadRouter(primary, [broken_replica, replica], retry_seconds=60)
+        labels = {router.execute(_whoami) for _ in range(4)}
+        assert labels == {"replica"}
+        assert id(broken_replica) in router._down_until
+
+    def test_recent_writer_reads_from_primary(self, primary, replica):
+        router = ReadRouter(primary, [replica])
+        # SQLite replicas cannot prove they replayed a write
+        assert router.execute(_whoami, min_position="primary") == "primary"
+        assert router.execute(_whoami, min_position="0/16B3748") == "primary"
+
+    def test_write_position_is_none_without_wal(self, primary):
+        router = ReadRouter(primary)
+        with primary.connect() as conn:
+            assert router.write_position(conn) is None
+
+
+class TestReadYourWritesCookie:
+    """Test the write position cookie set by write endpoints."""
+
+    @pytest.fixture
+    def fresh_db(self):
+        main.metadata.create_all(main.engine)
+        yield
+        main.metadata.drop_all(main.engine)
+
+    def test_no_cookie_without_replicas(self, client, fresh_db):
+        response = client.post('/api/names', json={'name': 'John Doe'})
+        assert response.status_code == 201
+        assert WRITE_POSITION_COOKIE not in response.headers.get('Set-Cookie', '')
+
+    def test_write_sets_cookie_with_replicas(self, client, fresh_db, broken_replica, monkeypatch):
+        monkeypatch.setattr(main, 'read_router', ReadRouter(main.engine, [broken_replica]))
+
+        response = client.post('/api/names', json={'name': 'John Doe'})
+        assert response.status_code == 201
+        cookie = response.headers.get('Set-Cookie', '')
+        assert f'{WRITE_POSITION_COOKIE}=primary' in cookie
+        assert f'Max-Age={main.READ_YOUR_WRITES_SECONDS}' in cookie
+
+        # The list is still served (from the primary) while the replica is down
+        response = client.get('/api/names')
+        assert response.status_code == 200
+        assert [n['name'] for n in response.get_json()['names']] == ['John Doe']
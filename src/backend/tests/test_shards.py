@@ -0,0 +1,272 @@
+"""
+Tests for snowflake ids, shard routing and the sharded names API.
+"""
+import pytest
+import gzip
+import json
+import os
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+import shards
+from main import engine, metadata, table
+from shards import MAX_SHARDS, ShardRouter, SnowflakeIds, compose_id, shard_of
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def shard_engines(tmp_path):
+    # File databases, because scatter queries run on other threads
+    engines = [create_engine(f"sqlite:///{tmp_path}/shard{i}.db", future=True) for i in range(3)]
+    for shard_engine in engines:
+        metadata.create_all(shard_engine, tables=[table])
+    yield engines
+    for shard_engine in engines:
+        shard_engine.dispose()
+
+
+@pytest.fixture
+def sharded(fresh_db, shard_engines, monkeypatch):
+    """Run the API in sharded mode over three SQLite files."""
+    router = ShardRouter(shard_engines)
+    monkeypatch.setattr(main, 'shard_router', router)
+    monkeypatch.setattr(main, 'name_snapshot', None)
+    monkeypatch.setattr(main, 'name_index', None)
+    return router
+
+
+def shard_rows(shard_engine):
+    with shard_engine.connect() as conn:
+        return conn.execute(select(table.c.id, table.c.name).order_by(table.c.id)).fetchall()
+
+
+class FakeClock:
+    def __init__(self, now=1760000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSnowflakeIds:
+    """Test id layout and generation."""
+
+    def test_ids_are_unique_and_increasing(self):
+        router = ShardRouter([engine])
+        ids = [router.place()[0] for _ in range(2000)]
+
+        assert len(set(ids)) == len(ids)
+        assert ids[-1] > ids[0]
+        assert max(ids) < 2 ** 53
+
+    def test_shard_round_trip(self):
+        for shard in range(MAX_SHARDS):
+            assert shard_of(compose_id(shards.EPOCH_MS + 123456, shard, 255)) == shard
+
+    def test_sequence_exhaustion_waits_for_next_millisecond(self, monkeypatch):
+        clock = FakeClock()
+        ids = SnowflakeIds(clock)
+        monkeypatch.setattr(shards.time, 'sleep', lambda seconds: setattr(clock, 'now', clock.now + 0.001))
+
+        pairs = [ids.next() for _ in range(300)]
+
+        assert len(set(pairs)) == 300
+        assert {ms for ms, _ in pairs} == {int(1760000000.0 * 1000), int(1760000000.0 * 1000) + 1}
+
+    def test_clock_moving_back_keeps_ids_unique(self):
+        clock = FakeClock()
+        ids = SnowflakeIds(clock)
+        first = ids.next()
+        clock.now -= 5
+
+        assert ids.next() != first
+        assert ids.next()[0] == first[0]
+
+
+class TestShardRouter:
+    """Test placement, retries and scatter-gather."""
+
+    def test_placement_by_name_is_stable(self, shard_engines):
+        router = ShardRouter(shard_engines)
+        placed = {router.place("alice")[1] for _ in range(20)}
+
+        assert len(placed) == 1
+        name_id, shard = router.place("alice")
+        assert shard_of(name_id) == shard
+
+    def test_placement_by_id_spreads_rows(self, shard_engines):
+        router = ShardRouter(shard_engines)
+        counts = [0] * 3
+        for _ in range(600):
+            counts[router.place()[1]] += 1
+
+        assert min(counts) > 100
+
+    def test_unknown_shards_have_no_engine(self, shard_engines):
+        router = ShardRouter(shard_engines)
+
+        assert router.engine_for_id(compose_id(shards.EPOCH_MS + 1, 5, 0)) is None
+        assert router.engine_for_id(0) is None
+        assert router.engine_for_id(compose_id(shards.EPOCH_MS + 1, 2, 0)) is shard_engines[2]
+
+    def test_rejects_too_many_shards(self):
+        with pytest.raises(ValueError):
+            ShardRouter([engine] * (MAX_SHARDS + 1))
+
+    def test_insert_retries_colliding_id(self, shard_engines):
+        router = ShardRouter(shard_engines)
+        taken, shard = router.place()
+        with shard_engines[shard].begin() as conn:
+            conn.execute(table.insert().values(id=taken, name="First"))
+        ids = iter([taken])
+        router.place = lambda name_key=None: (next(ids), shard)
+
+        new_id = router.insert(lambda conn, name_id: main.insert_name(conn, "Second", name_id))
+
+        assert new_id != taken
+        assert shard_of(new_id) == shard
+        assert [r.name for r in shard_rows(shard_engines[shard])] == ["First", "Second"]
+
+    def test_insert_gives_up_after_attempts(self, shard_engines):
+        router = ShardRouter(shard_engines, attempts=2)
+        taken, shard = router.place()
+        with shard_engines[shard].begin() as conn:
+            conn.execute(table.insert().values(id=taken, name="First"))
+        router.place = lambda name_key=None: (taken, shard)
+        router.new_id = lambda shard: taken
+
+        with pytest.raises(IntegrityError):
+            router.insert(lambda conn, name_id: main.insert_name(conn, "Second", name_id))
+
+    def test_merge_keeps_global_order(self, shard_engines):
+        router = ShardRouter(shard_engines)
+        for i, shard_engine in enumerate(shard_engines):
+            with shard_engine.begin() as conn:
+                for name_id in range(i + 1, 30, 3):
+                    conn.execute(table.insert().values(id=name_id, name=f"n{name_id}"))
+
+        rows = router.merge(
+            lambda conn: conn.execute(select(table.c.id).order_by(table.c.id.desc()).limit(10)).fetchall(),
+            key=lambda r: r.id,
+            descending=True,
+            limit=10,
+        )
+
+        assert [r.id for r in rows] == list(range(29, 19, -1))
+
+    def test_stream_batches(self, shard_engines):
+        router = ShardRouter(shard_engines)
+        router.insert_many(
+            [f"Name {i}" for i in range(25)],
+            lambda conn, rows: conn.execute(table.insert(), [{"id": i, "name": n} for i, n in rows])
+        )
+
+        batches = list(router.stream(select(table.c.id).order_by(table.c.id), lambda r: r.id, 10))
+
+        assert [len(b) for b in batches] == [10, 10, 5]
+        ids = [r.id for b in batches for r in b]
+        assert ids == sorted(ids)
+
+
+class TestShardedApi:
+    """Test the names endpoints in sharded mode."""
+
+    def add(self, client, *names):
+        return [client.post('/api/names', json={'name': n}).get_json()['id'] for n in names]
+
+    def test_names_land_on_the_shard_in_their_id(self, client, sharded, shard_engines):
+        ids = self.add(client, *[f"Person {i}" for i in range(30)])
+
+        for shard, shard_engine in enumerate(shard_engines):
+            assert all(shard_of(r.id) == shard for r in shard_rows(shard_engine))
+        assert sum(len(shard_rows(e)) for e in shard_engines) == 30
+        assert all(len(shard_rows(e)) > 0 for e in shard_engines)
+        with engine.connect() as conn:
+            assert conn.execute(select(table.c.id)).fetchall() == []
+        assert len(set(ids)) == 30
+
+    @pytest.mark.parametrize('sort', ['id', '-id', 'name', '-name', 'created_at', '-created_at'])
+    def test_cursor_pages_cover_every_name_in_order(self, client, sharded, sort):
+        self.add(client, *[f"Person {i % 7}" for i in range(20)])
+        expected = client.get(f'/api/names?sort={sort}').get_json()['names']
+
+        seen, cursor = [], None
+        while True:
+            url = f'/api/names?sort={sort}&limit=3' + (f'&cursor={cursor}' if cursor else '')
+            data = client.get(url).get_json()
+            seen.extend(data['names'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        assert seen == expected
+        assert len(seen) == 20
+        key = sort.lstrip('-')
+        values = [(n[key], n['id']) if key != 'id' else n['id'] for n in seen]
+        assert values == sorted(values, reverse=sort.startswith('-'))
+
+    def test_delete_routes_by_id(self, client, sharded):
+        ids = self.add(client, "Alice", "Bob")
+
+        assert client.delete(f'/api/names/{ids[0]}').status_code == 200
+        assert [n['name'] for n in client.get('/api/names').get_json()['names']] == ["Bob"]
+        assert client.delete(f'/api/names/{ids[0]}').status_code == 404
+        assert client.delete(f'/api/names/{compose_id(shards.EPOCH_MS + 1, 9, 0)}').status_code == 404
+
+    def test_dedup_places_names_by_key(self, client, sharded, monkeypatch):
+        monkeypatch.setattr(main, 'DEDUP_NAMES', True)
+
+        first = client.post('/api/names', json={'name': 'Mary Ann'})
+        again = client.post('/api/names', json={'name': 'mary  ann'})
+
+        assert first.status_code == 201
+        assert again.status_code == 200
+        assert again.get_json()['id'] == first.get_json()['id']
+        assert again.get_json()['occurrences'] == 2
+
+    def test_export_merges_shards(self, client, sharded, monkeypatch):
+        monkeypatch.setattr(main, 'EXPORT_BATCH_SIZE', 4)
+        ids = self.add(client, *[f"Person {i}" for i in range(10)])
+
+        lines = client.get('/api/names/export').get_data(as_text=True).splitlines()
+
+        assert [json.loads(line)['id'] for line in lines] == sorted(ids)
+
+    def test_health_checks_every_shard(self, client, sharded):
+        data = client.get('/api/health/db').get_json()
+
+        assert data['status'] == 'healthy'
+        assert data['shards'] == 3
+
+    def test_jobs_work_across_shards(self, client, sharded, monkeypatch):
+        monkeypatch.setattr(main.job_runner, 'batch_size', 4)
+
+        def run(kind, **params):
+            job_id = client.post('/api/jobs', json={'kind': kind, 'params': params}).get_json()['id']
+            main.job_runner.run_once()
+            return client.get(f'/api/jobs/{job_id}').get_json()
+
+        job = run('import', names=[f"Person {i}" for i in range(10)] + [''])
+        assert job['result'] == {'imported': 10, 'rejected': 1}
+
+        ids = sorted(n['id'] for n in client.get('/api/names').get_json()['names'])
+        assert len(ids) == 10
+        job = run('delete_range', min_id=ids[2], max_id=ids[5])
+        assert job['result'] == {'deleted': 4}
+
+        job = run('export')
+        assert job['result']['exported'] == 6
+        output = gzip.decompress(client.get(job['result']['output']).get_data()).decode()
+        assert [json.loads(line)['id'] for line in output.splitlines()] == ids[:2] + ids[6:]
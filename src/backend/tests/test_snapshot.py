@@ -0,0 +1,364 @@
+"""
+Tests for the in-worker columnar names snapshot.
+"""
+import pytest
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata, table, tombstones
+from snapshot import NamesSnapshot, SharedNamesSnapshot, record_deletion, request_reload
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def snap(fresh_db):
+    return NamesSnapshot(table, tombstones, refresh_seconds=0, overlap_ids=10)
+
+
+def insert(*names, **values):
+    with engine.connect() as conn:
+        for name in names:
+            conn.execute(table.insert().values(name=name, **values))
+        conn.commit()
+
+
+def remove(name_id):
+    with engine.connect() as conn:
+        conn.execute(table.delete().where(table.c.id == name_id))
+        record_deletion(conn, tombstones, [name_id], retention_seconds=3600)
+        conn.commit()
+
+
+def refresh(snap):
+    with engine.connect() as conn:
+        snap.refresh(conn)
+
+
+class TestNamesSnapshot:
+    """Test loading, incremental refresh and paging."""
+
+    def test_initial_load(self, snap):
+        insert("Alice", "Bob")
+        refresh(snap)
+
+        rows = snap.page()
+        assert [r.name for r in rows] == ["Alice", "Bob"]
+        assert rows[0].id < rows[1].id
+
+    def test_timestamps_round_trip(self, snap):
+        created = datetime(2025, 10, 11, 7, 45, 17, 933580)
+        insert("Alice", created_at=created)
+        refresh(snap)
+
+        assert snap.page()[0].created_at == created
+
+    def test_unicode_names(self, snap):
+        insert("Zoë", "李雷", "Bob")
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Zoë", "李雷", "Bob"]
+
+    def test_refresh_picks_up_new_rows(self, snap):
+        insert("Alice")
+        refresh(snap)
+        insert("Bob")
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Alice", "Bob"]
+
+    def test_refresh_applies_tombstones(self, snap):
+        insert("Alice", "Bob", "Carol")
+        refresh(snap)
+        bob = snap.page()[1]
+        remove(bob.id)
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Alice", "Carol"]
+        assert snap.stats()["rows"] == 2
+
+    def test_tombstones_hold_snowflake_ids(self, snap):
+        with engine.connect() as conn:
+            conn.execute(table.insert().values(id=2**40, name="Sharded"))
+            conn.commit()
+        insert("Alice")
+        refresh(snap)
+        remove(2**40)
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Alice"]
+        assert tombstones.c.name_id.type.compile(dialect=postgresql.dialect()) == "BIGINT"
+
+    def test_out_of_order_commit_is_merged(self, snap):
+        insert("Alice")
+        with engine.connect() as conn:
+            conn.execute(table.insert().values(id=10, name="Late"))
+            conn.commit()
+        refresh(snap)
+        # A lower id committing after a higher one was already seen
+        with engine.connect() as conn:
+            conn.execute(table.insert().values(id=5, name="Slow"))
+            conn.commit()
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Alice", "Slow", "Late"]
+
+    def test_out_of_order_tombstones_are_applied(self, snap):
+        insert("Alice", "Bob", "Carol")
+        refresh(snap)
+        alice, bob, carol = snap.page()
+        # Two concurrent deletes: seq 2 commits before seq 1
+        with engine.connect() as conn:
+            conn.execute(table.delete().where(table.c.id == carol.id))
+            conn.execute(tombstones.insert().values(seq=2, name_id=carol.id))
+            conn.commit()
+        refresh(snap)
+        with engine.connect() as conn:
+            conn.execute(table.delete().where(table.c.id == alice.id))
+            conn.execute(tombstones.insert().values(seq=1, name_id=alice.id))
+            conn.commit()
+        refresh(snap)
+
+        assert [r.name for r in snap.page()] == ["Bob"]
+
+    def test_reload_marker_is_replayed_once(self, snap, monkeypatch):
+        insert("Alice")
+        refresh(snap)
+        with engine.connect() as conn:
+            request_reload(conn, tombstones)
+            conn.commit()
+        refresh(snap)
+        loads = []
+        monkeypatch.setattr(snap, '_load', lambda conn: loads.append(conn))
+        refresh(snap)
+
+        assert loads == []
+
+    def test_compaction_drops_deleted_rows(self, snap):
+        insert("Alice", "Bob", "Carol", "Dave")
+        refresh(snap)
+        for row in snap.page()[:2]:
+            remove(row.id)
+        refresh(snap)
+
+        stats = snap.stats()
+        assert stats["rows"] == 2
+        assert stats["deleted_rows_pending_compaction"] == 0
+        assert [r.name for r in snap.page()] == ["Carol", "Dave"]
+
+    def test_keyset_paging(self, snap):
+        insert("A", "B", "C", "D")
+        refresh(snap)
+        first = snap.page(limit=2)
+        second = snap.page(after_id=first[-1].id, limit=2)
+
+        assert [r.name for r in first] == ["A", "B"]
+        assert [r.name for r in second] == ["C", "D"]
+
+    def test_memory_per_row_is_small(self, snap):
+        insert(*[f"Person {i}" for i in range(2000)])
+        refresh(snap)
+
+        stats = snap.stats()
+        assert stats["rows"] == 2000
+        # 3 x 8-byte columns + 4-byte offset + flag + ~10 bytes of name
+        assert stats["bytes_per_row"] < 48
+
+    def test_ensure_fresh_skips_recent_snapshot(self, fresh_db):
+        snap = NamesSnapshot(table, tombstones, refresh_seconds=60)
+        calls = []
+
+        def execute(work):
+            calls.append(work)
+            with engine.connect() as conn:
+                return work(conn)
+
+        snap.ensure_fresh(execute)
+        snap.ensure_fresh(execute)
+        assert len(calls) == 1
+
+        snap.ensure_fresh(execute, force=True)
+        assert len(calls) == 2
+
+
+class TestSharedNamesSnapshot:
+    """Test publishing the snapshot to a mapped file shared by workers."""
+
+    @pytest.fixture
+    def file_engine(self, tmp_path):
+        # A file database, so refresher threads see the same data
+        db = create_engine(f"sqlite:///{tmp_path / 'names.db'}", future=True)
+        metadata.create_all(db)
+        yield db
+        db.dispose()
+
+    def make(self, file_engine, directory):
+        def execute(work):
+            with file_engine.connect() as conn:
+                return work(conn)
+
+        snap = NamesSnapshot(table, tombstones, refresh_seconds=0.05)
+        return SharedNamesSnapshot(snap, str(directory), execute)
+
+    def add(self, file_engine, *names):
+        with file_engine.connect() as conn:
+            for name in names:
+                conn.execute(table.insert().values(name=name))
+            conn.commit()
+
+    def test_readers_see_published_rows(self, file_engine, tmp_path):
+        writer = self.make(file_engine, tmp_path / "shm")
+        reader = self.make(file_engine, tmp_path / "shm")
+        self.add(file_engine, "Alice", "Zoë")
+        writer.refresh_once()
+
+        assert [r.name for r in reader.page()] == ["Alice", "Zoë"]
+        first_version = reader.stats()["version"]
+
+        self.add(file_engine, "Bob")
+        writer.refresh_once()
+
+        assert [r.name for r in reader.page()] == ["Alice", "Zoë", "Bob"]
+        assert reader.stats()["version"] > first_version
+
+    def test_paging_and_deletes(self, file_engine, tmp_path):
+        shared = self.make(file_engine, tmp_path)
+        self.add(file_engine, "A", "B", "C")
+        shared.refresh_once()
+        b = shared.page()[1]
+        with file_engine.connect() as conn:
+            conn.execute(table.delete().where(table.c.id == b.id))
+            record_deletion(conn, tombstones, [b.id], retention_seconds=3600)
+            conn.commit()
+        shared.refresh_once()
+
+        assert [r.name for r in shared.page()] == ["A", "C"]
+        assert [r.name for r in shared.page(after_id=b.id, limit=1)] == ["C"]
+
+    def test_unchanged_rows_are_not_republished(self, file_engine, tmp_path):
+        shared = self.make(file_engine, tmp_path)
+        self.add(file_engine, "Alice")
+        shared.refresh_once()
+        inode = os.stat(shared.path).st_ino
+        shared.refresh_once()
+
+        assert os.stat(shared.path).st_ino == inode
+
+    def test_reads_fall_back_until_published(self, file_engine, tmp_path, monkeypatch):
+        shared = self.make(file_engine, tmp_path)
+        monkeypatch.setattr(shared, "start", lambda: None)
+
+        assert shared.ensure_fresh(None) is False
+        shared.refresh_once()
+        assert shared.ensure_fresh(None) is True
+        # Read-your-writes goes to the database
+        assert shared.ensure_fresh(None, force=True) is False
+
+    def test_stale_publish_is_not_served(self, file_engine, tmp_path, monkeypatch):
+        shared = self.make(file_engine, tmp_path)
+        monkeypatch.setattr(shared, "start", lambda: None)
+        shared.refresh_once()
+        # Left behind by an earlier container, or the writer keeps failing
+        old = time.time() - 60
+        os.utime(shared.path, (old, old))
+
+        assert shared.ensure_fresh(None) is False
+        assert shared.stats()["stale"] is True
+
+        def failing(work):
+            raise RuntimeError("database is down")
+
+        monkeypatch.setattr(shared, "execute", failing)
+        with pytest.raises(RuntimeError):
+            shared.refresh_once()
+        assert shared.ensure_fresh(None) is False
+
+    def test_unchanged_refresh_keeps_publish_fresh(self, file_engine, tmp_path, monkeypatch):
+        shared = self.make(file_engine, tmp_path)
+        monkeypatch.setattr(shared, "start", lambda: None)
+        shared.refresh_once()
+        old = time.time() - 60
+        os.utime(shared.path, (old, old))
+
+        shared.refresh_once()
+
+        assert shared.ensure_fresh(None) is True
+        assert shared.stats()["stale"] is False
+
+    def test_single_writer_per_directory(self, file_engine, tmp_path):
+        self.add(file_engine, "Alice")
+        workers = [self.make(file_engine, tmp_path) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+
+        deadline = time.monotonic() + 5
+        while not os.path.exists(workers[0].path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert sum(worker.is_writer for worker in workers) == 1
+        assert [r.name for r in workers[0].page()] == ["Alice"]
+
+
+class TestSnapshotEndpoints:
+    """Test GET /api/names served from the snapshot."""
+
+    @pytest.fixture
+    def enabled(self, monkeypatch, fresh_db):
+        snap = NamesSnapshot(table, tombstones, refresh_seconds=60)
+        monkeypatch.setattr(main, 'name_snapshot', snap)
+        return snap
+
+    def test_list_served_from_snapshot(self, client, enabled):
+        client.post('/api/names', json={'name': 'Alice'})
+        response = client.get('/api/names')
+
+        assert response.status_code == 200
+        assert [n['name'] for n in response.get_json()['names']] == ['Alice']
+        assert enabled.loaded
+
+    def test_writer_sees_own_writes(self, client, enabled):
+        client.post('/api/names', json={'name': 'Alice'})
+        client.get('/api/names')
+        created = client.post('/api/names', json={'name': 'Bob'})
+
+        assert created.headers.get('Set-Cookie', '').startswith('nm_lsn=')
+        names = [n['name'] for n in client.get('/api/names').get_json()['names']]
+        assert names == ['Alice', 'Bob']
+
+        client.delete(f"/api/names/{created.get_json()['id']}")
+        names = [n['name'] for n in client.get('/api/names').get_json()['names']]
+        assert names == ['Alice']
+
+    def test_pagination_from_snapshot(self, client, enabled):
+        for name in ['A', 'B', 'C']:
+            client.post('/api/names', json={'name': name})
+        data = client.get('/api/names?limit=2').get_json()
+
+        assert [n['name'] for n in data['names']] == ['A', 'B']
+        assert data['next_after_id'] == data['names'][-1]['id']
+
+    def test_stats_endpoint(self, client, enabled):
+        client.post('/api/names', json={'name': 'Alice'})
+        client.get('/api/names')
+        data = client.get('/api/health/snapshot').get_json()
+
+        assert data['enabled'] is True
+        assert data['rows'] == 1
+        assert data['bytes_per_row'] > 0
+
+    def test_stats_endpoint_disabled(self, client, fresh_db):
+        assert client.get('/api/health/snapshot').get_json() == {'enabled': False}
@@ -0,0 +1,157 @@
+"""
+Tests for the embedded SQLite (WAL) storage mode.
+"""
+import pytest
+import os
+import threading
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+import sqlite_store
+from main import metadata, table
+from sqlalchemy import create_engine, event, exc, func, select, text
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'names.db'}", future=True)
+    sqlite_store.install_pragmas(db, mmap_size=1024 * 1024, busy_timeout_ms=2000, cache_kib=1024)
+    metadata.create_all(db)
+    yield db
+    db.dispose()
+
+
+def count_names(db):
+    with db.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+class TestIsFileUrl:
+    def test_file_urls(self):
+        assert sqlite_store.is_file_url("sqlite:////data/names.db")
+        assert sqlite_store.is_file_url("sqlite:///names.db")
+
+    def test_memory_and_other_urls(self):
+        assert not sqlite_store.is_file_url("sqlite:///:memory:")
+        assert not sqlite_store.is_file_url("sqlite://")
+        assert not sqlite_store.is_file_url("postgresql+psycopg2://u:p@db/namesdb")
+
+
+class TestPragmas:
+    def test_connections_use_wal(self, file_engine):
+        with file_engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            # NORMAL
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 2000
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() == 1024 * 1024
+
+
+class TestWriteBatcher:
+    """Test grouping concurrent writes into shared transactions."""
+
+    def insert(self, name):
+        return lambda conn: main.insert_name(conn, name)
+
+    def test_concurrent_inserts(self, file_engine):
+        batcher = sqlite_store.WriteBatcher(file_engine, max_batch=16, max_wait_ms=20)
+        commits = []
+        event.listen(file_engine, "commit", lambda conn: commits.append(1))
+        ids = []
+
+        def worker(i):
+            ids.append(batcher.submit(self.insert(f"Name {i}")))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(40)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(ids)) == 40
+        assert count_names(file_engine) == 40
+        assert len(commits) < 40
+
+    def test_failed_write_does_not_fail_batch(self, file_engine):
+        batcher = sqlite_store.WriteBatcher(file_engine, max_batch=8, max_wait_ms=50)
+        results = {}
+
+        def bad(conn):
+            raise ValueError("bad write")
+
+        def worker(key, work):
+            try:
+                results[key] = batcher.submit(work)
+            except ValueError as e:
+                results[key] = e
+
+        threads = [threading.Thread(target=worker, args=(i, self.insert(f"Name {i}"))) for i in range(4)]
+        threads.append(threading.Thread(target=worker, args=("bad", bad)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert isinstance(results.pop("bad"), ValueError)
+        assert all(isinstance(value, int) for value in results.values())
+        assert count_names(file_engine) == 4
+
+    def test_queued_write_gives_up_at_timeout(self, file_engine):
+        batcher = sqlite_store.WriteBatcher(file_engine, max_batch=1, max_wait_ms=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow(conn):
+            started.set()
+            release.wait(5)
+            return main.insert_name(conn, "Slow")
+
+        slow_thread = threading.Thread(target=batcher.submit, args=(slow,))
+        slow_thread.start()
+        started.wait(5)
+
+        with pytest.raises(exc.TimeoutError):
+            batcher.submit(self.insert("Queued"), timeout=0.05)
+        release.set()
+        slow_thread.join()
+
+        assert batcher.submit(self.insert("Later"), timeout=5) > 0
+        with file_engine.connect() as conn:
+            assert conn.execute(select(table.c.name).order_by(table.c.id)).scalars().all() == ["Slow", "Later"]
+
+
+class TestBatchedApi:
+    """Test POST /api/names through the writer thread."""
+
+    def test_post_uses_batcher(self, client, file_engine, monkeypatch):
+        monkeypatch.setattr(main, 'write_batcher', sqlite_store.WriteBatcher(file_engine))
+
+        response = client.post('/api/names', json={'name': 'Alice'})
+
+        assert response.status_code == 201
+        assert response.get_json()['name'] == 'Alice'
+        assert count_names(file_engine) == 1
+
+    def test_post_answers_503_when_the_writer_is_busy(self, client, file_engine, monkeypatch):
+        batcher = sqlite_store.WriteBatcher(file_engine, max_batch=1, max_wait_ms=0)
+        monkeypatch.setattr(main, 'write_batcher', batcher)
+        monkeypatch.setattr(main, 'ROUTE_DEADLINES_MS', {'add_name': 50})
+        started, release = threading.Event(), threading.Event()
+
+        def blocking(conn):
+            started.set()
+            release.wait(5)
+
+        blocker = threading.Thread(target=batcher.submit, args=(blocking,))
+        blocker.start()
+        started.wait(5)
+        try:
+            response = client.post('/api/names', json={'name': 'Alice'})
+        finally:
+            release.set()
+            blocker.join()
+
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+        assert count_names(file_engine) == 0
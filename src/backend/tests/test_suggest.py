@@ -0,0 +1,215 @@
+"""
+Tests for the name suggestion prefix index and GET /api/names/suggest.
+"""
+import pytest
+import os
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from main import engine, metadata, table, tombstones, normalize_name
+from snapshot import record_deletion, request_reload
+from suggest import PrefixIndex
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def index(fresh_db):
+    return PrefixIndex(table, tombstones, normalize_name, refresh_seconds=0, overlap_ids=10)
+
+
+def insert(*names):
+    ids = []
+    with engine.connect() as conn:
+        for name in names:
+            ids.append(conn.execute(table.insert().values(name=name)).inserted_primary_key[0])
+        conn.commit()
+    return ids
+
+
+def remove(name_id):
+    with engine.connect() as conn:
+        conn.execute(table.delete().where(table.c.id == name_id))
+        record_deletion(conn, tombstones, [name_id], retention_seconds=3600)
+        conn.commit()
+
+
+def refresh(index):
+    with engine.connect() as conn:
+        index.refresh(conn)
+
+
+def names(index, prefix, limit=10):
+    return [s.name for s in index.suggest(prefix, limit)[0]]
+
+
+class TestPrefixIndex:
+    """Test loading, lookups and incremental updates."""
+
+    def test_prefix_lookup(self, index):
+        insert("Alice", "Alfred", "Bob", "alina")
+        refresh(index)
+
+        assert names(index, "al") == ["Alfred", "Alice", "alina"]
+        assert names(index, "bo") == ["Bob"]
+        assert names(index, "z") == []
+
+    def test_matching_ignores_case_and_spacing(self, index):
+        insert("Mary  Ann", "mary ann", "Mary Beth")
+        refresh(index)
+
+        suggestions, exists = index.suggest("MARY A")
+        assert [(s.name, s.count) for s in suggestions] == [("Mary  Ann", 2)]
+        assert exists is False
+        assert index.suggest("mary ann")[1] is True
+
+    def test_limit(self, index):
+        insert(*[f"Name {i:02d}" for i in range(20)])
+        refresh(index)
+
+        assert names(index, "name", limit=3) == ["Name 00", "Name 01", "Name 02"]
+
+    def test_local_add_and_discard(self, index):
+        refresh(index)
+        index.add(7, "Zoe")
+        index.add(7, "Zoe")
+        index.add(8, "zoe")
+
+        assert [(s.name, s.count) for s in index.suggest("zo")[0]] == [("Zoe", 2)]
+        index.discard(7)
+        assert index.suggest("zo")[0][0].count == 1
+        index.discard(8)
+        index.discard(8)
+        assert names(index, "zo") == []
+
+    def test_delta_sync_picks_up_rows_and_deletes(self, index):
+        alice, = insert("Alice")
+        refresh(index)
+        insert("Alan")
+        remove(alice)
+        refresh(index)
+
+        assert names(index, "al") == ["Alan"]
+        assert index.stats()["rows"] == 1
+
+    def test_delta_sync_ignores_rows_added_locally(self, index):
+        refresh(index)
+        new_id, = insert("Alice")
+        index.add(new_id, "Alice")
+        refresh(index)
+
+        assert index.suggest("alice")[0][0].count == 1
+
+    def test_out_of_order_tombstones_are_applied(self, index):
+        alice, carol = insert("Alice", "Carol")
+        refresh(index)
+        # Two concurrent deletes: seq 2 commits before seq 1
+        for seq, name_id in [(2, carol), (1, alice)]:
+            with engine.connect() as conn:
+                conn.execute(table.delete().where(table.c.id == name_id))
+                conn.execute(tombstones.insert().values(seq=seq, name_id=name_id))
+                conn.commit()
+            refresh(index)
+
+        assert index.stats()["rows"] == 0
+        assert names(index, "a") == []
+
+    def test_reload_marker_rebuilds(self, index):
+        insert("Alice")
+        refresh(index)
+        index.add(99, "Ghost")
+        with engine.connect() as conn:
+            request_reload(conn, tombstones)
+            conn.commit()
+        refresh(index)
+
+        assert names(index, "gh") == []
+        assert names(index, "al") == ["Alice"]
+
+    def test_ensure_fresh_skips_recent_index(self, fresh_db):
+        index = PrefixIndex(table, tombstones, normalize_name, refresh_seconds=60)
+        calls = []
+
+        def execute(work):
+            calls.append(work)
+            with engine.connect() as conn:
+                return work(conn)
+
+        index.ensure_fresh(execute)
+        index.ensure_fresh(execute)
+        assert len(calls) == 1
+        index.ensure_fresh(execute, force=True)
+        assert len(calls) == 2
+
+
+class TestSuggestEndpoint:
+    """Test GET /api/names/suggest."""
+
+    @pytest.fixture
+    def enabled(self, monkeypatch, fresh_db):
+        index = PrefixIndex(table, tombstones, normalize_name, refresh_seconds=60)
+        monkeypatch.setattr(main, 'name_index', index)
+        return index
+
+    def test_suggestions_follow_adds_and_deletes(self, client, enabled):
+        client.get('/api/names/suggest?prefix=a')
+        client.post('/api/names', json={'name': 'Alice'})
+        created = client.post('/api/names', json={'name': 'Alan'}).get_json()
+
+        data = client.get('/api/names/suggest?prefix=AL').get_json()
+        assert [s['name'] for s in data['suggestions']] == ['Alan', 'Alice']
+
+        client.delete(f"/api/names/{created['id']}")
+        data = client.get('/api/names/suggest?prefix=al').get_json()
+        assert [s['name'] for s in data['suggestions']] == ['Alice']
+
+    def test_exists_flag(self, client, enabled):
+        client.post('/api/names', json={'name': 'Alice'})
+
+        assert client.get('/api/names/suggest?prefix=alice').get_json()['exists'] is True
+        assert client.get('/api/names/suggest?prefix=ali').get_json()['exists'] is False
+
+    def test_prefix_is_sanitized_like_names(self, client, enabled):
+        client.post('/api/names', json={'name': "O'Brien"})
+
+        data = client.get("/api/names/suggest?prefix=o'b").get_json()
+        assert [s['name'] for s in data['suggestions']] == ["O&#x27;Brien"]
+
+    @pytest.mark.parametrize('query', ['', 'prefix=', 'prefix=%20%20', 'prefix=a&limit=0',
+                                       'prefix=a&limit=x', 'prefix=a&limit=1000', 'prefix=' + 'a' * 60])
+    def test_invalid_parameters(self, client, enabled, query):
+        response = client.get(f'/api/names/suggest?{query}')
+
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+    def test_warm_up_builds_the_index(self, enabled):
+        insert("Alice")
+        assert not enabled.loaded
+
+        main.warm_name_index()
+
+        assert enabled.loaded
+        assert names(enabled, "al") == ["Alice"]
+
+    def test_disabled(self, client, fresh_db, monkeypatch):
+        monkeypatch.setattr(main, 'name_index', None)
+
+        assert client.get('/api/names/suggest?prefix=a').status_code == 404
+        assert client.get('/api/health/suggest').get_json() == {'enabled': False}
+
+    def test_stats_endpoint(self, client, enabled):
+        client.post('/api/names', json={'name': 'Alice'})
+        client.get('/api/names/suggest?prefix=a')
+        data = client.get('/api/health/suggest').get_json()
+
+        assert data['enabled'] is True
+        assert data['distinct_names'] == 1
@@ -0,0 +1,142 @@
+"""
+Tests for per-client rate limiting and load shedding.
+"""
+import pytest
+import os
+
+# Use SQLite for testing
+os.environ['DB_URL'] = 'sqlite:///:memory:'
+
+import main
+from throttling import (
+    LoadShedder, LocalBucketStore, RateLimiter, client_key, parse_trusted_proxies, queue_time_ms, retry_after
+)
+
+
+@pytest.fixture
+def fresh_db():
+    """Create a fresh database for each test."""
+    main.metadata.create_all(main.engine)
+    yield
+    main.metadata.drop_all(main.engine)
+
+
+class TestLocalBucketStore:
+    """Test the in-process token bucket."""
+
+    def test_burst_then_wait(self):
+        store = LocalBucketStore()
+        assert [store.take('a', 1.0, 3, 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert store.take('a', 1.0, 3, 100.0) == pytest.approx(1.0)
+
+    def test_refills_over_time(self):
+        store = LocalBucketStore()
+        store.take('a', 2.0, 1, 100.0)
+        assert store.take('a', 2.0, 1, 100.2) == pytest.approx(0.3)
+        assert store.take('a', 2.0, 1, 101.0) == 0.0
+
+    def test_clients_are_independent(self):
+        store = LocalBucketStore()
+        store.take('a', 1.0, 1, 100.0)
+        assert store.take('a', 1.0, 1, 100.0) > 0
+        assert store.take('b', 1.0, 1, 100.0) == 0.0
+
+
+class TestLoadShedder:
+    """Test the overload checks."""
+
+    def test_in_flight_limit(self):
+        shedder = LoadShedder(max_in_flight=2)
+        shedder.enter()
+        assert shedder.overload_reason() is None
+        shedder.enter()
+        assert 'in flight' in shedder.overload_reason()
+        shedder.exit()
+        assert shedder.overload_reason() is None
+
+    def test_queue_time_limit(self):
+        shedder = LoadShedder(max_queue_ms=500)
+        assert shedder.overload_reason('t=1000.000', now=1000.2) is None
+        assert 'queued' in shedder.overload_reason('t=1000.000', now=1001.0)
+
+    def test_queue_time_parsing(self):
+        assert queue_time_ms('t=1000.250', 1000.5) == pytest.approx(250)
+        assert queue_time_ms('1000', 999) == 0.0
+        assert queue_time_ms('garbage', 1000) is None
+
+    def test_pool_exhaustion(self):
+        class FakePool:
+            def checkedout(self):
+                return 15
+
+        assert LoadShedder(pool=FakePool(), pool_capacity=16).overload_reason() is None
+        assert 'connections' in LoadShedder(pool=FakePool(), pool_capacity=15).overload_reason()
+
+    @pytest.mark.parametrize('peer, headers, expected', [
+        # Direct clients cannot pick their bucket with headers
+        ('203.0.113.5', {'X-Real-IP': '198.51.100.1', 'X-Forwarded-For': '198.51.100.2'}, 'ip:203.0.113.5'),
+        ('203.0.113.5', {'X-API-Key': 'random'}, 'ip:203.0.113.5'),
+        # Behind a trusted proxy, the last untrusted hop is the client
+        ('10.0.0.2', {'X-Forwarded-For': 'spoofed, 198.51.100.7, 10.0.0.9'}, 'ip:198.51.100.7'),
+        ('10.0.0.2', {'X-Real-IP': '198.51.100.8'}, 'ip:198.51.100.8'),
+        ('10.0.0.2', {}, 'ip:10.0.0.2'),
+    ])
+    def test_client_key(self, peer, headers, expected):
+        class FakeRequest:
+            remote_addr = peer
+
+        FakeRequest.headers = headers
+        assert client_key(FakeRequest(), parse_trusted_proxies('10.0.0.0/8, 192.168.1.1')) == expected
+
+    def test_retry_after_is_whole_seconds(self):
+        assert retry_after(0.2) == '1'
+        assert retry_after(2.1) == '3'
+
+
+class TestThrottlingMiddleware:
+    """Test the rate limiter and shedder wired into the app."""
+
+    def test_rate_limited_client_gets_429(self, client, fresh_db, monkeypatch):
+        monkeypatch.setattr(main, 'rate_limiter', RateLimiter(LocalBucketStore(), rate=0.5, burst=2))
+
+        assert client.get('/api/names').status_code == 200
+        assert client.get('/api/names').status_code == 200
+        response = client.get('/api/names')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '2'
+
+        # Another client has its own budget
+        response = client.get('/api/names', environ_base={'REMOTE_ADDR': '203.0.113.9'})
+        assert response.status_code == 200
+
+    def test_headers_do_not_escape_the_limit(self, client, fresh_db, monkeypatch):
+        monkeypatch.setattr(main, 'rate_limiter', RateLimiter(LocalBucketStore(), rate=1, burst=2))
+
+        statuses = [
+            client.get('/api/names', headers={'X-API-Key': f'key{i}', 'X-Real-IP': f'198.51.100.{i}',
+                                              'X-Forwarded-For': f'198.51.100.{i}'}).status_code
+            for i in range(20)
+        ]
+        assert statuses.count(200) <= 3
+        assert 429 in statuses
+
+    def test_health_checks_are_not_limited(self, client, monkeypatch):
+        monkeypatch.setattr(main, 'rate_limiter', RateLimiter(LocalBucketStore(), rate=0.1, burst=1))
+
+        for _ in range(3):
+            assert client.get('/healthz').status_code == 200
+
+    def test_overloaded_worker_sheds_with_503(self, client, fresh_db, monkeypatch):
+        monkeypatch.setattr(main, 'load_shedder', LoadShedder(max_queue_ms=100))
+
+        response = client.get('/api/names', headers={'X-Request-Start': 't=1.000'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_in_flight_count_released(self, client, fresh_db, monkeypatch):
+        shedder = LoadShedder(max_in_flight=1)
+        monkeypatch.setattr(main, 'load_shedder', shedder)
+
+        assert client.get('/api/names').status_code == 200
+        assert client.get('/api/names').status_code == 200
+        assert shedder.in_flight == 0
@@ -0,0 +1,268 @@
+"""
+Per-client rate limiting and load shedding for the Names Manager API.
+
+The rate limiter is a token bucket per client IP address. Bucket
+state lives in this process by default; a Redis store can be configured so all
+workers and replicas share one budget per client. The load shedder rejects work
+early with 503 when this worker is already saturated, instead of letting the
+request queue until the proxy gives up.
+"""
+import ipaddress
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Set by nginx as "t=<seconds since epoch with millisecond precision>"
+REQUEST_START_HEADER = "X-Request-Start"
+
+_PRUNE_EVERY = 1024
+
+
+class LocalBucketStore:
+    """In-process token buckets, shared by the threads of one worker."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """
+        Take one token from a client's bucket.
+
+        Args:
+            key (str): Client identifier
+            rate (float): Tokens added per second
+            burst (int): Bucket capacity
+            now (float): Current time in seconds
+
+        Returns:
+            float: 0 when the request is allowed, otherwise seconds until a
+            token becomes available
+        """
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+
+            self._calls += 1
+            if self._calls % _PRUNE_EVERY == 0:
+                self._prune(rate, burst, now)
+        return wait
+
+    def _prune(self, rate, burst, now):
+        # Buckets that would have refilled completely carry no state
+        full_after = burst / rate
+        idle = [k for k, (_, last) in self._buckets.items() if now - last >= full_after]
+        for k in idle:
+            del self._buckets[k]
+
+
+_REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local last = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets kept in Redis so every worker shares one budget per client.
+
+    Args:
+        client: redis.Redis client (anything exposing ``register_script``)
+        prefix (str): Key prefix for bucket hashes
+    """
+
+    def __init__(self, client, prefix="names:ratelimit:"):
+        self.prefix = prefix
+        self._take = client.register_script(_REDIS_TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis  # Optional dependency, only needed for the shared store
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, now]))
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter.
+
+    Args:
+        store: LocalBucketStore or RedisBucketStore
+        rate (float): Sustained requests per second per client; 0 disables
+        burst (int): Requests a client may make at once
+    """
+
+    def __init__(self, store, rate: float, burst: int):
+        self.store = store
+        self.rate = rate
+        self.burst = max(1, burst)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str) -> float:
+        """Return 0 if the request may proceed, else seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        try:
+            return self.store.take(key, self.rate, self.burst, time.time())
+        except Exception as e:
+            # A broken shared store must not take the API down with it
+            logger.error(f"Rate limit store failed, allowing request: {str(e)}")
+            return 0.0
+
+
+class LoadShedder:
+    """
+    Reject requests while this worker is saturated.
+
+    Args:
+        max_in_flight (int): Concurrent requests per worker; 0 disables
+        max_queue_ms (float): Longest acceptable wait between the proxy
+            receiving the request and this worker starting it; 0 disables
+        pool: SQLAlchemy pool to watch, or None
+        pool_capacity (int): Connections the pool can hand out before callers
+            have to wait (pool_size + max_overflow); 0 disables
+        engine: Engine whose current pool is watched instead of ``pool``.
+            ``engine.dispose()`` (e.g. after a fork) replaces the pool, so it
+            is looked up on every check
+    """
+
+    def __init__(self, max_in_flight=0, max_queue_ms=0, pool=None, pool_capacity=0, engine=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue_ms = max_queue_ms
+        self.pool = pool
+        self.engine = engine
+        self.pool_capacity = pool_capacity
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def overload_reason(self, request_start=None, now=None):
+        """
+        Check whether a new request should be shed.
+
+        Args:
+            request_start (str): Value of the X-Request-Start header, if any
+            now (float): Current time in seconds (defaults to time.time())
+
+        Returns:
+            str or None: Why the request should be rejected, or None to admit it
+        """
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return f"{self.in_flight} requests in flight"
+
+        if self.max_queue_ms and request_start:
+            queued_ms = queue_time_ms(request_start, time.time() if now is None else now)
+            if queued_ms is not None and queued_ms > self.max_queue_ms:
+                return f"request queued for {queued_ms:.0f}ms"
+
+        pool = self.engine.pool if self.engine is not None else self.pool
+        if self.pool_capacity and hasattr(pool, "checkedout"):
+            checked_out = pool.checkedout()
+            if checked_out >= self.pool_capacity:
+                return f"all {checked_out} database connections in use"
+
+        return None
+
+
+def queue_time_ms(header_value: str, now: float):
+    """
+    Parse an X-Request-Start header into milliseconds spent queueing.
+
+    Args:
+        header_value (str): "t=1697040000.123" (seconds) as set by nginx
+        now (float): Current time in seconds
+
+    Returns:
+        float or None: Milliseconds since the proxy received the request
+    """
+    value = header_value.strip()
+    if value.startswith("t="):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    return max(0.0, (now - started) * 1000)
+
+
+def parse_trusted_proxies(value: str):
+    """
+    Parse a comma-separated list of proxy addresses or CIDR ranges.
+
+    Raises:
+        ValueError: If an entry is not an address or network
+    """
+    return [
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in value.split(",") if entry.strip()
+    ]
+
+
+def _is_trusted(address: str, trusted_proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_key(request, trusted_proxies=()) -> str:
+    """
+    Identify the client a request is charged to.
+
+    Requests are limited per peer address. Forwarding headers are client
+    supplied, so they are only believed when the peer is one of
+    ``trusted_proxies``: then the client is the last X-Forwarded-For hop that
+    is not itself a trusted proxy, or nginx's X-Real-IP without that header.
+    """
+    ip = request.remote_addr or "unknown"
+    if trusted_proxies and _is_trusted(ip, trusted_proxies):
+        hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            ip = hop
+            if not _is_trusted(hop, trusted_proxies):
+                break
+        if not hops:
+            ip = request.headers.get("X-Real-IP") or ip
+    return f"ip:{ip}"
+
+
+def retry_after(seconds: float) -> str:
+    """Format a Retry-After header value (whole seconds, at least 1)."""
+    return str(max(1, math.ceil(seconds)))
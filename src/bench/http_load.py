@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Minimal HTTP load generator for benchmarking the Names Manager stack.
+
+Uses only the standard library so it runs anywhere Python does. Each worker
+thread sends requests back to back for a fixed duration and the script reports
+throughput, latency percentiles and bytes on the wire.
+
+Examples:
+    python http_load.py http://localhost:8080/api/names -c 32 -d 20
+    python http_load.py http://localhost:8080/api/names --no-keepalive
+    python http_load.py http://localhost:8080/api/names -H "Accept-Encoding: gzip"
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load benchmark")
+    parser.add_argument("url", help="URL to request")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent connections")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("-m", "--method", default="GET", help="HTTP method")
+    parser.add_argument("-b", "--body", default=None, help="Request body (sent as JSON)")
+    parser.add_argument("-H", "--header", action="append", default=[], help="Extra header 'Name: value'")
+    parser.add_argument("--no-keepalive", action="store_true", help="Open a new connection per request")
+    parser.add_argument("--label", default="", help="Label printed with the results")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser.parse_args(argv)
+
+
+class Worker(threading.Thread):
+    """Send requests on one connection until the deadline passes."""
+
+    def __init__(self, target, args, headers, deadline):
+        super().__init__(daemon=True)
+        self.target = target
+        self.args = args
+        self.headers = headers
+        self.deadline = deadline
+        self.latencies = []
+        self.statuses = {}
+        self.bytes = 0
+        self.errors = 0
+        self.connects = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.target.scheme == "https" else http.client.HTTPConnection
+        self.connects += 1
+        return cls(self.target.hostname, self.target.port, timeout=30)
+
+    def run(self):
+        path = self.target.path or "/"
+        if self.target.query:
+            path += "?" + self.target.query
+        body = self.args.body.encode() if self.args.body else None
+        conn = None
+
+        while time.perf_counter() < self.deadline:
+            if conn is None:
+                conn = self._connect()
+            started = time.perf_counter()
+            try:
+                conn.request(self.args.method, path, body=body, headers=self.headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = None
+                continue
+
+            self.latencies.append(time.perf_counter() - started)
+            self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+            self.bytes += len(payload)
+
+            if self.args.no_keepalive or response.will_close:
+                conn.close()
+                conn = None
+
+        if conn is not None:
+            conn.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(args):
+    target = urlsplit(args.url)
+    headers = {}
+    for header in args.header:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+    if args.body:
+        headers.setdefault("Content-Type", "application/json")
+    if args.no_keepalive:
+        headers["Connection"] = "close"
+
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    workers = [Worker(target, args, headers, deadline) for _ in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for w in workers for l in w.latencies)
+    statuses = {}
+    for worker in workers:
+        for status, count in worker.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    return {
+        "label": args.label,
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "errors": sum(w.errors for w in workers),
+        "connections_opened": sum(w.connects for w in workers),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "bytes_per_response": round(sum(w.bytes for w in workers) / len(latencies)) if latencies else 0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+        },
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+        return 0
+
+    label = f"[{result['label']}] " if result["label"] else ""
+    latency = result["latency_ms"]
+    print(f"{label}{args.method} {result['url']}")
+    print(f"  {result['requests']} requests in {result['seconds']}s "
+          f"with {result['concurrency']} connections -> {result['requests_per_second']} req/s")
+    print(f"  latency ms: mean {latency['mean']}  p50 {latency['p50']}  "
+          f"p95 {latency['p95']}  p99 {latency['p99']}")
+    print(f"  statuses: {result['statuses']}  errors: {result['errors']}  "
+          f"connections opened: {result['connections_opened']}  "
+          f"bytes/response: {result['bytes_per_response']}")
+    return 0 if result["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,57 @@
 CREATE TABLE IF NOT EXISTS names (
-    id SERIAL PRIMARY KEY,
+    -- 64-bit so sharded mode (DATABASE_SHARD_URLS) can store snowflake ids
+    id BIGSERIAL PRIMARY KEY,
     name TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW()
-);
\ No newline at end of file
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    -- Normalized name, only set when the backend runs with DEDUP_NAMES=true
+    name_key TEXT,
+    occurrences INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS names_name_key_idx ON names (name_key);
+
+-- Covering indexes for GET /api/names?sort=name and sort=created_at (index-only
+-- scans); sort=id uses the primary key
+CREATE INDEX IF NOT EXISTS names_name_id_idx ON names (name, id) INCLUDE (created_at);
+CREATE INDEX IF NOT EXISTS names_created_at_id_idx ON names (created_at, id) INCLUDE (name);
+
+-- Deleted name ids, replayed by backends running with NAMES_SNAPSHOT=true
+CREATE TABLE IF NOT EXISTS names_tombstones (
+    seq SERIAL PRIMARY KEY,
+    name_id BIGINT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_names_tombstones_deleted_at ON names_tombstones (deleted_at);
+
+-- Background jobs submitted through POST /api/jobs
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    result TEXT,
+    error TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_heartbeat_idx ON jobs (heartbeat_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS jobs_finished_at_idx ON jobs (finished_at)
+    WHERE status IN ('succeeded', 'failed', 'cancelled');
+
+-- Gzipped output chunks of finished export jobs
+CREATE TABLE IF NOT EXISTS job_outputs (
+    job_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
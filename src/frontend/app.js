@@ -1,11 +1,14 @@
 const apiBase = "/api";
 const namesList = document.getElementById("namesList");
+const namesViewport = document.getElementById("namesViewport");
 const addForm = document.getElementById("addForm");
 const nameInput = document.getElementById("nameInput");
 const addButton = document.getElementById("addButton");
 const errorMessage = document.getElementById("errorMessage");
 const successMessage = document.getElementById("successMessage");
 const nameInputError = document.getElementById("nameInputError");
+const nameInputHint = document.getElementById("nameInputHint");
+const nameSuggestions = document.getElementById("nameSuggestions");
 
 // Enhanced API request with better error handling
 async function apiRequest(path, options = {}) {
@@ -113,47 +116,253 @@ function clearFieldError(fieldId) {
   errorDiv.style.display = 'none';
 }
 
-async function loadNames() {
+// The names list is virtualized: only the rows in view (plus a small margin)
+// exist in the DOM. Pages are fetched by keyset cursor as they scroll into
+// view, and pages far from the viewport are dropped again, so memory and
+// frame time stay flat however long the list gets.
+const PAGE_SIZE = 200;
+const ROW_HEIGHT = 64; // px per row; keep in sync with .virtual-row in index.html
+const OVERSCAN_ROWS = 10;
+const MAX_CACHED_PAGES = 10;
+const RETRY_DELAY_MS = 2000;
+// Ask for pages column by column: smaller and cheaper to parse than row objects
+const COLUMNAR_JSON = "application/vnd.names.columnar+json";
+
+const listState = {
+  pages: new Map(),     // page index -> columnar page currently held in memory
+  pageLengths: [],      // row count of every page seen, kept after eviction
+  pageCursors: [null],  // after_id used to fetch each page
+  pending: new Set(),
+  reachedEnd: false,
+  lastSeenId: null,
+  visiblePage: 0,
+  generation: 0,        // bumped on reload so late responses are ignored
+  freshUntil: 0,        // bypass the server micro-cache until this time
+  retryAt: 0,
+};
+
+let renderQueued = false;
+
+function totalRows() {
+  const known = listState.pageLengths.reduce((sum, n) => sum + n, 0);
+  // Reserve a page of space below the known rows while more may follow
+  return listState.reachedEnd ? known : known + PAGE_SIZE;
+}
+
+function scheduleRender() {
+  if (renderQueued) {
+    return;
+  }
+  renderQueued = true;
+  requestAnimationFrame(() => {
+    renderQueued = false;
+    renderRows();
+  });
+}
+
+function buildRow(page, row, index) {
+  const li = document.createElement("li");
+  li.className = "virtual-row";
+  li.style.transform = `translateY(${index * ROW_HEIGHT}px)`;
+  li.dataset.id = page.ids[row];
+
+  const content = document.createElement("div");
+  content.className = "name-content";
+
+  const name = document.createElement("span");
+  name.className = "name";
+  name.textContent = page.names[row];
+
+  const meta = document.createElement("span");
+  meta.className = "meta";
+  const createdAt = page.createdAt[row];
+  const timestamp = createdAt !== null ? new Date(createdAt).toLocaleString() : 'N/A';
+  const occurrences = page.occurrences ? page.occurrences[row] : 1;
+  meta.textContent = occurrences > 1 ? `${timestamp} · added ${occurrences} times` : timestamp;
+
+  const button = document.createElement("button");
+  button.type = "button";
+  button.className = "delete-btn";
+  button.textContent = "Delete";
+
+  content.append(name, meta);
+  li.append(content, button);
+  return li;
+}
+
+function buildMessageRow(text, index = 0) {
+  const li = document.createElement("li");
+  li.className = "virtual-row placeholder-row";
+  li.style.transform = `translateY(${index * ROW_HEIGHT}px)`;
+  const em = document.createElement("em");
+  em.textContent = text;
+  li.appendChild(em);
+  return li;
+}
+
+function renderRows() {
+  const total = totalRows();
+  namesList.style.height = `${Math.max(total, 1) * ROW_HEIGHT}px`;
+
+  if (total === 0) {
+    namesList.replaceChildren(buildMessageRow("No names found"));
+    return;
+  }
+
+  const scrollTop = namesViewport.scrollTop;
+  const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+  const last = Math.min(total, Math.ceil((scrollTop + namesViewport.clientHeight) / ROW_HEIGHT) + OVERSCAN_ROWS);
+
+  // Find the page holding the first rendered row, then walk forward
+  const lengths = listState.pageLengths;
+  let page = 0;
+  let pageStart = 0;
+  while (page < lengths.length && pageStart + lengths[page] <= first) {
+    pageStart += lengths[page];
+    page++;
+  }
+  listState.visiblePage = page;
+
+  const fragment = document.createDocumentFragment();
+  for (let index = first; index < last; index++) {
+    while (page < lengths.length && index >= pageStart + lengths[page]) {
+      pageStart += lengths[page];
+      page++;
+    }
+    const loaded = listState.pages.get(page);
+    if (loaded && index - pageStart < loaded.ids.length) {
+      fragment.appendChild(buildRow(loaded, index - pageStart, index));
+    } else {
+      fragment.appendChild(buildMessageRow("Loading...", index));
+      fetchPage(page);
+    }
+  }
+  namesList.replaceChildren(fragment);
+}
+
+function evictDistantPages() {
+  while (listState.pages.size > MAX_CACHED_PAGES) {
+    let farthest = null;
+    for (const page of listState.pages.keys()) {
+      if (farthest === null ||
+          Math.abs(page - listState.visiblePage) > Math.abs(farthest - listState.visiblePage)) {
+        farthest = page;
+      }
+    }
+    listState.pages.delete(farthest);
+  }
+}
+
+async function fetchPage(page) {
+  const cursor = listState.pageCursors[page];
+  if (cursor === undefined || listState.pending.has(page) || Date.now() < listState.retryAt) {
+    return;
+  }
+
+  const generation = listState.generation;
+  listState.pending.add(page);
   try {
-    setLoading(namesList, true);
-    hideMessages();
-    
-    const res = await apiRequest("/names");
+    let path = `/names?limit=${PAGE_SIZE}`;
+    if (cursor !== null) {
+      path += `&after_id=${cursor}`;
+    }
+    const headers = { "Accept": COLUMNAR_JSON };
+    if (Date.now() < listState.freshUntil) {
+      headers["Cache-Control"] = "no-cache";
+    }
+    const res = await apiRequest(path, { headers });
     const data = await res.json();
-    
-    namesList.innerHTML = "";
-
-    if (data.names && data.names.length > 0) {
-      data.names.forEach((item) => {
-        const li = document.createElement("li");
-        const timestamp = item.created_at ? new Date(item.created_at).toLocaleString() : 'N/A';
-        li.innerHTML = `
-          <div class="name-content">
-            <span class="name">${escapeHtml(item.name)}</span>
-            <span class="meta">${timestamp}</span>
-          </div>
-          <button onclick="deleteName(${item.id})" class="delete-btn">Delete</button>
-        `;
-        namesList.appendChild(li);
-      });
-      
-      if (data.names.length === 1) {
-        showSuccess('Found 1 name', true);
+    if (generation !== listState.generation) {
+      return;
+    }
+
+    const loaded = {
+      ids: data.ids,
+      names: data.names,
+      createdAt: data.created_at,
+      occurrences: data.occurrences || null,
+    };
+    const count = loaded.ids.length;
+    listState.pages.set(page, loaded);
+    listState.pageLengths[page] = count;
+
+    if (page === listState.pageLengths.length - 1) {
+      listState.lastSeenId = count > 0 ? loaded.ids[count - 1] : cursor;
+      if (data.next_after_id === null || data.next_after_id === undefined) {
+        listState.reachedEnd = true;
       } else {
-        showSuccess(`Found ${data.names.length} names`, true);
+        listState.pageCursors[page + 1] = data.next_after_id;
       }
-    } else {
-      namesList.innerHTML = "<li><em>No names found</em></li>";
     }
+
+    evictDistantPages();
+    scheduleRender();
   } catch (error) {
-    showError(`Failed to load names: ${error.message}`);
-    namesList.innerHTML = "<li><em>Error loading names</em></li>";
+    if (generation === listState.generation) {
+      listState.retryAt = Date.now() + RETRY_DELAY_MS;
+      showError(`Failed to load names: ${error.message}`);
+    }
+  } finally {
+    if (generation === listState.generation) {
+      listState.pending.delete(page);
+    }
+  }
+}
+
+// fresh=true skips the server's micro-cache so the user sees their own change
+async function loadNames(fresh = false) {
+  listState.generation++;
+  listState.pages.clear();
+  listState.pageLengths = [];
+  listState.pageCursors = [null];
+  listState.pending = new Set();
+  listState.reachedEnd = false;
+  listState.lastSeenId = null;
+  listState.retryAt = 0;
+  if (fresh) {
+    listState.freshUntil = Date.now() + 5000;
+  }
+
+  try {
+    setLoading(namesViewport, true);
+    hideMessages();
+    namesViewport.scrollTop = 0;
+    await fetchPage(0);
+    if (listState.pageLengths.length === 0) {
+      namesList.style.height = `${ROW_HEIGHT}px`;
+      namesList.replaceChildren(buildMessageRow("Error loading names"));
+    }
   } finally {
-    setLoading(namesList, false);
+    setLoading(namesViewport, false);
   }
 }
 
+// New names sort last: extend the list past the last row we know about
+function noteNameAdded() {
+  listState.freshUntil = Date.now() + 5000;
+  if (listState.reachedEnd && listState.lastSeenId !== null) {
+    listState.reachedEnd = false;
+    listState.pageCursors[listState.pageLengths.length] = listState.lastSeenId;
+  }
+  scheduleRender();
+}
 
+function removeLoadedName(nameId) {
+  for (const [page, loaded] of listState.pages) {
+    const index = loaded.ids.indexOf(nameId);
+    if (index !== -1) {
+      loaded.ids.splice(index, 1);
+      loaded.names.splice(index, 1);
+      loaded.createdAt.splice(index, 1);
+      if (loaded.occurrences) {
+        loaded.occurrences.splice(index, 1);
+      }
+      listState.pageLengths[page] = loaded.ids.length;
+      scheduleRender();
+      return;
+    }
+  }
+}
 
 addForm.addEventListener("submit", async (e) => {
   e.preventDefault();
@@ -178,10 +387,11 @@ addForm.addEventListener("submit", async (e) => {
 
     nameInput.value = "";
     clearFieldError('nameInput');
+    clearSuggestions();
     showSuccess(`Successfully added "${name}"`);
     
-    // Reload the list to show the new name
-    await loadNames();
+    // Show the new name without reloading the whole list
+    noteNameAdded();
     
   } catch (error) {
     if (error.message.includes('already exists')) {
@@ -201,25 +411,22 @@ addForm.addEventListener("submit", async (e) => {
   }
 });
 
-async function deleteName(nameId) {
+async function deleteName(nameId, nameText) {
   try {
     hideMessages();
     
-    // Get the name text from the DOM for the confirmation dialog
-    const nameElement = event.target.closest('li').querySelector('.name');
-    const nameText = nameElement ? nameElement.textContent : 'this name';
-    
     // Show confirmation with better styling than default confirm()
     if (!confirm(`Are you sure you want to delete "${nameText}"?`)) {
       return;
     }
     
-    const res = await apiRequest(`/names/${nameId}`, { 
+    await apiRequest(`/names/${nameId}`, { 
       method: "DELETE" 
     });
     
+    listState.freshUntil = Date.now() + 5000;
+    removeLoadedName(nameId);
     showSuccess(`Successfully deleted "${nameText}"`);
-    await loadNames();
     
   } catch (error) {
     if (error.message.includes('not found')) {
@@ -228,16 +435,22 @@ async function deleteName(nameId) {
       showError(`Failed to delete name: ${error.message}`);
     }
     // Refresh the list in case it's out of sync
-    await loadNames();
+    await loadNames(true);
   }
 }
 
-// Utility function to escape HTML to prevent XSS
-function escapeHtml(text) {
-  const div = document.createElement('div');
-  div.textContent = text;
-  return div.innerHTML;
-}
+// One delegated handler serves the delete buttons of every rendered row
+namesList.addEventListener("click", (event) => {
+  const button = event.target.closest(".delete-btn");
+  if (!button) {
+    return;
+  }
+  const row = button.closest("li");
+  deleteName(Number(row.dataset.id), row.querySelector(".name").textContent);
+});
+
+namesViewport.addEventListener("scroll", scheduleRender, { passive: true });
+window.addEventListener("resize", scheduleRender);
 
 // Add input validation on typing
 nameInput.addEventListener('input', function() {
@@ -254,5 +467,64 @@ nameInput.addEventListener('input', function() {
   }
 });
 
+// Typeahead: suggest stored names as the user types and say when the name is
+// already in the list, without downloading the list itself
+const SUGGEST_DELAY_MS = 150;
+const SUGGEST_LIMIT = 8;
+let suggestTimer = null;
+let suggestSequence = 0;
+// Cleared when the backend runs without NAME_SUGGEST
+let suggestionsEnabled = true;
+// Stored names are HTML-escaped; decode them so picking one adds the same name
+const entityDecoder = document.createElement("textarea");
+
+function decodeEntities(text) {
+  entityDecoder.innerHTML = text;
+  return entityDecoder.value;
+}
+
+function clearSuggestions() {
+  suggestSequence++;
+  nameSuggestions.replaceChildren();
+  nameInputHint.style.display = 'none';
+}
+
+async function fetchSuggestions(prefix) {
+  const sequence = ++suggestSequence;
+  try {
+    const res = await apiRequest(`/names/suggest?prefix=${encodeURIComponent(prefix)}&limit=${SUGGEST_LIMIT}`);
+    const data = await res.json();
+    // A slower answer for an older prefix must not replace a newer one
+    if (sequence !== suggestSequence) {
+      return;
+    }
+    nameSuggestions.replaceChildren(...data.suggestions.map((suggestion) => {
+      const option = document.createElement("option");
+      option.value = decodeEntities(suggestion.name);
+      return option;
+    }));
+    nameInputHint.textContent = data.exists ? 'This name is already in the list' : '';
+    nameInputHint.style.display = data.exists ? 'block' : 'none';
+  } catch (error) {
+    // Suggestions are a convenience; typing carries on without them
+    if (error.message === 'Name suggestions are disabled.') {
+      suggestionsEnabled = false;
+    }
+    if (sequence === suggestSequence) {
+      nameSuggestions.replaceChildren();
+    }
+  }
+}
+
+nameInput.addEventListener('input', function() {
+  clearTimeout(suggestTimer);
+  const prefix = this.value.trim();
+  if (prefix.length === 0 || !suggestionsEnabled) {
+    clearSuggestions();
+    return;
+  }
+  suggestTimer = setTimeout(() => fetchSuggestions(prefix), SUGGEST_DELAY_MS);
+});
+
 // Initialize the application
 loadNames();